@@ -1,21 +1,39 @@
 #### Kaggle link: https://www.kaggle.com/datasets/wardabilal/spotify-global-music-dataset-20092025?select=track_data_final.csv
 
+import os
+
 import streamlit as st
 
 from src.data_loader import (
-    get_connection,
+    DB_PATH,
+    PAGE_COLUMNS,
+    PAGE_SIZE,
+    TrackStore,
+    build_where_clause,
+    fetch_track_page,
+    get_pool,
     get_filter_options,
-    fetch_dashboard_data,
-    sql_popularity_buckets,
-     sql_rule_based_hit_evaluation,
-    sql_similarity_reference,
+    cached_fetch_dashboard_data,
+    dashboard_cache_stats,
+    memoized,
+    get_tracks_by_id,
 )
-from src.preprocessing import compute_correlation_matrix
+from src.cube import current_cube
+from src.export import FORMATS, available_formats, export_file
+from src.figcache import figure_cache_stats
+from src.neighbors import NEIGHBOR_K, current_index
+from src.profiler import start_profiling, trace
+from src.genres import GENRE_MATCHES
+from src.search import find_tracks
+from src.preprocessing import compute_correlation_matrix, hit_confusion_counts
+from src.similarity import SIMILARITY_TOP_K, similarity_ranking
 from src import plots
 from src import text
 import pandas as pd
 import numpy as np
-from numpy.linalg import norm
+
+# Developer profiling: DASHBOARD_PROFILE=1 records every query and figure of a rerun
+profiler = start_profiling() if os.environ.get("DASHBOARD_PROFILE") == "1" else None
 
 # -----------------------------
 # Page configuration
@@ -92,7 +110,25 @@ st.markdown(
 # Load filter options
 # -----------------------------
 
-with get_connection() as conn:
+pool = get_pool(DB_PATH)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_track_store(db_mtime: float) -> TrackStore:
+    # Loaded once per database file version and shared by every session; only the current
+    # version is kept, so a rebuild or incremental load releases the previous store
+    with pool.connection() as conn:
+        return TrackStore.load(conn)
+
+
+with trace("load_track_store"):
+    track_store = load_track_store(os.path.getmtime(DB_PATH))
+
+with pool.connection() as conn:
+    # Pre-aggregated cells answer the overview, genre, year, explicit and bucket aggregates;
+    # incremental loads refresh only the partitions they changed
+    with trace("current_cube"):
+        track_cube = current_cube(conn, DB_PATH)
     opts = get_filter_options(conn)
 
 # -----------------------------
@@ -120,9 +156,19 @@ selected_album_types = st.sidebar.multiselect(
     opts["album_types"],
 )
 
+# Databases built by src/etl.py also list every genre of each artist, not only the primary one
+genre_match = "primary"
+if opts["listed_genres"]:
+    genre_match = st.sidebar.radio(
+        "Match genres by",
+        list(GENRE_MATCHES),
+        format_func=GENRE_MATCHES.get,
+        horizontal=True,
+    )
+
 selected_genres = st.sidebar.multiselect(
     "Genre(s)",
-    opts["genres"],
+    opts["genres"] if genre_match == "primary" else opts["listed_genres"],
 )
 
 explicit_choice = st.sidebar.selectbox(
@@ -136,13 +182,19 @@ exclude_unknown_genre = st.sidebar.checkbox(
     value=True,
 )
 
+approx_artists = st.sidebar.checkbox(
+    "Approximate unique artists",
+    value=False,
+    help=text.APPROX_ARTISTS_HELP,
+)
+
 # -----------------------------
 # Query database
 # -----------------------------
 
-with get_connection() as conn:
+with pool.connection() as conn:
 
-    data = fetch_dashboard_data(
+    data = cached_fetch_dashboard_data(
         conn,
         selected_genres,
         selected_album_types,
@@ -152,16 +204,16 @@ with get_connection() as conn:
         pop_max,
         explicit_choice,
         exclude_unknown_genre,
+        genre_match,
+        approx_artists,
+        store=track_store,
+        cube=track_cube,
     )
 
-    where_sql = data["where_sql"]
-    params = data["params"]
-
-    sim_rows = sql_similarity_reference(conn, where_sql, params)
-    hit_rows = sql_rule_based_hit_evaluation(conn, where_sql, params)
-    popularity_buckets = sql_popularity_buckets(conn, where_sql, params)
-
-hit_df = pd.DataFrame(hit_rows)
+# Every aggregate below is derived from one filtered snapshot of the join
+sim_rows = data["sim_rows"]
+hit_df = data["hit_rows"]
+popularity_buckets = data["popularity_buckets"]
 
 metrics = data["metrics"]
 median_popularity = data["median_popularity"]
@@ -174,7 +226,7 @@ genre_freq = data["genre_freq"]
 explicit_summary = data["explicit_summary"]
 pop_over_time = data["popularity_over_time"]
 
-if not sample_rows:
+if sample_rows.empty:
     st.warning(
         "No tracks match the selected filters. "
         "Try expanding the release year range or choosing a different album type."
@@ -207,13 +259,72 @@ def spotify_metric(label, value):
     )
 
 
+def page_forward(state_key, cursor):
+    st.session_state[state_key].append(cursor)
+
+
+def page_back(state_key):
+    st.session_state[state_key].pop()
+
+
+def paginated_track_table(key, where_sql, params, total):
+    # Server-side sort, search and keyset pagination: only the visible page is queried and sent
+    col1, col2, col3 = st.columns([3, 2, 1])
+    search = col1.text_input("Search track or artist", key=f"{key}_search").strip()
+    sort_by = col2.selectbox(
+        "Sort by",
+        list(PAGE_COLUMNS),
+        index=list(PAGE_COLUMNS).index("track_popularity"),
+        key=f"{key}_sort",
+    )
+    descending = col3.toggle("Descending", value=True, key=f"{key}_desc")
+
+    # Cursors that start each page up to the current one; a new query starts again at page 1
+    state_key = f"{key}_cursors"
+    signature = (where_sql, tuple(params), search, sort_by, descending)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+
+    with pool.connection() as conn:
+        page, next_cursor = fetch_track_page(
+            conn, where_sql, params, sort_by, descending, search, cursors[-1]
+        )
+
+    st.dataframe(page.drop(columns="track_id"), width="stretch", hide_index=True)
+
+    prev_col, info_col, next_col = st.columns([1, 4, 1])
+    prev_col.button(
+        "Previous",
+        key=f"{key}_prev",
+        disabled=len(cursors) == 1,
+        on_click=page_back,
+        args=(state_key,),
+    )
+    next_col.button(
+        "Next",
+        key=f"{key}_next",
+        disabled=next_cursor is None,
+        on_click=page_forward,
+        args=(state_key, next_cursor),
+    )
+    if search:
+        info_col.caption(f"Page {len(cursors):,} of the tracks matching '{search}'")
+    else:
+        pages = max(1, -(-total // PAGE_SIZE))
+        info_col.caption(f"Page {len(cursors):,} of {pages:,} ({total:,} tracks)")
+
+
 c1, c2, c3, c4 = st.columns(4)
 
 with c1:
     spotify_metric("Tracks", f"{metrics['tracks']:,}")
 
 with c2:
-    spotify_metric("Unique Artists", f"{metrics['unique_artists']:,}")
+    # Marked when the count is a sketch estimate rather than exact
+    approx_mark = "≈" if metrics.get("unique_artists_approx") else ""
+    spotify_metric("Unique Artists", f"{approx_mark}{metrics['unique_artists']:,}")
 
 with c3:
     spotify_metric("Avg Popularity", f"{metrics['avg_popularity']:.2f}")
@@ -228,20 +339,24 @@ with c4:
 # Tabs
 # -----------------------------
 
-tab_eda, tab_rules, tab_tables, tab_final = st.tabs(
-    ["EDA Visuals", "Rule-Based Analysis", "Summary Tables", "Final Interpretation"]
+# Only the selected section runs, so hidden sections cost nothing; what it derives from
+# the filtered data is memoized per filter state alongside the cached dashboard data
+active_tab = st.radio(
+    "Section",
+    ["EDA Visuals", "Rule-Based Analysis", "Summary Tables", "Track Lookup", "Final Interpretation"],
+    horizontal=True,
+    label_visibility="collapsed",
+    key="active_tab",
 )
 
 # -----------------------------
 # EDA VISUALS
 # -----------------------------
 
-with tab_eda:
-
-    # 1) Top 10 artists by popularity index
-
+def top_artists_by_index(rows):
+    # Top 10 artists by popularity index, plus how many artists were ranked
     artist_agg = (
-        pd.DataFrame(sample_rows)
+        rows
         .groupby("artist_name")
         .agg(
             avg_artist_popularity=("artist_popularity", "mean"),
@@ -275,6 +390,15 @@ with tab_eda:
         "artist_popularity_index", ascending=False
     ).head(10)
 
+    return top_artists, artist_agg.shape[0]
+
+
+if active_tab == "EDA Visuals":
+
+    # 1) Top 10 artists by popularity index
+
+    top_artists, n_artists = memoized(data, "top_artists", lambda: top_artists_by_index(sample_rows))
+
     st.markdown(text.TOP_ARTISTS_TITLE)
     st.markdown(text.TOP_ARTISTS_INTRO)
 
@@ -282,7 +406,7 @@ with tab_eda:
         top_artists.sort_values("artist_popularity_index", ascending=True)
     )
 
-    if artist_agg.shape[0] < 3:
+    if n_artists < 3:
         st.info("Not enough artists in this filter to compute a meaningful popularity ranking.")
     else:
         st.plotly_chart(fig, width="stretch")
@@ -294,7 +418,7 @@ with tab_eda:
     col_plot, col_text = st.columns([2, 1])
     with col_plot:
         st.plotly_chart(
-            plots.fig_hist_popularity(rows_for_hist),
+            plots.fig_hist_popularity(data["popularity_histogram"], data["popularity_box"]),
             width='stretch',
             key="pop_dist",
         )
@@ -304,7 +428,7 @@ with tab_eda:
     # 3) Correlation matrix
     col_text, col_plot = st.columns([1, 2])
     with col_plot:
-        corr = compute_correlation_matrix(rows_for_hist)
+        corr = memoized(data, "corr", lambda: compute_correlation_matrix(rows_for_hist))
         st.plotly_chart(
             plots.fig_corr_heatmap(corr),
             width='stretch',
@@ -328,7 +452,7 @@ with tab_eda:
     col_text, col_plot = st.columns([1, 2])
     with col_plot:
         st.plotly_chart(
-            plots.fig_box_explicit(sample_rows),
+            plots.fig_box_explicit(data["box_explicit"]),
             width='stretch',
             key="explicit_box",
         )
@@ -394,7 +518,7 @@ with tab_eda:
     col_text, col_plot = st.columns([1, 2])
     with col_plot:
         st.plotly_chart(
-            plots.fig_box_album_type(sample_rows),
+            plots.fig_box_album_type(data["box_album_type"]),
             width='stretch',
             key="album_type",
         )
@@ -405,7 +529,7 @@ with tab_eda:
 # Summary Tables
 # -----------------------------
 
-with tab_tables:
+if active_tab == "Summary Tables":
 
     st.markdown("### Popularity Distribution (SQL Quantiles)")
     st.markdown(text.TABLE_QUANTILES_DESC)
@@ -450,11 +574,44 @@ with tab_tables:
     st.markdown(text.TABLE_YEARLY_DESC)
     st.dataframe(yearly_agg, width="stretch", hide_index=True)
 
+    st.divider()
+
+    # Row-level tables and the export share the sidebar filters as one WHERE clause
+    filtered_where, filtered_params = build_where_clause(
+        selected_genres,
+        selected_album_types,
+        year_min,
+        year_max,
+        pop_min,
+        pop_max,
+        explicit_choice,
+        genre_match,
+    )
+
+    st.markdown("### Browse Filtered Tracks")
+    st.markdown(text.TABLE_BROWSE_DESC)
+    paginated_track_table("browse", filtered_where, filtered_params, metrics["tracks"])
+
+    st.divider()
+
+    st.markdown("### Export Filtered Tracks")
+    st.markdown(text.TABLE_EXPORT_DESC)
+
+    export_format = st.selectbox("Format", available_formats(), key="export_format")
+    # Deferred: the rows are only read and encoded when the button is clicked
+    st.download_button(
+        f"Download {metrics['tracks']:,} tracks",
+        lambda: export_file(export_format, filtered_where, filtered_params, DB_PATH),
+        file_name=f"tracks.{FORMATS[export_format][2]}",
+        mime=FORMATS[export_format][1],
+        on_click="ignore",
+    )
+
 # -----------------------------
 # Rule-Based Analysis
 # -----------------------------
 
-with tab_rules:
+if active_tab == "Rule-Based Analysis":
 
     st.markdown("## Rule-Based Classification & Similarity Analysis")
 
@@ -483,27 +640,10 @@ with tab_rules:
 
     st.markdown("### Rule-Based Hit Identification")
 
-    df_eval = pd.DataFrame(sample_rows)
-
-    # Define a hit as top 30% by popularity; predict hits based on artist metrics
-    HIT_PERCENTILE = 0.70
-    hit_cutoff = df_eval["track_popularity"].quantile(HIT_PERCENTILE)
-
-    df_eval["true_hit"] = (df_eval["track_popularity"] >= hit_cutoff).astype(int)
-
-    # Rule: artists with popularity >= 75 and followers >= 1M are likely to produce hits
-    df_eval["predicted_hit"] = (
-        (df_eval["artist_popularity"] >= 75) &
-        (df_eval["artist_followers"] >= 1_000_000)
-    ).astype(int)
+    tp, fp, tn, fn = memoized(data, "hit_confusion", lambda: hit_confusion_counts(hit_df))
 
     st.markdown(text.RULES_HIT_DESCRIPTION)
 
-    tp = ((df_eval["predicted_hit"] == 1) & (df_eval["true_hit"] == 1)).sum()
-    fp = ((df_eval["predicted_hit"] == 1) & (df_eval["true_hit"] == 0)).sum()
-    tn = ((df_eval["predicted_hit"] == 0) & (df_eval["true_hit"] == 0)).sum()
-    fn = ((df_eval["predicted_hit"] == 0) & (df_eval["true_hit"] == 1)).sum()
-
     confusion_df = pd.DataFrame(
         {
             "Predicted Hit": [tp, fp],
@@ -536,24 +676,14 @@ with tab_rules:
     st.markdown(text.RULES_SIMILARITY_INTRO)
 
 
-    sim_df = pd.DataFrame(sim_rows)
-
-    sim_df["artist_followers_log"] = np.log10(sim_df["artist_followers"] + 1)
-
-    POPULARITY_THRESHOLD = sim_df["track_popularity"].quantile(0.99)
-
-    # Select reference track from top 1% most popular tracks with artist popularity >= 80
-    very_popular_tracks = sim_df[
-        (sim_df["track_popularity"] >= POPULARITY_THRESHOLD) &
-        (sim_df["artist_popularity"] >= 80)
-    ].sort_values("track_popularity", ascending=False)
+    reference_track, nearest = memoized(
+        data, "similarity", lambda: similarity_ranking(sim_rows, k=SIMILARITY_TOP_K)
+    )
 
-    if very_popular_tracks.empty:
+    if reference_track is None:
         st.warning("No suitable reference track found for similarity comparison.")
         st.stop()
 
-    reference_track = very_popular_tracks.iloc[0]
-
     st.markdown("#### Reference Track (Anchor for Similarity)")
 
     st.dataframe(
@@ -571,32 +701,10 @@ with tab_rules:
         width="stretch",
     )
 
-    features = [
-        "artist_popularity",
-        "artist_followers_log",
-        "track_duration_min",
-    ]
-
-    df_norm = sim_df.copy()
-
-    for col in features:
-        min_val = df_norm[col].min()
-        max_val = df_norm[col].max()
-        df_norm[col] = (df_norm[col] - min_val) / (max_val - min_val)
-
-    reference_track_norm = df_norm.loc[reference_track.name]
-
-    def normalized_similarity_score(row, reference):
-        return norm(row[features].values - reference[features].values)
-
-    sim_df["similarity_to_popular_song"] = df_norm.apply(
-        normalized_similarity_score,
-        axis=1,
-        reference=reference_track_norm
-    )
+    st.caption(f"The {len(nearest):,} closest of {len(sim_rows):,} tracks")
 
     st.dataframe(
-        sim_df[
+        nearest[
             [
                 "track_name",
                 "artist_name",
@@ -606,18 +714,98 @@ with tab_rules:
                 "track_duration_min",
                 "similarity_to_popular_song",
             ]
-        ].sort_values("similarity_to_popular_song"),
+        ],
         width="stretch",
         hide_index=True,
     )
 
     st.markdown(text.RULES_SIMILARITY_INTERPRETATION)
 
+# -----------------------------
+# Track Lookup
+# -----------------------------
+
+if active_tab == "Track Lookup":
+
+    st.markdown("## Track Lookup")
+    st.markdown(text.LOOKUP_INTRO)
+
+    lookup_query = st.text_input("Search for a track or artist", key="nn_search")
+
+    if lookup_query.strip():
+        with pool.connection() as conn:
+            matches = find_tracks(conn, lookup_query.strip())
+
+        if not matches:
+            st.info("No tracks or artists match that search.")
+        else:
+            anchor = st.selectbox(
+                "Track",
+                matches,
+                format_func=lambda m: f"{m['track_name']} — {m['artist_name']} ({m['release_year']})",
+                key="nn_anchor",
+            )
+            with pool.connection() as conn:
+                details = get_tracks_by_id(conn, [anchor["track_id"]])
+                neighbor_index = current_index(conn, DB_PATH)
+                try:
+                    neighbor_ids, neighbor_dist = neighbor_index.query(anchor["track_id"], k=NEIGHBOR_K)
+                except KeyError:
+                    neighbor_ids, neighbor_dist = [], []
+                neighbors = get_tracks_by_id(conn, neighbor_ids)
+
+            st.markdown("#### Track Details")
+            st.dataframe(
+                details[
+                    [
+                        "track_name",
+                        "artist_name",
+                        "primary_genre",
+                        "release_year",
+                        "album_type",
+                        "explicit",
+                        "track_popularity",
+                        "track_duration_min",
+                        "artist_popularity",
+                        "artist_followers",
+                    ]
+                ],
+                width="stretch",
+                hide_index=True,
+            )
+
+            st.markdown("#### Most Similar Tracks")
+            st.caption(
+                "Nearest neighbours across the whole catalog (sidebar filters do not apply), "
+                "using the normalized features of the similarity comparison."
+            )
+            if neighbors.empty:
+                st.info("This track has no similarity features to compare.")
+            else:
+                # By id: get_tracks_by_id drops tracks an incremental load removed since the index caught up
+                distances = {int(i): float(d) for i, d in zip(neighbor_ids, neighbor_dist)}
+                neighbors["distance"] = neighbors["track_id"].map(distances)
+                st.dataframe(
+                    neighbors[
+                        [
+                            "track_name",
+                            "artist_name",
+                            "track_popularity",
+                            "artist_popularity",
+                            "artist_followers",
+                            "track_duration_min",
+                            "distance",
+                        ]
+                    ],
+                    width="stretch",
+                    hide_index=True,
+                )
+
 # -----------------------------
 # Final Interpretation
 #-----------------------------
 
-with tab_final:
+if active_tab == "Final Interpretation":
 
     st.markdown(text.FINAL_INTERPRETATION_TITLE, unsafe_allow_html=True)
     st.markdown(text.FINAL_INTERPRETATION_INTRO)
@@ -651,3 +839,33 @@ with tab_final:
 
     st.markdown(text.CONCLUSION_TITLE, unsafe_allow_html=True)
     st.markdown(text.CONCLUSION_TEXT)
+
+# -----------------------------
+# Developer panel
+# -----------------------------
+
+if profiler is not None:
+    with st.sidebar.expander("Profiler (this rerun)", expanded=False):
+        summary = profiler.summary()
+        st.caption(
+            f"{profiler.total_ms:,.0f} ms total; "
+            f"{(summary['category'] == 'sql').sum()} queries, "
+            f"{(summary['category'] == 'figure').sum()} figures"
+        )
+        st.dataframe(summary, hide_index=True, width="stretch")
+        # Process-wide counters since the server started, shared by every session; size the
+        # caches with DASHBOARD_CACHE_MB / DASHBOARD_FIGURE_CACHE_MB from the hit rate and evictions
+        st.caption("Result caches")
+        cache_stats = pd.DataFrame(
+            [
+                {"cache": "dashboard data", **dashboard_cache_stats()},
+                {"cache": "figures", **figure_cache_stats()},
+            ]
+        )
+        st.dataframe(cache_stats, hide_index=True, width="stretch")
+        st.download_button(
+            "Download Chrome trace",
+            profiler.chrome_trace_json(),
+            file_name="dashboard_trace.json",
+            mime="application/json",
+        )
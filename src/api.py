@@ -0,0 +1,450 @@
+"""
+Headless HTTP API over the dashboard aggregates.
+
+    python -m src.api [--db data/spotify_database.db] [--host 127.0.0.1] [--port 8502]
+                      [--workers 8] [--backlog 64]
+
+Endpoints (GET) take the sidebar filters as query parameters:
+
+    genre=...&genre=...        genres (repeatable; none = all)
+    genre_match=primary|any|all
+                               match the artist's primary genre (default), or any/all
+                               of the genres the artist lists
+    album_type=...             album types (repeatable; none = all)
+    year_min, year_max         release year range (default: the catalog's range)
+    pop_min, pop_max           track popularity range (default 0-100)
+    explicit=all|explicit|non-explicit
+    exclude_unknown=1|0        drop the "Unknown" genre from genre summaries (default 1)
+    approx_artists=1|0         estimate unique artists from HyperLogLog sketches (default 0)
+
+    /v1/dashboard        every aggregate below in one document
+    /v1/metrics          overview metrics and median popularity
+    /v1/quantiles        popularity quantiles
+    /v1/yearly           yearly aggregates and popularity over time
+    /v1/genres           top genres by average popularity and genre frequency
+    /v1/explicit         explicit vs non-explicit summary and box statistics
+    /v1/popularity       buckets, histogram and box statistics
+    /v1/hit-evaluation   rule-based hit confusion matrix, accuracy, precision, recall
+    /v1/rows             filtered rows (JSON, or Arrow IPC with format=arrow or
+                         Accept: application/vnd.apache.arrow.stream); columns=, limit=, offset=
+    /v1/export           every filtered row as a streamed download; format=csv|parquet
+    /health
+
+Results come from the same process-wide cache, TrackStore and cube the
+dashboard uses. Every response carries an ETag derived from the database
+version and the normalized request, so a conditional GET (If-None-Match) is
+answered with 304 before anything is computed. Requests are served by a
+fixed worker pool; connections beyond the pool plus a bounded backlog are
+turned away with 503. /v1/export is sent with chunked transfer encoding as
+the rows are read, so it never holds the full result in memory.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from src.cube import current_cube
+from src.data_loader import (
+    DB_PATH,
+    TrackStore,
+    build_where_clause,
+    cached_fetch_dashboard_data,
+    get_filter_options,
+    get_pool,
+    memoized,
+    normalize_filters,
+    source_version,
+)
+from src.export import EXPLICIT_CHOICES, FORMATS, available_formats, iter_export
+from src.genres import GENRE_MATCHES
+from src.preprocessing import hit_confusion_counts
+from src.snapshot import SNAPSHOT_COLUMNS
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow responses are optional
+    pa = None
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+DEFAULT_PORT = 8502
+DEFAULT_WORKERS = 8
+DEFAULT_BACKLOG = 64
+# Idle keep-alive connections give their worker back after this many seconds
+KEEPALIVE_TIMEOUT = 5
+
+class BadRequest(ValueError):
+    pass
+
+
+def _jsonable(value: Any) -> Any:
+    # NumPy scalars to Python, NaN to null, frames to records
+    if isinstance(value, pd.DataFrame):
+        return [_jsonable(r) for r in value.to_dict(orient="records")]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _int_param(query: Dict[str, List[str]], name: str, default: int) -> int:
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        return int(values[-1])
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+
+
+def parse_filters(query: Dict[str, List[str]], opts: Dict[str, Any]) -> Tuple[Any, ...]:
+    # Query parameters -> the normalized filter key cached_fetch_dashboard_data uses
+    explicit = query.get("explicit", ["all"])[-1].lower()
+    if explicit not in EXPLICIT_CHOICES:
+        raise BadRequest("explicit must be one of " + ", ".join(EXPLICIT_CHOICES))
+    exclude_unknown = query.get("exclude_unknown", ["1"])[-1].lower() not in ("0", "false", "no")
+    approx_artists = query.get("approx_artists", ["0"])[-1].lower() in ("1", "true", "yes")
+    genre_match = query.get("genre_match", ["primary"])[-1].lower()
+    if genre_match not in GENRE_MATCHES:
+        raise BadRequest("genre_match must be one of " + ", ".join(GENRE_MATCHES))
+    if genre_match != "primary" and not opts["listed_genres"]:
+        raise BadRequest("this database has no artist genre lists; only genre_match=primary works")
+    return normalize_filters(
+        query.get("genre", []),
+        query.get("album_type", []),
+        _int_param(query, "year_min", opts["min_year"]),
+        _int_param(query, "year_max", opts["max_year"]),
+        _int_param(query, "pop_min", 0),
+        _int_param(query, "pop_max", 100),
+        EXPLICIT_CHOICES[explicit],
+        exclude_unknown,
+        genre_match,
+        approx_artists,
+    )
+
+
+def hit_evaluation(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Same rule and metrics as the Rule-Based Analysis tab
+    tp, fp, tn, fn = memoized(data, "hit_confusion", lambda: hit_confusion_counts(data["hit_rows"]))
+    total = tp + tn + fp + fn
+    return {
+        "confusion": {"tp": tp, "fp": fp, "tn": tn, "fn": fn},
+        "accuracy": (tp + tn) / total if total else 0.0,
+        "precision": tp / (tp + fp) if (tp + fp) else 0.0,
+        "recall": tp / (tp + fn) if (tp + fn) else 0.0,
+    }
+
+
+# Aggregate endpoints: name -> function of the dashboard data
+AGGREGATES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "metrics": lambda d: {"metrics": d["metrics"], "median_popularity": d["median_popularity"]},
+    "quantiles": lambda d: {"quantiles": d["quantiles"]},
+    "yearly": lambda d: {"yearly_agg": d["yearly_agg"], "popularity_over_time": d["popularity_over_time"]},
+    "genres": lambda d: {"top_avg_genres": d["top_avg_genres"], "genre_freq": d["genre_freq"]},
+    "explicit": lambda d: {"explicit_summary": d["explicit_summary"], "box_explicit": d["box_explicit"]},
+    "popularity": lambda d: {
+        "popularity_buckets": d["popularity_buckets"],
+        "popularity_histogram": d["popularity_histogram"],
+        "popularity_box": d["popularity_box"],
+        "box_album_type": d["box_album_type"],
+    },
+    "hit-evaluation": hit_evaluation,
+}
+
+
+class DashboardService:
+    """
+    Answers API requests from the shared connection pool, TrackStore, cube
+    and dashboard cache. The TrackStore is reloaded when the database changes.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self._lock = threading.Lock()
+        self._store: Optional[TrackStore] = None
+        self._store_version: Optional[Tuple[Any, ...]] = None
+        self._opts: Optional[Dict[str, Any]] = None
+
+    def version(self, conn: sqlite3.Connection) -> Tuple[Any, ...]:
+        return source_version(conn, self.db_path)
+
+    def _current(self, conn: sqlite3.Connection, version: Tuple[Any, ...]) -> Tuple[TrackStore, Dict[str, Any]]:
+        with self._lock:
+            if self._store_version != version:
+                self._store = TrackStore.load(conn)
+                self._opts = get_filter_options(conn)
+                self._store_version = version
+            return self._store, self._opts
+
+    def filter_options(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        return self._current(conn, self.version(conn))[1]
+
+    def dashboard_data(self, conn: sqlite3.Connection, key: Tuple[Any, ...]) -> Dict[str, Any]:
+        store, _ = self._current(conn, self.version(conn))
+        cube = current_cube(conn, self.db_path)
+        return cached_fetch_dashboard_data(conn, *key, store=store, cube=cube, db_path=self.db_path)
+
+
+def etag_for(version: Tuple[Any, ...], *parts: Any) -> str:
+    # Responses are a pure function of the database version and the normalized request
+    digest = hashlib.sha1(repr((version, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def rows_response(
+    data: Dict[str, Any],
+    columns: Sequence[str],
+    offset: int,
+    limit: Optional[int],
+    arrow: bool,
+) -> Tuple[bytes, str]:
+    frame = data["rows_full"]
+    stop = None if limit is None else offset + limit
+    frame = frame[list(columns)].iloc[offset:stop]
+    if arrow:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_MIME
+    return frame.to_json(orient="records").encode(), "application/json"
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    server: "APIServer"
+    # Set once a status line has gone out; after that an error can only close the connection
+    responded = False
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", etag: Optional[str] = None):
+        self.responded = True
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and status != HTTPStatus.NOT_MODIFIED:
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Any, etag: Optional[str] = None):
+        body = json.dumps(_jsonable(payload), separators=(",", ":")).encode()
+        self._send(status, body, "application/json", etag)
+
+    def _send_stream(self, parts, content_type: str, filename: str, etag: str) -> None:
+        # Chunked transfer encoding: each encoded part goes out as soon as it is produced
+        self.responded = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for part in parts:
+                if part:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+        except Exception:
+            # No terminating chunk: closing mid-stream tells the client the download is incomplete
+            self.close_connection = True
+            raise
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip("/")
+        self.responded = False
+        try:
+            if path == "/health":
+                self._send_json(HTTPStatus.OK, {"status": "ok"})
+                return
+            if not path.startswith("/v1/"):
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"unknown endpoint {url.path}"})
+                return
+            self._serve_v1(path[len("/v1/"):], query)
+        except BadRequest as exc:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(exc)})
+        except Exception:
+            traceback.print_exc()
+            if self.responded:
+                self.close_connection = True
+            else:
+                self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"})
+
+    def _serve_v1(self, endpoint: str, query: Dict[str, List[str]]) -> None:
+        service = self.server.service
+        if endpoint not in ("dashboard", "rows", "export") and endpoint not in AGGREGATES:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"unknown endpoint /v1/{endpoint}"})
+            return
+
+        with service.pool.connection() as conn:
+            version = service.version(conn)
+            key = parse_filters(query, service.filter_options(conn))
+
+            if endpoint == "rows":
+                columns = query.get("columns", [",".join(SNAPSHOT_COLUMNS)])[-1].split(",")
+                unknown = [c for c in columns if c not in SNAPSHOT_COLUMNS]
+                if unknown:
+                    raise BadRequest("unknown columns: " + ", ".join(unknown))
+                offset = max(0, _int_param(query, "offset", 0))
+                limit = _int_param(query, "limit", -1)
+                limit = None if limit < 0 else limit
+                arrow = query.get("format", [""])[-1] == "arrow" or ARROW_MIME in self.headers.get("Accept", "")
+                if arrow and pa is None:
+                    self._send_json(HTTPStatus.NOT_ACCEPTABLE, {"error": "Arrow responses need pyarrow"})
+                    return
+                etag = etag_for(version, endpoint, key, columns, offset, limit, arrow)
+                if _etag_matches(self.headers.get("If-None-Match"), etag):
+                    self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+                    return
+                data = service.dashboard_data(conn, key)
+                body, content_type = rows_response(data, columns, offset, limit, arrow)
+                self._send(HTTPStatus.OK, body, content_type, etag)
+                return
+
+            if endpoint == "export":
+                fmt = query.get("format", ["csv"])[-1].lower()
+                if fmt not in FORMATS:
+                    raise BadRequest("format must be one of " + ", ".join(FORMATS))
+                if fmt not in available_formats():
+                    self._send_json(HTTPStatus.NOT_ACCEPTABLE, {"error": f"{fmt} export needs pyarrow"})
+                    return
+                etag = etag_for(version, endpoint, key, fmt)
+                if _etag_matches(self.headers.get("If-None-Match"), etag):
+                    self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+                    return
+                where_sql, params = build_where_clause(*key[:7], genre_match=key[8])
+                _, content_type, extension = FORMATS[fmt]
+                parts = iter_export(conn, fmt, where_sql, params)
+                self._send_stream(parts, content_type, f"tracks.{extension}", etag)
+                return
+
+            etag = etag_for(version, endpoint, key)
+            if _etag_matches(self.headers.get("If-None-Match"), etag):
+                self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+                return
+            data = service.dashboard_data(conn, key)
+
+        if endpoint == "dashboard":
+            payload: Dict[str, Any] = {}
+            for build in AGGREGATES.values():
+                payload.update(build(data))
+        else:
+            payload = AGGREGATES[endpoint](data)
+        self._send_json(HTTPStatus.OK, payload, etag)
+
+
+class APIServer(HTTPServer):
+    """
+    HTTPServer whose connections are handled by a fixed ThreadPoolExecutor.
+    At most workers + backlog connections are accepted at once; the rest get
+    an immediate 503 instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        service: DashboardService,
+        workers: int = DEFAULT_WORKERS,
+        backlog: int = DEFAULT_BACKLOG,
+        verbose: bool = False,
+    ):
+        super().__init__(address, APIHandler)
+        self.service = service
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address) -> None:
+        if not self.slots.acquire(blocking=False):
+            try:
+                request.sendall(
+                    b"HTTP/1.1 503 Service Unavailable\r\n"
+                    b"Retry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                )
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def make_server(
+    db_path: str = DB_PATH,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    workers: int = DEFAULT_WORKERS,
+    backlog: int = DEFAULT_BACKLOG,
+    verbose: bool = False,
+) -> APIServer:
+    return APIServer((host, port), DashboardService(db_path), workers, backlog, verbose)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.db, args.host, args.port, args.workers, args.backlog, args.verbose)
+    print(f"serving {args.db} on http://{args.host}:{server.server_port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
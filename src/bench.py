@@ -0,0 +1,267 @@
+"""
+Benchmark suite for the data_loader queries and the plot builders.
+
+    python -m src.bench [--sizes 10k,100k,1M,10M] [--repeat 5] [--out bench.json]
+                        [--compare previous.json]
+
+Every data_loader query, the dashboard fetch paths (SQL, TrackStore, cube) and
+every plots.fig_* builder run against src.synth catalogs of each size under
+representative filter combinations. p50/p95 latency comes from timed runs;
+peak Python memory comes from one extra run under tracemalloc. Results are
+written as JSON so runs from different commits can be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import data_loader as dl
+from src import plots
+from src.cube import TrackCube
+from src.preprocessing import compute_correlation_matrix
+from src.synth import generate_catalog, parse_size
+
+BENCH_DIR = "data/bench"
+DEFAULT_SIZES = "10k,100k,1M,10M"
+SEED = 42
+
+# Sidebar states from wide to narrow; genres/album types are picked from the catalog's own options
+FILTER_CASES = [
+    ("all", lambda o: ([], [], o["min_year"], o["max_year"], 0, 100, "All", True)),
+    ("one genre", lambda o: (o["genres"][:1], [], o["min_year"], o["max_year"], 0, 100, "All", True)),
+    (
+        "narrowed",
+        lambda o: (o["genres"][:3], o["album_types"][:1], 2010, 2020, 20, 80, "Explicit only", True),
+    ),
+]
+
+
+def catalog_path(n_tracks: int, workdir: str = BENCH_DIR, seed: int = SEED) -> str:
+    # Catalogs are cached on disk per size and seed; building 10M rows is slow
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, f"catalog_{n_tracks}_{seed}.db")
+    if not os.path.exists(path):
+        generate_catalog(path, n_tracks, seed=seed)
+    return path
+
+
+def measure(run: Callable[[], Any], repeat: int, budget_s: float) -> Dict[str, Any]:
+    # Timed runs first, then one run under tracemalloc (which slows execution) for peak memory.
+    # A case slower than the budget is timed once rather than `repeat` times.
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+        if samples[-1] > budget_s * 1000:
+            break
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "peak_mb": peak / (1024 * 1024),
+        "runs": len(samples),
+    }
+
+
+def loader_cases(
+    conn: sqlite3.Connection,
+    filters: Tuple[Any, ...],
+    store: dl.TrackStore,
+    cube: TrackCube,
+) -> List[Tuple[str, Callable[[], Any]]]:
+    where_sql, params = dl.build_where_clause(*filters[:7])
+    exclude = filters[7]
+    cases: List[Tuple[str, Callable[[], Any]]] = [
+        ("fetch_dashboard_data [sql]", lambda: dl.fetch_dashboard_data(conn, *filters)),
+        ("fetch_dashboard_data [store]", lambda: dl.fetch_dashboard_data(conn, *filters, store=store)),
+        (
+            "fetch_dashboard_data [store+cube]",
+            lambda: dl.fetch_dashboard_data(conn, *filters, store=store, cube=cube),
+        ),
+        ("TrackCube.approx_unique_artists", lambda: cube.approx_unique_artists(*filters[:7])),
+        ("get_joined_rows", lambda: dl.get_joined_rows(conn, *filters[:7])),
+        ("sql_top_avg_genres", lambda: dl.sql_top_avg_genres(conn, where_sql, params, exclude)),
+        ("sql_genre_frequency", lambda: dl.sql_genre_frequency(conn, where_sql, params, exclude)),
+    ]
+    for func in (
+        dl.get_overview_metrics,
+        dl.sql_quantiles_track_popularity,
+        dl.sql_median_track_popularity,
+        dl.sql_yearly_agg,
+        dl.sql_explicit_summary,
+        dl.sql_popularity_over_time,
+        dl.sql_popularity_buckets,
+        dl.sql_popularity_histogram,
+        dl.sql_popularity_box,
+        dl.sql_box_explicit,
+        dl.sql_box_album_type,
+        dl.sql_rule_based_hit_evaluation,
+        dl.sql_similarity_reference,
+    ):
+        cases.append((func.__name__, lambda f=func: f(conn, where_sql, params)))
+    return cases
+
+
+def _top_artists_frame(rows: pd.DataFrame) -> pd.DataFrame:
+    # Same popularity index the EDA tab computes before fig_top_artists_index
+    agg = rows.groupby("artist_name").agg(
+        avg_artist_popularity=("artist_popularity", "mean"),
+        avg_artist_followers=("artist_followers", "mean"),
+        track_count=("track_name", "count"),
+    )
+    agg["followers_log"] = np.log10(agg["avg_artist_followers"] + 1)
+    index = 0
+    for col, weight in (("avg_artist_popularity", 0.5), ("followers_log", 0.3), ("track_count", 0.2)):
+        span = agg[col].max() - agg[col].min()
+        index = index + weight * ((agg[col] - agg[col].min()) / span if span > 0 else 0.5)
+    agg["artist_popularity_index"] = index
+    return agg.reset_index().nlargest(10, "artist_popularity_index")
+
+
+def plot_cases(data: Dict[str, Any]) -> List[Tuple[str, Callable[[], Any]]]:
+    # Each builder is timed together with to_json(), the payload st.plotly_chart sends
+    rows = data["rows_full"]
+    figures = [
+        (
+            "fig_hist_popularity",
+            lambda: plots.fig_hist_popularity(data["popularity_histogram"], data["popularity_box"]),
+        ),
+        ("fig_corr_heatmap", lambda: plots.fig_corr_heatmap(compute_correlation_matrix(rows))),
+        ("fig_line_popularity_over_time", lambda: plots.fig_line_popularity_over_time(data["popularity_over_time"])),
+        ("fig_box_popularity_over_time", lambda: plots.fig_box_popularity_over_time(rows)),
+        ("fig_box_explicit", lambda: plots.fig_box_explicit(data["box_explicit"])),
+        ("fig_bar_top_avg_genres", lambda: plots.fig_bar_top_avg_genres(data["top_avg_genres"])),
+        ("fig_bar_genre_frequency", lambda: plots.fig_bar_genre_frequency(data["genre_freq"])),
+        ("fig_scatter_artist_vs_track", lambda: plots.fig_scatter_artist_vs_track(rows)),
+        ("fig_scatter_followers_vs_track", lambda: plots.fig_scatter_followers_vs_track(rows)),
+        ("fig_scatter_duration_vs_pop", lambda: plots.fig_scatter_duration_vs_pop(rows)),
+        ("fig_box_album_type", lambda: plots.fig_box_album_type(data["box_album_type"])),
+        ("fig_top_artists_index", lambda: plots.fig_top_artists_index(_top_artists_frame(rows))),
+    ]
+    return [(f"plots.{name}", lambda b=build: b().to_json()) for name, build in figures]
+
+
+def run_size(
+    n_tracks: int,
+    repeat: int,
+    budget_s: float,
+    workdir: str = BENCH_DIR,
+) -> List[Dict[str, Any]]:
+    path = catalog_path(n_tracks, workdir)
+    conn = dl.get_connection(path)
+    results = []
+    try:
+        setup = [
+            ("TrackStore.load", lambda: dl.TrackStore.load(conn)),
+            ("TrackCube.build", lambda: TrackCube.build(conn, path)),
+            ("get_filter_options", lambda: dl.get_filter_options(conn)),
+            ("sql_global_reference_track", lambda: dl.sql_global_reference_track(conn)),
+        ]
+        for name, run in setup:
+            results.append({"size": n_tracks, "case": name, "filters": None, **measure(run, repeat, budget_s)})
+            print(f"{n_tracks:>10,}  {name:<40} {results[-1]['p50_ms']:>10.1f} ms")
+
+        store = dl.TrackStore.load(conn)
+        cube = TrackCube.build(conn, path)
+        opts = dl.get_filter_options(conn)
+        for label, make_filters in FILTER_CASES:
+            filters = make_filters(opts)
+            data = dl.fetch_dashboard_data(conn, *filters, store=store, cube=cube)
+            cases = loader_cases(conn, filters, store, cube)
+            if len(data["rows_full"]):
+                cases += plot_cases(data)
+            for name, run in cases:
+                stats = measure(run, repeat, budget_s)
+                results.append({"size": n_tracks, "case": name, "filters": label, **stats})
+                print(f"{n_tracks:>10,}  {name + ' [' + label + ']':<40} {stats['p50_ms']:>10.1f} ms")
+    finally:
+        conn.close()
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous: Dict[str, Any], current: Dict[str, Any], threshold: float = 1.2) -> int:
+    # Prints p50 ratios against an earlier run and returns how many cases regressed
+    def keyed(report):
+        return {(r["size"], r["case"], r["filters"]): r for r in report["results"]}
+
+    before, after = keyed(previous), keyed(current)
+    regressions = 0
+    print(f"\ncompared with {previous['meta'].get('commit') or 'previous run'}:")
+    for key, new in after.items():
+        old = before.get(key)
+        if old is None or not old["p50_ms"]:
+            continue
+        ratio = new["p50_ms"] / old["p50_ms"]
+        if ratio > threshold:
+            regressions += 1
+            size, case, filters = key
+            print(f"  !! {size:>10,}  {case} [{filters}]: {old['p50_ms']:.1f} -> {new['p50_ms']:.1f} ms ({ratio:.2f}x)")
+    print(f"{regressions} case(s) slower than {threshold:.1f}x")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated track counts, e.g. 10k,1M")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=30.0, help="seconds after which a case is timed once")
+    parser.add_argument("--workdir", default=BENCH_DIR)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", default=None, help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "sizes": sizes,
+            "repeat": args.repeat,
+        },
+        "results": [],
+    }
+    for n_tracks in sizes:
+        report["results"].extend(run_size(n_tracks, args.repeat, args.budget, args.workdir))
+
+    out = args.out or os.path.join(args.workdir, f"bench_{commit or 'local'}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n{len(report['results'])} results -> {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import sqlite3
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.profiler import trace_query
+
+# Rows pulled from the cursor per step; only one chunk of tuples is alive at a time
+FETCH_CHUNK = 50_000
+
+
+def _column_chunk(values: tuple) -> Union[np.ndarray, int]:
+    # Text stays an object array, numbers become int64/float64 (NULL -> NaN), like pd.read_sql_query.
+    # An all-NULL chunk is returned as its length and typed once the other chunks are known.
+    sample = next((v for v in values if v is not None), None)
+    if sample is None:
+        return len(values)
+    if isinstance(sample, (str, bytes)):
+        return np.array(values, dtype=object)
+    arr = np.array(values)
+    if arr.dtype == object:
+        try:
+            arr = np.array(values, dtype=float)
+        except (TypeError, ValueError):
+            pass
+    return arr
+
+
+def _concat(chunks: List[Union[np.ndarray, int]]) -> np.ndarray:
+    typed = [c for c in chunks if not isinstance(c, int)]
+    if not typed:
+        return np.full(sum(chunks), None, dtype=object)
+    dtype = np.result_type(*typed)
+    if len(typed) < len(chunks):
+        # NULL-only chunks become NaN in numeric columns and None otherwise
+        dtype = dtype if dtype.kind in "fO" else np.dtype(float)
+        fill = np.nan if dtype.kind == "f" else None
+        chunks = [np.full(c, fill, dtype=dtype) if isinstance(c, int) else c for c in chunks]
+    if len(chunks) == 1:
+        return chunks[0].astype(dtype, copy=False)
+    return np.concatenate(chunks).astype(dtype, copy=False)
+
+
+def _fetch_arrays(
+    conn: sqlite3.Connection,
+    query: str,
+    params: Sequence[Any],
+    chunk_size: int,
+) -> Tuple[List[str], List[np.ndarray]]:
+    # Rows are read in chunks of plain tuples (no sqlite3.Row or dict per row) and transposed per chunk
+    with trace_query(query, params) as span:
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(query, list(params))
+        names = [d[0] for d in cur.description]
+        chunks: List[List[Union[np.ndarray, int]]] = [[] for _ in names]
+        n_rows = 0
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            n_rows += len(rows)
+            for column, values in zip(chunks, zip(*rows)):
+                column.append(_column_chunk(values))
+        span["rows"] = n_rows
+        return names, [_concat(column) if column else np.empty(0, dtype=object) for column in chunks]
+
+
+def fetch_columns(
+    conn: sqlite3.Connection,
+    query: str,
+    params: Sequence[Any] = (),
+    chunk_size: int = FETCH_CHUNK,
+) -> Dict[str, np.ndarray]:
+    # One typed NumPy array per result column, in select order
+    names, arrays = _fetch_arrays(conn, query, params, chunk_size)
+    return dict(zip(names, arrays))
+
+
+def fetch_frame(
+    conn: sqlite3.Connection,
+    query: str,
+    params: Sequence[Any] = (),
+    chunk_size: int = FETCH_CHUNK,
+) -> pd.DataFrame:
+    """
+    Drop-in for pd.read_sql_query that never holds the whole result as a list
+    of row tuples: the frame is assembled from the typed column arrays.
+    """
+    names, arrays = _fetch_arrays(conn, query, params, chunk_size)
+    frame = pd.DataFrame(dict(enumerate(arrays)), copy=False)
+    frame.columns = names
+    return frame
+
+
+def as_frame(rows: Any) -> pd.DataFrame:
+    # Builders accept a DataFrame (used as is) or a list of row dicts from the aggregate queries
+    return rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
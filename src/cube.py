@@ -0,0 +1,503 @@
+"""
+Pre-aggregated cube over the sidebar filter dimensions.
+
+    python -m src.cube [--db data/spotify_database.db] [--out data/track_cube.npz]
+
+Each cell is one (genre, album_type, release_year, popularity, explicit)
+combination holding the track count, sum and sum of squares of popularity.
+Distinct artists are kept as (cell, artist) incidence pairs, so unique-artist
+counts stay exact after a roll-up; HyperLogLog sketches per (release_year,
+primary_genre, album_type) partition (src/hll.py) answer them approximately
+in constant time when the filters follow partition boundaries. Dashboard aggregates are answered by
+masking and summing cells instead of scanning tracks. After an incremental
+load (python -m src.etl --incremental) only the cells of the changed
+(release_year, primary_genre) partitions are rebuilt.
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.columnar import fetch_frame
+from src.data_loader import (
+    DB_PATH,
+    QUANTILES,
+    FilterColumns,
+    _compact_ints,
+    _decode,
+    _dictionary_encode,
+    changed_partitions_since,
+    get_connection,
+    get_data_version,
+    partition_key,
+    partition_where_clause,
+    source_version,
+)
+from src.hll import ArtistSketches
+from src.quantiles import (
+    box_stats_from_counts,
+    grouped_box_stats,
+    histogram_from_counts,
+    median_from_counts,
+    quantiles_from_counts,
+)
+
+CUBE_PATH = "data/track_cube.npz"
+
+CELL_DIMENSIONS = ["primary_genre", "album_type", "release_year", "track_popularity", "explicit"]
+
+_ARRAYS = (
+    "genre_code",
+    "album_type_code",
+    "release_year",
+    "track_popularity",
+    "explicit",
+    "count",
+    "pop_sum",
+    "pop_sumsq",
+    "pair_cell",
+    "pair_artist",
+)
+
+
+_PAIRS_QUERY = """
+SELECT
+    a.primary_genre,
+    t.album_type,
+    t.release_year,
+    t.track_popularity,
+    t.explicit,
+    t.artist_id,
+    COUNT(*) AS count,
+    SUM(t.track_popularity) AS pop_sum,
+    SUM(t.track_popularity * t.track_popularity) AS pop_sumsq
+FROM tracks t
+JOIN artists a ON t.artist_id = a.artist_id
+{where_sql}
+GROUP BY
+    a.primary_genre,
+    t.album_type,
+    t.release_year,
+    t.track_popularity,
+    t.explicit,
+    t.artist_id
+"""
+
+
+def _partition_index(frame: pd.DataFrame) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays(
+        [
+            frame["release_year"].fillna(-1).astype(np.int64),
+            frame["primary_genre"].fillna("").astype(str),
+        ]
+    )
+
+
+def _query_pairs(
+    conn: sqlite3.Connection,
+    partitions: Optional[Set[Tuple[Any, Any]]] = None,
+) -> pd.DataFrame:
+    # Grouped (cell, artist) rows for the whole database or just some partitions
+    if partitions is None:
+        return fetch_frame(conn, _PAIRS_QUERY.format(where_sql=""))
+    where_sql, params = partition_where_clause(partitions)
+    return fetch_frame(conn, _PAIRS_QUERY.format(where_sql=where_sql), params)
+
+
+class TrackCube(FilterColumns):
+    """
+    Cells of the five-dimensional filter cube. Filters evaluate over cells with
+    the same masks as TrackStore, and every aggregate is a weighted roll-up.
+    """
+
+    def __init__(
+        self,
+        arrays: Dict[str, np.ndarray],
+        genres: List[str],
+        album_types: List[str],
+        version=None,
+        sketches: Optional[ArtistSketches] = None,
+    ):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.genres = list(genres)
+        self.album_types = list(album_types)
+        self.version = version
+        # Cube files saved before the sketches existed get them rebuilt from the pairs
+        if sketches is None:
+            sketches = ArtistSketches.build(
+                self.release_year[self.pair_cell],
+                self.genre_code[self.pair_cell],
+                self.album_type_code[self.pair_cell],
+                self.pair_artist,
+            )
+        self.sketches = sketches
+
+    def __len__(self) -> int:
+        return len(self.count)
+
+    @classmethod
+    def build(cls, conn: sqlite3.Connection, db_path: str = DB_PATH) -> "TrackCube":
+        version = source_version(conn, db_path) if os.path.exists(db_path) else None
+        return cls.from_pairs(_query_pairs(conn), version=version)
+
+    @classmethod
+    def from_pairs(cls, pairs: pd.DataFrame, version=None) -> "TrackCube":
+        # One grouped row per (cell, artist); cells are rolled up from those pairs
+        cells = (
+            pairs.groupby(CELL_DIMENSIONS, dropna=False, sort=False)[["count", "pop_sum", "pop_sumsq"]]
+            .sum()
+            .reset_index()
+        )
+        return cls._from_frames(cells, pairs[CELL_DIMENSIONS + ["artist_id"]], version=version)
+
+    @classmethod
+    def _from_frames(cls, cells: pd.DataFrame, pairs: pd.DataFrame, version=None) -> "TrackCube":
+        cells = cells.sort_values(CELL_DIMENSIONS, kind="mergesort", na_position="first").reset_index(drop=True)
+        cell_index = pd.MultiIndex.from_frame(cells[CELL_DIMENSIONS])
+        pair_cell = cell_index.get_indexer(pd.MultiIndex.from_frame(pairs[CELL_DIMENSIONS]))
+
+        genre_code, genres = _dictionary_encode(
+            [None if pd.isna(g) else g for g in cells["primary_genre"]]
+        )
+        album_type_code, album_types = _dictionary_encode(
+            [None if pd.isna(a) else a for a in cells["album_type"]]
+        )
+
+        arrays = {
+            "genre_code": genre_code,
+            "album_type_code": album_type_code,
+            # Missing years are stored as -1 so they never fall inside a slider range
+            "release_year": cells["release_year"].fillna(-1).to_numpy(dtype=np.int16),
+            "track_popularity": _compact_ints(cells["track_popularity"].to_numpy(dtype=float), np.int16),
+            "explicit": cells["explicit"].to_numpy(dtype=bool),
+            "count": cells["count"].to_numpy(dtype=np.int64),
+            "pop_sum": cells["pop_sum"].to_numpy(dtype=float),
+            "pop_sumsq": cells["pop_sumsq"].to_numpy(dtype=float),
+            "pair_cell": pair_cell.astype(np.int64),
+            "pair_artist": pairs["artist_id"].to_numpy(dtype=np.int64),
+        }
+        return cls(arrays, genres, album_types, version=version)
+
+    def to_frames(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        # Cells and (cell, artist) pairs with decoded dimensions, the inverse of _from_frames
+        cells = pd.DataFrame(
+            {
+                "primary_genre": _decode(self.genre_code, self.genres),
+                "album_type": _decode(self.album_type_code, self.album_types),
+                "release_year": np.where(self.release_year >= 0, self.release_year, np.nan),
+                "track_popularity": self.track_popularity,
+                "explicit": self.explicit.astype(np.int64),
+                "count": self.count,
+                "pop_sum": self.pop_sum,
+                "pop_sumsq": self.pop_sumsq,
+            }
+        )
+        pairs = cells.loc[self.pair_cell, CELL_DIMENSIONS].reset_index(drop=True)
+        pairs["artist_id"] = self.pair_artist
+        return cells, pairs
+
+    def refresh(
+        self,
+        conn: sqlite3.Connection,
+        partitions: Set[Tuple[Any, Any]],
+        db_path: str = DB_PATH,
+    ) -> "TrackCube":
+        # New cube with only the (release_year, primary_genre) partitions re-read from the database
+        cells, pairs = self.to_frames()
+        affected = pd.MultiIndex.from_tuples([partition_key(y, g) for y, g in partitions])
+        stale_cells = _partition_index(cells).isin(affected)
+        stale_pairs = _partition_index(pairs).isin(affected)
+
+        fresh = _query_pairs(conn, partitions)
+        fresh_cells = (
+            fresh.groupby(CELL_DIMENSIONS, dropna=False, sort=False)[["count", "pop_sum", "pop_sumsq"]]
+            .sum()
+            .reset_index()
+        )
+        return TrackCube._from_frames(
+            pd.concat([cells[~stale_cells], fresh_cells], ignore_index=True),
+            pd.concat([pairs[~stale_pairs], fresh[CELL_DIMENSIONS + ["artist_id"]]], ignore_index=True),
+            version=source_version(conn, db_path),
+        )
+
+    def save(self, path: str = CUBE_PATH) -> None:
+        version = self.version or ("", 0.0, 0)
+        np.savez_compressed(
+            path,
+            genres=np.array(self.genres, dtype=str),
+            album_types=np.array(self.album_types, dtype=str),
+            version_path=np.array(version[0]),
+            version_mtime=np.array(version[1], dtype=float),
+            version_data=np.array(version[2], dtype=np.int64),
+            **{name: getattr(self, name) for name in _ARRAYS},
+            **self.sketches.to_arrays(),
+        )
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH) -> "TrackCube":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in _ARRAYS}
+            version = (
+                str(data["version_path"]),
+                float(data["version_mtime"]),
+                int(data["version_data"]),
+            )
+            return cls(
+                arrays,
+                data["genres"].tolist(),
+                data["album_types"].tolist(),
+                version=version,
+                sketches=ArtistSketches.from_arrays(data),
+            )
+
+    def is_current(self, conn: sqlite3.Connection, db_path: str = DB_PATH) -> bool:
+        return self.version == source_version(conn, db_path)
+
+    def _popularity_counts(self, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        values, inverse = np.unique(self.track_popularity[mask], return_inverse=True)
+        return values, np.bincount(inverse.ravel(), weights=self.count[mask], minlength=len(values)).astype(np.int64)
+
+    def overview_metrics(self, mask: np.ndarray, unique_artists: Optional[int] = None) -> Dict[str, Any]:
+        # unique_artists, when given, is an estimate from approx_unique_artists()
+        tracks = int(self.count[mask].sum())
+        metrics = {
+            "tracks": tracks,
+            "unique_artists": unique_artists,
+            "avg_popularity": float(self.pop_sum[mask].sum() / tracks) if tracks else 0.0,
+            "zero_popularity_count": int(self.count[mask & (self.track_popularity == 0)].sum()),
+        }
+        if unique_artists is None:
+            artists = self.pair_artist[mask[self.pair_cell]]
+            metrics["unique_artists"] = int(np.count_nonzero(np.bincount(artists))) if len(artists) else 0
+        else:
+            metrics["unique_artists_approx"] = True
+        return metrics
+
+    def approx_unique_artists(
+        self,
+        selected_genres: List[str],
+        selected_album_types: List[str],
+        year_min: int,
+        year_max: int,
+        pop_min: int,
+        pop_max: int,
+        explicit_choice: str,
+    ) -> Optional[int]:
+        # HyperLogLog estimate of the filtered distinct artists. None when the popularity or
+        # explicit filter splits partitions, which only the exact count can follow.
+        pop = self.track_popularity
+        if len(pop) and (pop_min > np.nanmin(pop) or pop_max < np.nanmax(pop)):
+            return None
+        if explicit_choice != "All":
+            return None
+        return self.sketches.distinct(
+            self._code_lookup(self.genres, selected_genres) if selected_genres else None,
+            self._code_lookup(self.album_types, selected_album_types) if selected_album_types else None,
+            year_min,
+            year_max,
+        )
+
+    def popularity_stddev(self, mask: np.ndarray) -> Optional[float]:
+        n = self.count[mask].sum()
+        if n == 0:
+            return None
+        mean = self.pop_sum[mask].sum() / n
+        return float(np.sqrt(max(self.pop_sumsq[mask].sum() / n - mean * mean, 0.0)))
+
+    def quantiles_track_popularity(
+        self,
+        mask: np.ndarray,
+        quantiles: Sequence[float] = QUANTILES,
+    ) -> List[Dict[str, Any]]:
+        values, counts = self._popularity_counts(mask)
+        results = quantiles_from_counts(values, counts, quantiles)
+        return [{"quantile": q, "value": v} for q, v in zip(quantiles, results)]
+
+    def median_track_popularity(self, mask: np.ndarray) -> Optional[float]:
+        median = median_from_counts(*self._popularity_counts(mask))
+        return float(median) if median is not None else None
+
+    def _yearly(self, mask: np.ndarray, mean_key: str, count_key: str) -> List[Dict[str, Any]]:
+        mask = mask & (self.release_year >= 0)
+        years, inverse = np.unique(self.release_year[mask], return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse, weights=self.count[mask], minlength=len(years))
+        sums = np.bincount(inverse, weights=self.pop_sum[mask], minlength=len(years))
+        return [
+            {"release_year": int(y), mean_key: float(s / c), count_key: int(c)}
+            for y, s, c in zip(years, sums, counts)
+        ]
+
+    def yearly_agg(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return self._yearly(mask, "mean", "count")
+
+    def popularity_over_time(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return self._yearly(mask, "avg_popularity", "num_tracks")
+
+    def _genre_counts(self, mask: np.ndarray, exclude_unknown: bool) -> Tuple[np.ndarray, np.ndarray]:
+        # Bins are shifted by one so NULL genres (-1) land in bin 0
+        if exclude_unknown:
+            mask = mask & (self.genre_code >= 0)
+            if "Unknown" in self.genres:
+                mask &= self.genre_code != self.genres.index("Unknown")
+        slots = self.genre_code[mask] + 1
+        counts = np.bincount(slots, weights=self.count[mask], minlength=len(self.genres) + 1)
+        sums = np.bincount(slots, weights=self.pop_sum[mask], minlength=len(self.genres) + 1)
+        return counts.astype(np.int64), sums
+
+    def _genre_label(self, slot: int) -> Optional[str]:
+        return self.genres[slot - 1] if slot > 0 else None
+
+    def top_avg_genres(self, mask: np.ndarray, exclude_unknown: bool = True) -> List[Dict[str, Any]]:
+        counts, sums = self._genre_counts(mask, exclude_unknown)
+        present = np.flatnonzero(counts)
+        top = present[np.argsort(-(sums[present] / counts[present]), kind="stable")[:10]]
+        return [
+            {
+                "primary_genre": self._genre_label(slot),
+                "avg_popularity": float(sums[slot] / counts[slot]),
+                "num_tracks": int(counts[slot]),
+            }
+            for slot in top
+        ]
+
+    def genre_frequency(self, mask: np.ndarray, exclude_unknown: bool = True) -> List[Dict[str, Any]]:
+        counts, _ = self._genre_counts(mask, exclude_unknown)
+        present = np.flatnonzero(counts)
+        top = present[np.argsort(-counts[present], kind="stable")[:10]]
+        return [
+            {"primary_genre": self._genre_label(slot), "num_tracks": int(counts[slot])}
+            for slot in top
+        ]
+
+    def explicit_summary(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        flags = self.explicit[mask].astype(np.int64)
+        counts = np.bincount(flags, weights=self.count[mask], minlength=2)
+        sums = np.bincount(flags, weights=self.pop_sum[mask], minlength=2)
+        return [
+            {"explicit": flag, "avg_popularity": float(sums[flag] / counts[flag]), "num_tracks": int(counts[flag])}
+            for flag in (0, 1)
+            if counts[flag]
+        ]
+
+    def popularity_buckets(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        # Categorizes tracks by popularity levels: Low ≤30, Medium ≤60, High >60
+        pop = self.track_popularity
+        counts = {
+            "Low": int(self.count[mask & (pop <= 30)].sum()),
+            "Medium": int(self.count[mask & (pop > 30) & (pop <= 60)].sum()),
+            "High": int(self.count[mask & (pop > 60)].sum()),
+        }
+        ordered = sorted((c for c in counts.items() if c[1]), key=lambda c: -c[1])
+        return [{"popularity_bucket": label, "num_tracks": n} for label, n in ordered]
+
+    def popularity_histogram(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return histogram_from_counts(*self._popularity_counts(mask))
+
+    def popularity_box(self, mask: np.ndarray) -> Optional[Dict[str, Any]]:
+        return box_stats_from_counts(*self._popularity_counts(mask))
+
+    def box_explicit(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return grouped_box_stats(
+            self.explicit[mask].astype(np.int64), self.track_popularity[mask], "explicit", weights=self.count[mask]
+        )
+
+    def box_album_type(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        mask = mask & (self.album_type_code >= 0)
+        stats = grouped_box_stats(
+            self.album_type_code[mask], self.track_popularity[mask], "album_type", weights=self.count[mask]
+        )
+        for row in stats:
+            row["album_type"] = self.album_types[row["album_type"]]
+        return stats
+
+    def aggregates(
+        self,
+        mask: np.ndarray,
+        exclude_unknown_genre: bool,
+        unique_artists: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "metrics": self.overview_metrics(mask, unique_artists),
+            "median_popularity": self.median_track_popularity(mask),
+            "quantiles": self.quantiles_track_popularity(mask),
+            "yearly_agg": self.yearly_agg(mask),
+            "top_avg_genres": self.top_avg_genres(mask, exclude_unknown=exclude_unknown_genre),
+            "genre_freq": self.genre_frequency(mask, exclude_unknown=exclude_unknown_genre),
+            "explicit_summary": self.explicit_summary(mask),
+            "popularity_over_time": self.popularity_over_time(mask),
+            "popularity_buckets": self.popularity_buckets(mask),
+            "popularity_histogram": self.popularity_histogram(mask),
+            "popularity_box": self.popularity_box(mask),
+            "box_explicit": self.box_explicit(mask),
+            "box_album_type": self.box_album_type(mask),
+        }
+
+
+_CUBES: Dict[str, TrackCube] = {}
+_CUBES_LOCK = threading.Lock()
+
+
+def current_cube(
+    conn: sqlite3.Connection,
+    db_path: str = DB_PATH,
+    cube_path: str = CUBE_PATH,
+) -> TrackCube:
+    # Process-wide cube per database. After an incremental load only the changed partitions
+    # are re-read; any other change (rebuild, unknown history) builds it again.
+    key = os.path.abspath(db_path)
+    with _CUBES_LOCK:
+        cube = _CUBES.get(key)
+        if cube is None:
+            cube = load_or_build_cube(conn, db_path, cube_path)
+        elif not cube.is_current(conn, db_path):
+            partitions = None
+            if cube.version is not None and get_data_version(conn) > cube.version[2]:
+                partitions = changed_partitions_since(conn, cube.version[2])
+            if partitions is None:
+                cube = TrackCube.build(conn, db_path)
+            else:
+                cube = cube.refresh(conn, partitions, db_path)
+        _CUBES[key] = cube
+        return cube
+
+
+def load_or_build_cube(
+    conn: sqlite3.Connection,
+    db_path: str = DB_PATH,
+    cube_path: str = CUBE_PATH,
+) -> TrackCube:
+    # A cube file built from an older database version is ignored and rebuilt in memory
+    if os.path.exists(cube_path):
+        cube = TrackCube.load(cube_path)
+        if cube.is_current(conn, db_path):
+            return cube
+    return TrackCube.build(conn, db_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", default=CUBE_PATH)
+    args = parser.parse_args()
+
+    conn = get_connection(args.db)
+    try:
+        cube = TrackCube.build(conn, args.db)
+    finally:
+        conn.close()
+    cube.save(args.out)
+    print(
+        f"{len(cube):,} cells, {len(cube.pair_cell):,} cell/artist pairs, "
+        f"{cube.sketches.nbytes / 1e6:.1f} MB of artist sketches -> {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,33 @@
+import os
 import sqlite3
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.cache import ResultCache
+from src.columnar import fetch_frame
+from src.genres import GENRE_MATCHES, GenreIndex, has_artist_genres
+from src.profiler import trace, trace_query
+from src.quantiles import (
+    box_stats_from_counts,
+    counts_from_values,
+    grouped_box_stats,
+    histogram_from_counts,
+    median_from_counts,
+    quantiles_from_counts,
+)
+from src.snapshot import (
+    HIT_COLUMNS,
+    QUANTILES,
+    SIMILARITY_COLUMNS,
+    SNAPSHOT_COLUMNS,
+    load_snapshot,
+    snapshot_dashboard_data,
+)
 
 DB_PATH = "data/spotify_database.db"
 
@@ -8,15 +36,109 @@ def get_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
     conn.row_factory = sqlite3.Row
     return conn
 
+class ConnectionPool:
+    """
+    Read-only SQLite connections shared across Streamlit sessions.
+    A checked-out connection belongs to one thread until it is returned, so
+    reruns reuse warm page caches and sqlite3's per-connection statement cache
+    (every query text is prepared once per connection) instead of reconnecting.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        max_idle: int = 8,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kib: int = 64 * 1024,
+        cached_statements: int = 256,
+    ):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.cached_statements = cached_statements
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+
+    def _open(self) -> sqlite3.Connection:
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        mtime = os.path.getmtime(self.db_path)
+        with self._lock:
+            # A rebuilt database file invalidates every idle connection
+            if mtime != self._mtime:
+                self._close_idle()
+                self._mtime = mtime
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _close_idle(self) -> None:
+        for conn in self._idle:
+            conn.close()
+        self._idle.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_idle()
+
+
+_POOLS: Dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path: str = DB_PATH) -> ConnectionPool:
+    # One pool per database file for the whole process
+    key = os.path.abspath(db_path)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(db_path)
+        return _POOLS[key]
+
 def fetch_all(conn: sqlite3.Connection, query: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
-    cur = conn.cursor()
-    cur.execute(query, params)
-    return [dict(r) for r in cur.fetchall()]
+    # For aggregate results (one dict per group); row-level queries go through fetch_frame
+    with trace_query(query, params) as span:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        rows = [dict(r) for r in cur.fetchall()]
+        span["rows"] = len(rows)
+    return rows
 
 def fetch_one(conn: sqlite3.Connection, query: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
-    cur = conn.cursor()
-    cur.execute(query, params)
-    row = cur.fetchone()
+    with trace_query(query, params) as span:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        row = cur.fetchone()
+        span["rows"] = 1 if row else 0
     return dict(row) if row else None
 
 def get_filter_options(conn: sqlite3.Connection) -> Dict[str, Any]:
@@ -35,14 +157,35 @@ def get_filter_options(conn: sqlite3.Connection) -> Dict[str, Any]:
         "SELECT DISTINCT album_type FROM tracks WHERE album_type IS NOT NULL ORDER BY album_type",
     )
 
+    # Every genre any artist lists; empty on databases without artist_genres
+    listed_genres = []
+    if has_artist_genres(conn):
+        listed_genres = fetch_all(conn, "SELECT DISTINCT genre FROM artist_genres ORDER BY genre")
+
     return {
         "min_year": int(years["min_year"]) if years and years["min_year"] else 1950,
         "max_year": int(years["max_year"]) if years and years["max_year"] else 2025,
         "genres": [g["primary_genre"] for g in genres],
         "album_types": [a["album_type"] for a in album_types],
+        "listed_genres": [g["genre"] for g in listed_genres],
     }
 
 
+def _genre_clause(selected_genres: List[str], genre_match: str) -> str:
+    # "primary" tests the artist's primary genre; "any"/"all" test the genres listed in artist_genres
+    placeholders = ",".join("?" * len(selected_genres))
+    if genre_match == "primary":
+        return f"a.primary_genre IN ({placeholders})"
+    if genre_match == "any":
+        return f"a.artist_id IN (SELECT artist_id FROM artist_genres WHERE genre IN ({placeholders}))"
+    if genre_match == "all":
+        return f"""a.artist_id IN (
+            SELECT artist_id FROM artist_genres WHERE genre IN ({placeholders})
+            GROUP BY artist_id HAVING COUNT(*) = {len(selected_genres)}
+        )"""
+    raise ValueError(f"genre match must be one of {', '.join(GENRE_MATCHES)}, not {genre_match!r}")
+
+
 def build_where_clause(
     selected_genres: List[str],
     selected_album_types: List[str],
@@ -51,14 +194,15 @@ def build_where_clause(
     pop_min: int,
     pop_max: int,
     explicit_choice: str,
+    genre_match: str = "primary",
 ) -> Tuple[str, List[Any]]:
     # Dynamically constructs WHERE clause based on user filters from sidebar
     clauses = []
     params: List[Any] = []
 
     if selected_genres:
-        placeholders = ",".join("?" * len(selected_genres))
-        clauses.append(f"a.primary_genre IN ({placeholders})")
+        selected_genres = list(dict.fromkeys(selected_genres))
+        clauses.append(_genre_clause(selected_genres, genre_match))
         params.extend(selected_genres)
 
     if selected_album_types:
@@ -91,7 +235,7 @@ def get_joined_rows(
     pop_max: int,
     explicit_choice: str,
     limit: Optional[int] = None,
-) -> List[Dict[str, Any]]:
+) -> pd.DataFrame:
 
     where_sql, params = build_where_clause(
         selected_genres,
@@ -123,19 +267,21 @@ def get_joined_rows(
     {limit_sql}
     """
 
-    return fetch_all(conn, query, params)
+    return fetch_frame(conn, query, params)
 
 
 def get_overview_metrics(
     conn: sqlite3.Connection,
     where_sql: str,
     params: Sequence[Any],
+    unique_artists: Optional[int] = None,
 ) -> Dict[str, Any]:
-
+    # A given unique_artists (e.g. TrackCube.approx_unique_artists) skips the COUNT(DISTINCT) sort
+    distinct_sql = "NULL" if unique_artists is not None else "COUNT(DISTINCT a.artist_name)"
     query = f"""
     SELECT
         COUNT(*) AS tracks,
-        COUNT(DISTINCT a.artist_name) AS unique_artists,
+        {distinct_sql} AS unique_artists,
         AVG(t.track_popularity) AS avg_popularity,
         SUM(CASE WHEN t.track_popularity = 0 THEN 1 ELSE 0 END) AS zero_popularity_count
     FROM tracks t
@@ -146,53 +292,81 @@ def get_overview_metrics(
 
     return {
         "tracks": int(row["tracks"] or 0),
-        "unique_artists": int(row["unique_artists"] or 0),
+        "unique_artists": int(row["unique_artists"] or 0) if unique_artists is None else unique_artists,
         "avg_popularity": float(row["avg_popularity"] or 0.0),
         "zero_popularity_count": int(row["zero_popularity_count"] or 0),
     }
 
 
-def sql_quantiles_track_popularity(
+def sql_popularity_counts(
     conn: sqlite3.Connection,
     where_sql: str,
     params: Sequence[Any],
-) -> List[Dict[str, Any]]:
-    # Calculates percentiles for track popularity distribution
-    quantiles = [0.10, 0.25, 0.50, 0.75, 0.90]
-    results = []
-
-    count_row = fetch_one(
+) -> Tuple[List[Any], List[int]]:
+    # One grouped pass: each distinct popularity value with its track count, in sort order
+    rows = fetch_all(
         conn,
         f"""
-        SELECT COUNT(*) AS n
+        SELECT t.track_popularity AS value, COUNT(*) AS n
         FROM tracks t
         JOIN artists a ON t.artist_id = a.artist_id
         {where_sql}
+        GROUP BY t.track_popularity
+        ORDER BY t.track_popularity
         """,
         params,
     )
+    return [r["value"] for r in rows], [r["n"] for r in rows]
+
 
-    n = int(count_row["n"]) if count_row and count_row["n"] else 0
-    if n == 0:
+def sql_quantiles_track_popularity(
+    conn: sqlite3.Connection,
+    where_sql: str,
+    params: Sequence[Any],
+    quantiles: Sequence[float] = QUANTILES,
+) -> List[Dict[str, Any]]:
+    # Calculates percentiles for track popularity distribution from a single grouped scan
+    values, counts = sql_popularity_counts(conn, where_sql, params)
+    results = quantiles_from_counts(values, counts, quantiles)
+    return [{"quantile": q, "value": v} for q, v in zip(quantiles, results)]
+
+
+def sql_popularity_histogram(conn, where_sql, params):
+    # Fixed-width popularity bins from the grouped counts, so no rows leave SQLite
+    return histogram_from_counts(*sql_popularity_counts(conn, where_sql, params))
+
+
+def sql_popularity_box(conn, where_sql, params):
+    values, counts = sql_popularity_counts(conn, where_sql, params)
+    return box_stats_from_counts(values, counts)
+
+
+def _sql_box_stats(conn, where_sql, params, column: str, key: str) -> List[Dict[str, Any]]:
+    # Per-group popularity counts from one GROUP BY; box summaries are built from the counts
+    where_sql = f"{where_sql} AND {column} IS NOT NULL" if where_sql else f"WHERE {column} IS NOT NULL"
+    cur = conn.execute(
+        f"""
+        SELECT {column}, t.track_popularity, COUNT(*)
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        {where_sql}
+        GROUP BY {column}, t.track_popularity
+        """,
+        list(params),
+    )
+    rows = cur.fetchall()
+    if not rows:
         return []
+    groups, values, counts = (np.array(col) for col in zip(*rows))
+    return grouped_box_stats(groups, values.astype(float), key, weights=counts.astype(float))
+
+
+def sql_box_explicit(conn, where_sql, params):
+    return _sql_box_stats(conn, where_sql, params, "t.explicit", "explicit")
 
-    for q in quantiles:
-        offset = int((n - 1) * q)
-        row = fetch_one(
-            conn,
-            f"""
-            SELECT t.track_popularity AS value
-            FROM tracks t
-            JOIN artists a ON t.artist_id = a.artist_id
-            {where_sql}
-            ORDER BY t.track_popularity
-            LIMIT 1 OFFSET {offset}
-            """,
-            params,
-        )
-        results.append({"quantile": q, "value": row["value"] if row else None})
 
-    return results
+def sql_box_album_type(conn, where_sql, params):
+    return _sql_box_stats(conn, where_sql, params, "t.album_type", "album_type")
 
 
 def sql_yearly_agg(conn, where_sql, params):
@@ -276,40 +450,170 @@ def sql_popularity_over_time(conn, where_sql, params):
     return fetch_all(conn, query, params)
 
 def sql_median_track_popularity(conn, where_sql: str, params):
-    # Computes median using manual offset calculation (SQLite lacks MEDIAN function)
-    count_row = fetch_one(
-        conn,
-        f"""
-        SELECT COUNT(*) AS n
-        FROM tracks t
-        JOIN artists a ON t.artist_id = a.artist_id
-        {where_sql}
-        """,
-        params,
+    # Computes the median from the grouped popularity counts (SQLite lacks MEDIAN function)
+    values, counts = sql_popularity_counts(conn, where_sql, params)
+    median = median_from_counts(values, counts)
+    return float(median) if median is not None else None
+
+def fetch_dashboard_data(
+    conn,
+    selected_genres,
+    selected_album_types,
+    year_min,
+    year_max,
+    pop_min,
+    pop_max,
+    explicit_choice,
+    exclude_unknown_genre,
+    genre_match="primary",
+    approx_artists=False,
+    store=None,
+    cube=None,
+):
+    # Master aggregation function: runs the filtered join once and derives every dashboard aggregate from it
+    if store is not None:
+        return store.fetch_dashboard_data(
+            selected_genres,
+            selected_album_types,
+            year_min,
+            year_max,
+            pop_min,
+            pop_max,
+            explicit_choice,
+            exclude_unknown_genre,
+            genre_match,
+            approx_artists,
+            cube=cube,
+        )
+
+    where_sql, params = build_where_clause(
+        selected_genres,
+        selected_album_types,
+        year_min,
+        year_max,
+        pop_min,
+        pop_max,
+        explicit_choice,
+        genre_match,
     )
 
-    n = int(count_row["n"] or 0)
-    if n == 0:
+    snapshot = load_snapshot(conn, where_sql, params)
+
+    aggregates = None
+    # The cube's cells are keyed by primary genre, so listed-genre filters aggregate the rows
+    if cube is not None and genre_match == "primary":
+        filters = (selected_genres, selected_album_types, year_min, year_max, pop_min, pop_max, explicit_choice)
+        aggregates = cube.aggregates(
+            cube.filter_mask(*filters),
+            exclude_unknown_genre,
+            cube.approx_unique_artists(*filters) if approx_artists else None,
+        )
+
+    return {
+        "where_sql": where_sql,
+        "params": params,
+        **snapshot_dashboard_data(snapshot, exclude_unknown_genre, aggregates),
+    }
+
+def normalize_filters(
+    selected_genres,
+    selected_album_types,
+    year_min,
+    year_max,
+    pop_min,
+    pop_max,
+    explicit_choice,
+    exclude_unknown_genre,
+    genre_match="primary",
+    approx_artists=False,
+) -> Tuple[Any, ...]:
+    # Canonical form of the sidebar state: the same filters in any selection order share one key
+    return (
+        tuple(sorted(selected_genres or ())),
+        tuple(sorted(selected_album_types or ())),
+        int(year_min),
+        int(year_max),
+        int(pop_min),
+        int(pop_max),
+        explicit_choice,
+        bool(exclude_unknown_genre),
+        # Without selected genres the match mode filters nothing, so those keys coincide
+        genre_match if selected_genres else "primary",
+        bool(approx_artists),
+    )
+
+
+def get_data_version(conn: sqlite3.Connection) -> int:
+    # Bumped by whatever rewrites the database contents
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def source_version(conn: sqlite3.Connection, db_path: str = DB_PATH) -> Tuple[Any, ...]:
+    return (os.path.abspath(db_path), os.path.getmtime(db_path), get_data_version(conn))
+
+
+def changed_partitions_since(
+    conn: sqlite3.Connection,
+    version: int,
+) -> Optional[Set[Tuple[Any, Any]]]:
+    # (release_year, primary_genre) partitions rewritten by incremental loads after `version`.
+    # None means the change is unknown or total (no history, or a full rebuild in between).
+    try:
+        modes = [
+            row[0]
+            for row in conn.execute(
+                "SELECT mode FROM data_versions WHERE version > ? ORDER BY version", (version,)
+            )
+        ]
+    except sqlite3.OperationalError:
         return None
+    if len(modes) != get_data_version(conn) - version or any(m != "incremental" for m in modes):
+        return None
+    rows = conn.execute(
+        "SELECT DISTINCT release_year, primary_genre FROM changed_partitions WHERE version > ?",
+        (version,),
+    ).fetchall()
+    return {(r[0], r[1]) for r in rows}
 
-    offset = (n - 1) // 2
 
-    row = fetch_one(
-        conn,
-        f"""
-        SELECT t.track_popularity
-        FROM tracks t
-        JOIN artists a ON t.artist_id = a.artist_id
-        {where_sql}
-        ORDER BY t.track_popularity
-        LIMIT 1 OFFSET {offset}
-        """,
-        params,
+def partition_key(year: Any, genre: Any) -> Tuple[int, str]:
+    # NULL years/genres compare as -1/"" so partitions can be matched as plain tuples
+    missing_year = year is None or (isinstance(year, float) and np.isnan(year))
+    return (-1 if missing_year else int(year), "" if genre is None or pd.isna(genre) else genre)
+
+
+def partition_where_clause(partitions: Set[Tuple[Any, Any]]) -> Tuple[str, List[Any]]:
+    # WHERE clause over the tracks/artists join selecting the given (release_year, primary_genre) partitions
+    if not partitions:
+        return "WHERE 0", []
+    keys = [partition_key(y, g) for y, g in partitions]
+    where_sql = f"""
+    WHERE (IFNULL(t.release_year, -1), IFNULL(a.primary_genre, '')) IN (
+        VALUES {", ".join(["(?, ?)"] * len(keys))}
+    )
+    """
+    return where_sql, [value for key in keys for value in key]
+
+
+def filters_touch_partitions(key: Tuple[Any, ...], partitions: Set[Tuple[Any, Any]]) -> bool:
+    # Whether a normalized filter key can select tracks from any of the partitions.
+    # Partitions carry the primary genre only, so listed-genre filters match on years alone.
+    genres, _, year_min, year_max = key[:4]
+    primary = key[8] == "primary"
+    return any(
+        year is not None
+        and year_min <= year <= year_max
+        and (not genres or not primary or genre in genres)
+        for year, genre in partitions
     )
 
-    return float(row["track_popularity"]) if row else None
 
-def fetch_dashboard_data(
+DASHBOARD_CACHE = ResultCache(
+    max_bytes=int(os.environ.get("DASHBOARD_CACHE_MB", "256")) * 1024 * 1024
+)
+
+
+def cached_fetch_dashboard_data(
     conn,
     selected_genres,
     selected_album_types,
@@ -319,9 +623,15 @@ def fetch_dashboard_data(
     pop_max,
     explicit_choice,
     exclude_unknown_genre,
+    genre_match="primary",
+    approx_artists=False,
+    store=None,
+    cube=None,
+    db_path: str = DB_PATH,
 ):
-    # Master aggregation function: compiles all queries for dashboard display
-    where_sql, params = build_where_clause(
+    # Process-wide cache in front of fetch_dashboard_data, shared by every session.
+    # Cached frames are shared too, so callers must copy before mutating them.
+    filters = (
         selected_genres,
         selected_album_types,
         year_min,
@@ -329,45 +639,49 @@ def fetch_dashboard_data(
         pop_min,
         pop_max,
         explicit_choice,
+        exclude_unknown_genre,
+        genre_match,
+        approx_artists,
     )
+    key = normalize_filters(*filters)
+    version = source_version(conn, db_path)
+    _follow_incremental_load(conn, version)
+
+    with trace("cached_fetch_dashboard_data", "data") as span:
+        data = DASHBOARD_CACHE.get(key, version)
+        span["cache_hit"] = data is not None
+        if data is None:
+            data = fetch_dashboard_data(conn, *key, store=store, cube=cube)
+            DASHBOARD_CACHE.put(key, data, version)
+    return data
+
+
+def memoized(data: Dict[str, Any], name: str, compute: Callable[[], Any]) -> Any:
+    # Memoizes a value derived from one filter state's dashboard data inside that data, so it
+    # is shared across sessions and dropped together with the cache entry it belongs to.
+    # Keep such values small: they are not counted in the cache's byte budget.
+    memo = data.setdefault("derived", {})
+    if name not in memo:
+        memo[name] = compute()
+    return memo[name]
+
+
+def _follow_incremental_load(conn: sqlite3.Connection, version: Tuple[Any, ...]) -> None:
+    # After an incremental load only entries whose filters reach a changed partition are dropped;
+    # anything else (another file, a rebuild, unknown history) falls back to clearing on get()
+    previous = DASHBOARD_CACHE.version
+    if previous is None or previous == version or previous[0] != version[0]:
+        return
+    if version[2] <= previous[2]:
+        return
+    partitions = changed_partitions_since(conn, previous[2])
+    if partitions is not None:
+        DASHBOARD_CACHE.retain(lambda key: not filters_touch_partitions(key, partitions), version)
+
+
+def dashboard_cache_stats() -> Dict[str, Any]:
+    return DASHBOARD_CACHE.stats()
 
-    return {
-        "where_sql": where_sql,
-        "params": params,
-        "metrics": get_overview_metrics(conn, where_sql, params),
-        "median_popularity": sql_median_track_popularity(conn, where_sql, params),
-        "rows_full": get_joined_rows(
-            conn,
-            selected_genres,
-            selected_album_types,
-            year_min,
-            year_max,
-            pop_min,
-            pop_max,
-            explicit_choice,
-            limit=None,
-        ),
-        "rows_sample": get_joined_rows(
-            conn,
-            selected_genres,
-            selected_album_types,
-            year_min,
-            year_max,
-            pop_min,
-            pop_max,
-            explicit_choice,
-        ),
-        "quantiles": sql_quantiles_track_popularity(conn, where_sql, params),
-        "yearly_agg": sql_yearly_agg(conn, where_sql, params),
-        "top_avg_genres": sql_top_avg_genres(
-            conn, where_sql, params, exclude_unknown=exclude_unknown_genre
-        ),
-        "genre_freq": sql_genre_frequency(
-            conn, where_sql, params, exclude_unknown=exclude_unknown_genre
-        ),
-        "explicit_summary": sql_explicit_summary(conn, where_sql, params),
-        "popularity_over_time": sql_popularity_over_time(conn, where_sql, params),
-    }
 
 def sql_popularity_buckets(conn, where_sql, params):
     # Categorizes tracks by popularity levels: Low ≤30, Medium ≤60, High >60
@@ -405,8 +719,7 @@ def sql_rule_based_hit_evaluation(conn, where_sql, params):
     {where_sql}
     """
 
-    rows = fetch_all(conn, query, params)
-    return rows
+    return fetch_frame(conn, query, params)
 
 def sql_similarity_reference(conn, where_sql, params):
     """
@@ -424,7 +737,7 @@ def sql_similarity_reference(conn, where_sql, params):
     JOIN artists a ON t.artist_id = a.artist_id
     {where_sql}
     """
-    return fetch_all(conn, query, params)
+    return fetch_frame(conn, query, params)
 
 def sql_global_reference_track(conn):
     """
@@ -451,3 +764,454 @@ def sql_global_reference_track(conn):
     LIMIT 1
     """
     return fetch_one(conn, query)
+
+
+def _like_pattern(text: str) -> str:
+    # LIKE substring pattern in which %, _ and the escape character of text match literally
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def search_tracks(conn: sqlite3.Connection, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+    # Tracks whose name contains the text, most popular first; track_id is tracks.rowid
+    pattern = _like_pattern(text)
+    query = """
+    SELECT
+        t.rowid AS track_id,
+        t.track_name,
+        a.artist_name,
+        t.release_year,
+        t.track_popularity
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.artist_id
+    WHERE t.track_name LIKE ? ESCAPE '\\'
+    ORDER BY t.track_popularity DESC, t.rowid
+    LIMIT ?
+    """
+    return fetch_all(conn, query, (pattern, limit))
+
+
+# Columns the paginated track table shows and can sort by, with their SQL expressions
+PAGE_COLUMNS: Dict[str, str] = {
+    "track_name": "t.track_name",
+    "artist_name": "a.artist_name",
+    "track_popularity": "t.track_popularity",
+    "artist_popularity": "a.artist_popularity",
+    "artist_followers": "a.artist_followers",
+    "track_duration_min": "t.track_duration_min",
+    "release_year": "t.release_year",
+    "album_type": "t.album_type",
+}
+
+PAGE_SIZE = 25
+
+
+def _keyset_clause(expr: str, cursor: Tuple[Any, int], descending: bool) -> Tuple[str, List[Any]]:
+    # Rows strictly after (value, rowid) in ORDER BY expr, t.rowid. SQLite puts NULLs first
+    # ascending and last descending, which row-value comparisons do not account for.
+    value, rowid = cursor
+    if descending:
+        if value is None:
+            return "(" + expr + " IS NULL AND t.rowid < ?)", [rowid]
+        return (
+            f"({expr} < ? OR ({expr} = ? AND t.rowid < ?) OR {expr} IS NULL)",
+            [value, value, rowid],
+        )
+    if value is None:
+        return f"({expr} IS NOT NULL OR t.rowid > ?)", [rowid]
+    return f"({expr} > ? OR ({expr} = ? AND t.rowid > ?))", [value, value, rowid]
+
+
+def fetch_track_page(
+    conn: sqlite3.Connection,
+    where_sql: str,
+    params: Sequence[Any],
+    sort_by: str = "track_popularity",
+    descending: bool = True,
+    search: str = "",
+    after: Optional[Tuple[Any, int]] = None,
+    page_size: int = PAGE_SIZE,
+) -> Tuple[pd.DataFrame, Optional[Tuple[Any, int]]]:
+    """
+    One page of the filtered tracks, sorted by `sort_by` (a PAGE_COLUMNS key)
+    with tracks.rowid breaking ties, and the cursor for the next page (None on
+    the last page). `after` is the cursor returned for the previous page, so a
+    page costs the same however deep into the result it is.
+    """
+    if sort_by not in PAGE_COLUMNS:
+        raise ValueError(f"cannot sort by {sort_by!r}")
+    expr = PAGE_COLUMNS[sort_by]
+    clauses = [where_sql[len("WHERE "):]] if where_sql else []
+    args = list(params)
+    if search:
+        pattern = _like_pattern(search)
+        clauses.append("(t.track_name LIKE ? ESCAPE '\\' OR a.artist_name LIKE ? ESCAPE '\\')")
+        args.extend([pattern, pattern])
+    if after is not None:
+        clause, cursor_args = _keyset_clause(expr, after, descending)
+        clauses.append(clause)
+        args.extend(cursor_args)
+    direction = "DESC" if descending else "ASC"
+    columns = ",\n        ".join(f"{e} AS {name}" for name, e in PAGE_COLUMNS.items())
+    query = f"""
+    SELECT
+        t.rowid AS track_id,
+        {columns}
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.artist_id
+    {"WHERE " + " AND ".join(clauses) if clauses else ""}
+    ORDER BY {expr} {direction}, t.rowid {direction}
+    LIMIT ?
+    """
+    # One extra row tells whether another page follows
+    page = fetch_frame(conn, query, args + [page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page.iloc[:page_size]
+    last = page.iloc[-1]
+    value = last[sort_by]
+    value = None if pd.isna(value) else value.item() if hasattr(value, "item") else value
+    return page, (value, int(last["track_id"]))
+
+
+def get_tracks_by_id(conn: sqlite3.Connection, track_ids: Sequence[int]) -> pd.DataFrame:
+    # Joined rows for the given tracks.rowid values, in the order given
+    ids = [int(i) for i in track_ids]
+    if not ids:
+        return pd.DataFrame(columns=["track_id"] + SNAPSHOT_COLUMNS)
+    query = f"""
+    SELECT
+        t.rowid AS track_id,
+        t.track_name,
+        t.track_popularity,
+        t.track_duration_min,
+        t.explicit,
+        t.release_year,
+        t.album_type,
+        a.artist_name,
+        a.primary_genre,
+        a.artist_popularity,
+        a.artist_followers
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.artist_id
+    WHERE t.rowid IN ({",".join("?" * len(ids))})
+    """
+    rows = fetch_frame(conn, query, ids).set_index("track_id")
+    return rows.loc[[i for i in ids if i in rows.index]].reset_index()
+
+
+def _dictionary_encode(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    # Maps each string to its index in the sorted vocabulary; NULL becomes -1.
+    # Frames read with fetch_frame hold NULL text as NaN, so NaN counts as NULL too.
+    vocab = sorted({v for v in values if v is not None and not pd.isna(v)})
+    index = {v: i for i, v in enumerate(vocab)}
+    codes = np.fromiter((index.get(v, -1) for v in values), dtype=np.int32, count=len(values))
+    return codes, vocab
+
+
+def _compact_ints(values: np.ndarray, dtype) -> np.ndarray:
+    # Keeps integral columns as small ints; averaged values (e.g. deduplicated popularity) stay float
+    finite = values[~np.isnan(values)]
+    if len(finite) == len(values) and np.array_equal(finite, np.round(finite)):
+        return values.astype(dtype)
+    return values
+
+
+class FilterColumns:
+    """
+    Evaluates the sidebar filters as boolean masks over columnar data exposing
+    track_popularity, release_year, explicit and the dictionary-encoded
+    genre_code/album_type_code columns with their genres/album_types vocabularies.
+    """
+
+    def filter_options(self) -> Dict[str, Any]:
+        years = self.release_year[self.release_year >= 0]
+        return {
+            "min_year": int(years.min()) if len(years) else 1950,
+            "max_year": int(years.max()) if len(years) else 2025,
+            "genres": list(self.genres),
+            "album_types": list(self.album_types),
+        }
+
+    def _code_lookup(self, vocab: List[str], selected: List[str]) -> np.ndarray:
+        # Last slot stays False so NULL codes (-1) never match an IN (...) filter
+        allowed = np.zeros(len(vocab) + 1, dtype=bool)
+        index = {v: i for i, v in enumerate(vocab)}
+        for value in selected:
+            if value in index:
+                allowed[index[value]] = True
+        return allowed
+
+    def filter_mask(
+        self,
+        selected_genres: List[str],
+        selected_album_types: List[str],
+        year_min: int,
+        year_max: int,
+        pop_min: int,
+        pop_max: int,
+        explicit_choice: str,
+        genre_match: str = "primary",
+    ) -> np.ndarray:
+        # Same predicates as build_where_clause, evaluated as boolean-mask operations
+        pop = self.track_popularity
+        year = self.release_year
+        mask = (pop >= pop_min) & (pop <= pop_max) & (year >= year_min) & (year <= year_max)
+
+        if selected_genres and genre_match == "primary":
+            mask &= self._code_lookup(self.genres, selected_genres)[self.genre_code]
+        elif selected_genres:
+            mask &= self.listed_genre_mask(selected_genres, genre_match)
+
+        if selected_album_types:
+            mask &= self._code_lookup(self.album_types, selected_album_types)[self.album_type_code]
+
+        if explicit_choice == "Explicit only":
+            mask &= self.explicit
+        elif explicit_choice == "Non-explicit only":
+            mask &= ~self.explicit
+
+        return mask
+
+    def listed_genre_mask(self, selected_genres: List[str], genre_match: str) -> np.ndarray:
+        raise ValueError(f"{type(self).__name__} only filters by primary genre")
+
+
+class TrackStore(FilterColumns):
+    """
+    Columnar in-memory copy of the tracks/artists join.
+    Sidebar filters evaluate as boolean masks and every sql_* aggregate has a
+    NumPy equivalent returning the same shape.
+    """
+
+    def __init__(self, frame: pd.DataFrame, genre_index: Optional[GenreIndex] = None):
+        self.track_name = frame["track_name"].to_numpy(dtype=object)
+        self.artist_name = frame["artist_name"].to_numpy(dtype=object)
+        self.artist_code, _ = _dictionary_encode(self.artist_name)
+        self.genre_code, self.genres = _dictionary_encode(frame["primary_genre"].tolist())
+        self.album_type_code, self.album_types = _dictionary_encode(frame["album_type"].tolist())
+        self.explicit = frame["explicit"].to_numpy(dtype=bool)
+        # Missing years are stored as -1 so they never fall inside a slider range
+        self.release_year = frame["release_year"].fillna(-1).to_numpy(dtype=np.int16)
+        self.track_popularity = _compact_ints(frame["track_popularity"].to_numpy(dtype=float), np.int16)
+        self.track_duration_min = frame["track_duration_min"].to_numpy(dtype=float)
+        self.artist_popularity = frame["artist_popularity"].to_numpy(dtype=float)
+        self.artist_followers = frame["artist_followers"].to_numpy(dtype=float)
+        # Listed-genre filters gather the index's artist mask by artist_id
+        self.genre_index = genre_index
+        if genre_index is not None:
+            self.artist_id = frame["artist_id"].to_numpy(dtype=np.int64)
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "TrackStore":
+        genre_index = GenreIndex.load(conn)
+        return cls(load_snapshot(conn, "", (), with_artist_id=genre_index is not None), genre_index)
+
+    def listed_genre_mask(self, selected_genres: List[str], genre_match: str) -> np.ndarray:
+        if self.genre_index is None:
+            return super().listed_genre_mask(selected_genres, genre_match)
+        size = int(self.artist_id.max()) + 1 if len(self.artist_id) else 0
+        return self.genre_index.matching_artists(selected_genres, genre_match, size)[self.artist_id]
+
+    def __len__(self) -> int:
+        return len(self.track_name)
+
+    def frame(self, mask: np.ndarray, columns: Sequence[str] = SNAPSHOT_COLUMNS) -> pd.DataFrame:
+        data = {}
+        for col in columns:
+            if col == "primary_genre":
+                values = _decode(self.genre_code[mask], self.genres)
+            elif col == "album_type":
+                values = _decode(self.album_type_code[mask], self.album_types)
+            elif col == "explicit":
+                values = self.explicit[mask].astype(np.int64)
+            elif col == "release_year":
+                values = self.release_year[mask].astype(np.int64)
+            else:
+                values = getattr(self, col)[mask]
+            data[col] = values
+        return pd.DataFrame(data)
+
+    def overview_metrics(self, mask: np.ndarray) -> Dict[str, Any]:
+        pop = self.track_popularity[mask]
+        # Shifted by one so NULL artist names (-1) land in bin 0, which COUNT(DISTINCT) skips
+        artist_counts = np.bincount(self.artist_code[mask] + 1)
+        return {
+            "tracks": int(len(pop)),
+            "unique_artists": int(np.count_nonzero(artist_counts[1:])),
+            "avg_popularity": float(pop.mean()) if len(pop) else 0.0,
+            "zero_popularity_count": int(np.count_nonzero(pop == 0)),
+        }
+
+    def quantiles_track_popularity(
+        self,
+        mask: np.ndarray,
+        quantiles: Sequence[float] = QUANTILES,
+    ) -> List[Dict[str, Any]]:
+        values, counts = counts_from_values(self.track_popularity[mask])
+        results = quantiles_from_counts(values, counts, quantiles)
+        return [{"quantile": q, "value": v} for q, v in zip(quantiles, results)]
+
+    def median_track_popularity(self, mask: np.ndarray) -> Optional[float]:
+        median = median_from_counts(*counts_from_values(self.track_popularity[mask]))
+        return float(median) if median is not None else None
+
+    def _yearly(self, mask: np.ndarray, mean_key: str, count_key: str) -> List[Dict[str, Any]]:
+        mask = mask & (self.release_year >= 0)
+        years, inverse = np.unique(self.release_year[mask], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(years))
+        sums = np.bincount(inverse, weights=self.track_popularity[mask], minlength=len(years))
+        return [
+            {"release_year": int(y), mean_key: float(s / c), count_key: int(c)}
+            for y, s, c in zip(years, sums, counts)
+        ]
+
+    def yearly_agg(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return self._yearly(mask, "mean", "count")
+
+    def popularity_over_time(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return self._yearly(mask, "avg_popularity", "num_tracks")
+
+    def _genre_counts(self, mask: np.ndarray, exclude_unknown: bool) -> Tuple[np.ndarray, np.ndarray]:
+        # Bins are shifted by one so NULL genres (-1) land in bin 0
+        codes = self.genre_code[mask]
+        pop = self.track_popularity[mask]
+        if exclude_unknown:
+            keep = codes >= 0
+            if "Unknown" in self.genres:
+                keep &= codes != self.genres.index("Unknown")
+            codes, pop = codes[keep], pop[keep]
+        counts = np.bincount(codes + 1, minlength=len(self.genres) + 1)
+        sums = np.bincount(codes + 1, weights=pop, minlength=len(self.genres) + 1)
+        return counts, sums
+
+    def _genre_label(self, slot: int) -> Optional[str]:
+        return self.genres[slot - 1] if slot > 0 else None
+
+    def top_avg_genres(self, mask: np.ndarray, exclude_unknown: bool = True) -> List[Dict[str, Any]]:
+        counts, sums = self._genre_counts(mask, exclude_unknown)
+        present = np.flatnonzero(counts)
+        avgs = sums[present] / counts[present]
+        top = present[np.argsort(-avgs, kind="stable")[:10]]
+        return [
+            {
+                "primary_genre": self._genre_label(slot),
+                "avg_popularity": float(sums[slot] / counts[slot]),
+                "num_tracks": int(counts[slot]),
+            }
+            for slot in top
+        ]
+
+    def genre_frequency(self, mask: np.ndarray, exclude_unknown: bool = True) -> List[Dict[str, Any]]:
+        counts, _ = self._genre_counts(mask, exclude_unknown)
+        present = np.flatnonzero(counts)
+        top = present[np.argsort(-counts[present], kind="stable")[:10]]
+        return [
+            {"primary_genre": self._genre_label(slot), "num_tracks": int(counts[slot])}
+            for slot in top
+        ]
+
+    def explicit_summary(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        flags = self.explicit[mask].astype(np.int64)
+        counts = np.bincount(flags, minlength=2)
+        sums = np.bincount(flags, weights=self.track_popularity[mask], minlength=2)
+        return [
+            {"explicit": flag, "avg_popularity": float(sums[flag] / counts[flag]), "num_tracks": int(counts[flag])}
+            for flag in (0, 1)
+            if counts[flag]
+        ]
+
+    def popularity_buckets(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        # Categorizes tracks by popularity levels: Low ≤30, Medium ≤60, High >60
+        pop = self.track_popularity[mask]
+        counts = {
+            "Low": int(np.count_nonzero(pop <= 30)),
+            "Medium": int(np.count_nonzero((pop > 30) & (pop <= 60))),
+            "High": int(np.count_nonzero(pop > 60)),
+        }
+        ordered = sorted((c for c in counts.items() if c[1]), key=lambda c: -c[1])
+        return [{"popularity_bucket": label, "num_tracks": n} for label, n in ordered]
+
+    def popularity_histogram(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return histogram_from_counts(*counts_from_values(self.track_popularity[mask]))
+
+    def popularity_box(self, mask: np.ndarray) -> Optional[Dict[str, Any]]:
+        return box_stats_from_counts(*counts_from_values(self.track_popularity[mask]))
+
+    def box_explicit(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        return grouped_box_stats(self.explicit[mask].astype(np.int64), self.track_popularity[mask], "explicit")
+
+    def box_album_type(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        mask = mask & (self.album_type_code >= 0)
+        stats = grouped_box_stats(self.album_type_code[mask], self.track_popularity[mask], "album_type")
+        for row in stats:
+            row["album_type"] = self.album_types[row["album_type"]]
+        return stats
+
+    def rule_based_hit_evaluation(self, mask: np.ndarray) -> pd.DataFrame:
+        return self.frame(mask, HIT_COLUMNS)
+
+    def similarity_reference(self, mask: np.ndarray) -> pd.DataFrame:
+        return self.frame(mask, SIMILARITY_COLUMNS)
+
+    def aggregates(self, mask: np.ndarray, exclude_unknown_genre: bool) -> Dict[str, Any]:
+        return {
+            "metrics": self.overview_metrics(mask),
+            "median_popularity": self.median_track_popularity(mask),
+            "quantiles": self.quantiles_track_popularity(mask),
+            "yearly_agg": self.yearly_agg(mask),
+            "top_avg_genres": self.top_avg_genres(mask, exclude_unknown=exclude_unknown_genre),
+            "genre_freq": self.genre_frequency(mask, exclude_unknown=exclude_unknown_genre),
+            "explicit_summary": self.explicit_summary(mask),
+            "popularity_over_time": self.popularity_over_time(mask),
+            "popularity_buckets": self.popularity_buckets(mask),
+            "popularity_histogram": self.popularity_histogram(mask),
+            "popularity_box": self.popularity_box(mask),
+            "box_explicit": self.box_explicit(mask),
+            "box_album_type": self.box_album_type(mask),
+        }
+
+    def fetch_dashboard_data(
+        self,
+        selected_genres,
+        selected_album_types,
+        year_min,
+        year_max,
+        pop_min,
+        pop_max,
+        explicit_choice,
+        exclude_unknown_genre,
+        genre_match="primary",
+        approx_artists=False,
+        cube=None,
+    ) -> Dict[str, Any]:
+        # Same keys as fetch_dashboard_data, answered from the in-memory columns.
+        # With a cube, aggregates roll up pre-aggregated cells and only the rows come from here;
+        # approx_artists then estimates the unique artists from its partition sketches.
+        filters = (selected_genres, selected_album_types, year_min, year_max, pop_min, pop_max, explicit_choice)
+        where_sql, params = build_where_clause(*filters, genre_match)
+        mask = self.filter_mask(*filters, genre_match)
+        rows = self.frame(mask)
+
+        if cube is not None and genre_match == "primary":
+            aggregates = cube.aggregates(
+                cube.filter_mask(*filters),
+                exclude_unknown_genre,
+                cube.approx_unique_artists(*filters) if approx_artists else None,
+            )
+        else:
+            aggregates = self.aggregates(mask, exclude_unknown_genre)
+
+        return {
+            "where_sql": where_sql,
+            "params": params,
+            "rows_full": rows,
+            "rows_sample": rows,
+            "hit_rows": rows[HIT_COLUMNS],
+            "sim_rows": rows[SIMILARITY_COLUMNS],
+            **aggregates,
+        }
+
+
+def _decode(codes: np.ndarray, vocab: List[str]) -> np.ndarray:
+    labels = np.array(list(vocab) + [None], dtype=object)
+    return labels[codes]
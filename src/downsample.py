@@ -0,0 +1,96 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Points a scatter trace may carry before it is thinned
+SCATTER_POINT_BUDGET = 10_000
+# Above this many rows the scatter becomes a 2D density heatmap instead of a sample
+DENSITY_ROW_THRESHOLD = 250_000
+GRID_BINS = 40
+
+
+def _axis_values(values: np.ndarray, log: bool) -> np.ndarray:
+    # Log axes are binned in log space so each decade gets the same resolution
+    values = values.astype(float)
+    return np.log10(np.where(values > 0, values, np.nan)) if log else values
+
+
+def grid_cells(
+    x: np.ndarray,
+    y: np.ndarray,
+    bins: int = GRID_BINS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Cell id of every point on a bins x bins grid over the finite data range (-1 when not finite)
+    finite = np.isfinite(x) & np.isfinite(y)
+    cell = np.full(len(x), -1, dtype=np.int64)
+    if not finite.any():
+        return cell, np.zeros(2), np.zeros(2)
+    lo = np.array([x[finite].min(), y[finite].min()])
+    hi = np.array([x[finite].max(), y[finite].max()])
+    span = np.where(hi > lo, hi - lo, 1.0)
+    ix = np.minimum(((x[finite] - lo[0]) / span[0] * bins).astype(np.int64), bins - 1)
+    iy = np.minimum(((y[finite] - lo[1]) / span[1] * bins).astype(np.int64), bins - 1)
+    cell[finite] = ix * bins + iy
+    return cell, lo, hi
+
+
+def stratified_sample(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    budget: int = SCATTER_POINT_BUDGET,
+    log_x: bool = False,
+    bins: int = GRID_BINS,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    About `budget` rows, sampled per 2D grid cell in proportion to the cell's
+    count. Every occupied cell keeps at least one point, so sparse regions and
+    outliers stay visible while dense regions keep their relative weight.
+    """
+    if len(df) <= budget:
+        return df
+    cell, _, _ = grid_cells(_axis_values(df[x].to_numpy(), log_x), df[y].to_numpy(dtype=float), bins)
+    valid = np.flatnonzero(cell >= 0)
+    cell = cell[valid]
+
+    counts = np.bincount(cell, minlength=bins * bins)
+    quota = np.where(counts > 0, np.maximum(1, np.round(counts * budget / len(valid))), 0).astype(np.int64)
+
+    # Random order within each cell, then keep each cell's first `quota` rows
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(cell)), cell))
+    sorted_cells = cell[order]
+    first = np.searchsorted(sorted_cells, sorted_cells, side="left")
+    rank = np.arange(len(order)) - first
+    keep = np.sort(valid[order[rank < quota[sorted_cells]]])
+    return df.iloc[keep]
+
+
+def density_grid(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    log_x: bool = False,
+    bins: int = GRID_BINS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (x centers, y centers, counts[y, x]) for a density heatmap; x centers are in data units
+    xv = _axis_values(df[x].to_numpy(), log_x)
+    yv = df[y].to_numpy(dtype=float)
+    finite = np.isfinite(xv) & np.isfinite(yv)
+    counts, x_edges, y_edges = np.histogram2d(xv[finite], yv[finite], bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    if log_x:
+        x_centers = 10 ** x_centers
+    return x_centers, y_centers, counts.T
+
+
+def scatter_plan(n_rows: int, budget: Optional[int] = SCATTER_POINT_BUDGET) -> str:
+    # "points" (all rows), "sample" (stratified sample) or "density" (2D heatmap)
+    if budget is None or n_rows <= budget:
+        return "points"
+    if n_rows > DENSITY_ROW_THRESHOLD:
+        return "density"
+    return "sample"
@@ -0,0 +1,624 @@
+"""
+Builds the dashboard database from the raw Spotify CSV.
+
+    python -m src.etl [--csv data/track_data_final.csv] [--db data/spotify_database.db]
+
+    python -m src.etl --incremental --csv weekly_dump.csv
+
+Reproduces the cleaning in `Final Project Notebook.ipynb` without holding the
+dataset in memory: the CSV is streamed in chunks into the raw_tracks staging
+table through executemany, and deduplication/aggregation runs inside SQLite.
+A full build replaces the target file atomically.
+
+Incremental mode upserts only new or changed rows (by track_id and a content
+hash), recomputes the tracks and artists they touch, and records the new data
+version together with the (release_year, primary_genre) partitions it changed
+so downstream caches can refresh just those. Both modes maintain the
+track/artist full-text search index in src/search.py and artist_genres, the
+full list of genres per artist (primary_genre is only the first of them)
+that src/genres.py indexes.
+"""
+
+import argparse
+import ast
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from src.data_loader import DB_PATH, get_data_version
+from src.search import (
+    AFFECTED_TRACKS,
+    create_search_index,
+    has_search_index,
+    index_tracks,
+    refresh_typos,
+    unindex_tracks,
+)
+
+CSV_PATH = "data/track_data_final.csv"
+CHUNK_SIZE = 50_000
+
+# pandas.read_csv's default missing-value markers plus the notebook's extra replacements
+NULL_TOKENS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+STAGING_COLUMNS = [
+    "track_id",
+    "track_name",
+    "artist_name",
+    "track_popularity",
+    "track_duration_ms",
+    "explicit",
+    "artist_popularity",
+    "artist_followers",
+    "primary_genre",
+    "release_year",
+    "album_type",
+    "genres",
+]
+
+SCHEMA = """
+CREATE TABLE artists (
+    "artist_id" INTEGER,
+    "artist_name" TEXT,
+    "artist_popularity" REAL,
+    "artist_followers" REAL,
+    "primary_genre" TEXT
+);
+CREATE TABLE tracks (
+    "track_name" TEXT,
+    "track_popularity" REAL,
+    "track_duration_min" REAL,
+    "explicit" INTEGER,
+    "release_year" INTEGER,
+    "album_type" TEXT,
+    "artist_id" INTEGER
+);
+CREATE TABLE artist_genres (
+    artist_id INTEGER,
+    genre TEXT,
+    PRIMARY KEY (artist_id, genre)
+) WITHOUT ROWID;
+CREATE TABLE data_versions (
+    version INTEGER PRIMARY KEY,
+    mode TEXT,
+    source TEXT,
+    applied_at TEXT,
+    rows_changed INTEGER
+);
+CREATE TABLE changed_partitions (
+    version INTEGER,
+    release_year INTEGER,
+    primary_genre TEXT
+);
+"""
+
+# One cleaned row per track_id, kept so later dumps can be diffed and groups recomputed
+RAW_TABLE = """
+CREATE {temp} TABLE {name} (
+    seq INTEGER PRIMARY KEY,
+    track_id TEXT UNIQUE,
+    track_name TEXT,
+    artist_name TEXT,
+    track_popularity REAL,
+    track_duration_ms REAL,
+    explicit INTEGER,
+    artist_popularity REAL,
+    artist_followers REAL,
+    primary_genre TEXT,
+    release_year INTEGER,
+    album_type TEXT,
+    genres TEXT,
+    content_hash TEXT
+)
+"""
+
+
+def _clean_text(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return None if value in NULL_TOKENS else value
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_genres(x: Optional[str]) -> List[str]:
+    # Same rules as the notebook: Python list literals, else a comma-separated string
+    if x is None:
+        return []
+    x = str(x).strip()
+
+    if x.startswith("[") and x.endswith("]"):
+        try:
+            genres = ast.literal_eval(x)
+            if isinstance(genres, list):
+                return [
+                    g.strip()
+                    for g in genres
+                    if g and str(g).lower() not in {"nan", "none"}
+                ]
+        except Exception:
+            return []
+
+    return [g.strip() for g in x.split(",") if g.strip()]
+
+
+def parse_release_year(value: Optional[str]) -> Optional[int]:
+    # The notebook's pd.to_datetime infers YYYY-MM-DD from the data, so year-only and
+    # year-month dates are coerced to missing there; keep that for identical output
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").year
+    except ValueError:
+        return None
+
+
+def clean_row(raw: Dict[str, str]) -> Optional[tuple]:
+    # One staging row per CSV record, or None when a required field is missing
+    text = {k: _clean_text(v) for k, v in raw.items()}
+    # Every listed genre, title-cased and deduplicated; the first one is the primary genre
+    genres = list(dict.fromkeys(g.title() for g in parse_genres(text.get("artist_genres")))) or ["Unknown"]
+
+    row = {
+        "track_id": text.get("track_id"),
+        "track_name": text.get("track_name"),
+        "artist_name": text.get("artist_name"),
+        "track_popularity": _to_float(text.get("track_popularity")),
+        "track_duration_ms": _to_float(text.get("track_duration_ms")),
+        "explicit": 1 if (text.get("explicit") or "").lower() in {"true", "1"} else 0,
+        "artist_popularity": _to_float(text.get("artist_popularity")),
+        "artist_followers": _to_float(text.get("artist_followers")),
+        "primary_genre": genres[0],
+        "release_year": parse_release_year(text.get("album_release_date")),
+        "album_type": text.get("album_type"),
+        "genres": json.dumps(genres),
+    }
+
+    required = (
+        "track_id",
+        "track_name",
+        "artist_name",
+        "track_popularity",
+        "track_duration_ms",
+        "artist_popularity",
+        "artist_followers",
+    )
+    if any(row[col] is None for col in required):
+        return None
+    values = tuple(row[col] for col in STAGING_COLUMNS)
+    return values + (content_hash(values),)
+
+
+def content_hash(values: tuple) -> str:
+    # Fingerprint of the cleaned row; a changed hash means the track must be re-aggregated
+    return hashlib.sha1(repr(values).encode("utf-8")).hexdigest()
+
+
+def iter_chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stage_csv(
+    conn: sqlite3.Connection,
+    csv_path: str,
+    table: str = "raw_tracks",
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    # Streams the CSV into a raw table; INSERT OR IGNORE keeps the first row per track_id
+    columns = STAGING_COLUMNS + ["content_hash"]
+    insert = f"""
+    INSERT OR IGNORE INTO {table} ({", ".join(columns)})
+    VALUES ({", ".join("?" * len(columns))})
+    """
+
+    staged = 0
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        cleaned = (row for row in map(clean_row, csv.DictReader(f)) if row is not None)
+        for chunk in iter_chunks(cleaned, chunk_size):
+            conn.execute("BEGIN")
+            conn.executemany(insert, chunk)
+            conn.execute("COMMIT")
+            staged += len(chunk)
+    return staged
+
+
+def run_script(conn: sqlite3.Connection, script: str) -> None:
+    # executescript() commits any open transaction first, so multi-statement steps run one by one
+    for statement in script.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def build_grouped(conn: sqlite3.Connection, affected_only: bool = False) -> None:
+    # Deduplicates tracks by (track_name, artist_name) as the notebook does, optionally
+    # only for the artists listed in temp.affected_artists
+    restrict = (
+        "AND artist_name IN (SELECT artist_name FROM temp.affected_artists)"
+        if affected_only
+        else ""
+    )
+    run_script(
+        conn,
+        f"""
+        DROP TABLE IF EXISTS temp.valid;
+        DROP TABLE IF EXISTS temp.grouped;
+
+        CREATE TEMP TABLE valid AS
+        SELECT *
+        FROM raw_tracks
+        WHERE track_popularity BETWEEN 0 AND 100
+          AND track_duration_ms BETWEEN 30000 AND 1200000
+          {restrict};
+
+        CREATE INDEX temp.idx_valid_group ON valid(track_name, artist_name, seq);
+
+        -- pandas' "first" skips missing values, hence the IS NOT NULL lookups
+        CREATE TEMP TABLE grouped AS
+        SELECT
+            g.track_name,
+            g.artist_name,
+            g.track_popularity,
+            g.track_duration_ms,
+            g.explicit,
+            g.artist_popularity,
+            g.artist_followers,
+            (SELECT v.primary_genre FROM valid v
+              WHERE v.track_name = g.track_name AND v.artist_name = g.artist_name
+                AND v.primary_genre IS NOT NULL
+              ORDER BY v.seq LIMIT 1) AS primary_genre,
+            (SELECT v.release_year FROM valid v
+              WHERE v.track_name = g.track_name AND v.artist_name = g.artist_name
+                AND v.release_year IS NOT NULL
+              ORDER BY v.seq LIMIT 1) AS release_year,
+            (SELECT v.album_type FROM valid v
+              WHERE v.track_name = g.track_name AND v.artist_name = g.artist_name
+                AND v.album_type IS NOT NULL
+              ORDER BY v.seq LIMIT 1) AS album_type
+        FROM (
+            SELECT
+                track_name,
+                artist_name,
+                AVG(track_popularity) AS track_popularity,
+                AVG(track_duration_ms) AS track_duration_ms,
+                MAX(explicit) AS explicit,
+                AVG(artist_popularity) AS artist_popularity,
+                AVG(artist_followers) AS artist_followers
+            FROM valid
+            GROUP BY track_name, artist_name
+        ) g;
+
+        DELETE FROM grouped WHERE release_year IS NULL;
+        CREATE INDEX temp.idx_grouped_artist ON grouped(artist_name, track_name);
+
+        DROP TABLE IF EXISTS temp.artist_agg;
+        CREATE TEMP TABLE artist_agg AS
+        SELECT
+            a.artist_name,
+            a.artist_popularity,
+            a.artist_followers,
+            (SELECT g.primary_genre FROM grouped g
+              WHERE g.artist_name = a.artist_name AND g.primary_genre IS NOT NULL
+              ORDER BY g.track_name LIMIT 1) AS primary_genre
+        FROM (
+            SELECT artist_name, MAX(artist_popularity) AS artist_popularity, MAX(artist_followers) AS artist_followers
+            FROM grouped
+            GROUP BY artist_name
+        ) a;
+        """
+    )
+
+
+def insert_tracks(conn: sqlite3.Connection, chunk_size: int = CHUNK_SIZE) -> None:
+    # Tracks stream through Python so durations round exactly like pandas' .round(2)
+    cur = conn.execute(
+        """
+        SELECT g.track_name, g.track_popularity, g.track_duration_ms, g.explicit,
+               g.release_year, g.album_type, a.artist_id
+        FROM grouped g
+        JOIN artists a ON a.artist_name = g.artist_name
+        ORDER BY g.track_name, g.artist_name
+        """
+    )
+    insert = "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)"
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        durations = np.round(np.array([r[2] for r in rows], dtype=float) / 60000, 2)
+        conn.executemany(
+            insert,
+            [(r[0], r[1], float(d), r[3], r[4], r[5], r[6]) for r, d in zip(rows, durations)],
+        )
+
+
+def insert_artist_genres(conn: sqlite3.Connection) -> None:
+    # Every genre listed on any of an artist's valid rows, for the artists in temp.valid
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO artist_genres (artist_id, genre)
+        SELECT DISTINCT a.artist_id, j.value
+        FROM valid v
+        JOIN artists a ON a.artist_name = v.artist_name,
+             json_each(v.genres) j
+        """
+    )
+
+
+def record_version(
+    conn: sqlite3.Connection,
+    version: int,
+    mode: str,
+    source: str,
+    rows_changed: int,
+    partitions: Optional[Set[Tuple[Any, Any]]] = None,
+) -> None:
+    # A version without partition rows means "everything changed"
+    conn.execute(
+        "INSERT INTO data_versions VALUES (?, ?, ?, datetime('now'), ?)",
+        (version, mode, os.path.basename(source), rows_changed),
+    )
+    if partitions:
+        conn.executemany(
+            "INSERT INTO changed_partitions VALUES (?, ?, ?)",
+            [(version, year, genre) for year, genre in sorted(partitions, key=repr)],
+        )
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def run_etl(
+    csv_path: str = CSV_PATH,
+    db_path: str = DB_PATH,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, int]:
+    # Builds next to the target and swaps it in, so readers never see a half-built database
+    previous_version = 0
+    if os.path.exists(db_path):
+        # closing(): the connection's own context manager only commits, and the file is replaced below
+        with contextlib.closing(sqlite3.connect(db_path)) as old:
+            previous_version = get_data_version(old)
+
+    tmp_path = db_path + ".building"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        conn.execute(RAW_TABLE.format(temp="", name="raw_tracks"))
+
+        staged = stage_csv(conn, csv_path, "raw_tracks", chunk_size)
+
+        conn.execute("BEGIN")
+        build_grouped(conn)
+        run_script(
+            conn,
+            """
+            INSERT INTO artists (artist_id, artist_name, artist_popularity, artist_followers, primary_genre)
+            SELECT
+                ROW_NUMBER() OVER (ORDER BY artist_name),
+                artist_name,
+                artist_popularity,
+                artist_followers,
+                primary_genre
+            FROM artist_agg
+            ORDER BY artist_name;
+
+            CREATE INDEX idx_artists_name ON artists(artist_name);
+            """
+        )
+        insert_tracks(conn, chunk_size)
+        insert_artist_genres(conn)
+        conn.execute("CREATE INDEX idx_artist_genres_genre ON artist_genres(genre, artist_id)")
+        create_search_index(conn)
+        record_version(conn, previous_version + 1, "full", csv_path, staged)
+        conn.execute("COMMIT")
+
+        stats = {
+            "staged_rows": staged,
+            "tracks": conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0],
+            "artists": conn.execute("SELECT COUNT(*) FROM artists").fetchone()[0],
+            "data_version": previous_version + 1,
+        }
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return stats
+
+
+def _partitions_of_affected_artists(conn: sqlite3.Connection) -> Set[Tuple[Any, Any]]:
+    rows = conn.execute(
+        """
+        SELECT DISTINCT t.release_year, a.primary_genre
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        WHERE a.artist_name IN (SELECT artist_name FROM temp.affected_artists)
+        """
+    ).fetchall()
+    return {(r[0], r[1]) for r in rows}
+
+
+def run_incremental(
+    csv_path: str,
+    db_path: str = DB_PATH,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, int]:
+    # Applies a catalog dump in place: only new or changed track_ids are upserted, and only
+    # the artists they belong to (old and new names) are re-aggregated
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        has_raw = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'raw_tracks'"
+        ).fetchone()
+        if not has_raw:
+            raise RuntimeError(f"{db_path} has no raw_tracks table; run a full build first")
+        raw_columns = {row[1] for row in conn.execute("PRAGMA table_info(raw_tracks)")}
+        if "genres" not in raw_columns:
+            raise RuntimeError(f"{db_path} predates the artist genre lists; run a full build first")
+
+        conn.execute(RAW_TABLE.format(temp="TEMP", name="incoming"))
+        staged = stage_csv(conn, csv_path, "temp.incoming", chunk_size)
+
+        run_script(
+            conn,
+            """
+            CREATE TEMP TABLE changed AS
+            SELECT i.*, r.track_id IS NULL AS is_new, r.artist_name AS old_artist_name
+            FROM incoming i
+            LEFT JOIN raw_tracks r ON r.track_id = i.track_id
+            WHERE r.track_id IS NULL OR r.content_hash != i.content_hash;
+
+            CREATE TEMP TABLE affected_artists AS
+            SELECT artist_name FROM changed
+            UNION
+            SELECT old_artist_name FROM changed WHERE old_artist_name IS NOT NULL;
+            """
+        )
+        inserted, updated = conn.execute(
+            "SELECT COALESCE(SUM(is_new), 0), COALESCE(SUM(1 - is_new), 0) FROM changed"
+        ).fetchone()
+        version = get_data_version(conn)
+        stats = {"staged_rows": staged, "inserted": inserted, "updated": updated, "data_version": version}
+        if inserted + updated == 0:
+            return stats
+
+        conn.execute("BEGIN")
+        before = _partitions_of_affected_artists(conn)
+
+        columns = ", ".join(STAGING_COLUMNS + ["content_hash"])
+        updates = ", ".join(f"{c} = excluded.{c}" for c in STAGING_COLUMNS[1:] + ["content_hash"])
+        # Changed rows keep their seq, so pandas-style "first" ordering is preserved
+        conn.execute(
+            f"""
+            INSERT INTO raw_tracks ({columns})
+            SELECT {columns} FROM changed WHERE true
+            ON CONFLICT(track_id) DO UPDATE SET {updates}
+            """
+        )
+
+        # The search index follows the tracks of the re-aggregated artists out and back in
+        searchable = has_search_index(conn)
+        if searchable:
+            unindex_tracks(conn, AFFECTED_TRACKS)
+        conn.execute(
+            """
+            DELETE FROM artist_genres
+            WHERE artist_id IN (
+                SELECT artist_id FROM artists
+                WHERE artist_name IN (SELECT artist_name FROM temp.affected_artists)
+            )
+            """
+        )
+        conn.execute(
+            """
+            DELETE FROM tracks
+            WHERE artist_id IN (
+                SELECT artist_id FROM artists
+                WHERE artist_name IN (SELECT artist_name FROM temp.affected_artists)
+            )
+            """
+        )
+        build_grouped(conn, affected_only=True)
+        run_script(
+            conn,
+            """
+            UPDATE artists
+            SET artist_popularity = n.artist_popularity,
+                artist_followers = n.artist_followers,
+                primary_genre = n.primary_genre
+            FROM artist_agg n
+            WHERE artists.artist_name = n.artist_name;
+
+            DELETE FROM artists
+            WHERE artist_name IN (SELECT artist_name FROM temp.affected_artists)
+              AND artist_name NOT IN (SELECT artist_name FROM artist_agg);
+
+            -- New artists are appended after the existing ids
+            INSERT INTO artists (artist_id, artist_name, artist_popularity, artist_followers, primary_genre)
+            SELECT
+                (SELECT COALESCE(MAX(artist_id), 0) FROM artists) + ROW_NUMBER() OVER (ORDER BY n.artist_name),
+                n.artist_name,
+                n.artist_popularity,
+                n.artist_followers,
+                n.primary_genre
+            FROM artist_agg n
+            WHERE n.artist_name NOT IN (SELECT artist_name FROM artists)
+            ORDER BY n.artist_name;
+            """
+        )
+        insert_tracks(conn, chunk_size)
+        insert_artist_genres(conn)
+        if searchable:
+            index_tracks(conn, AFFECTED_TRACKS)
+            refresh_typos(conn)
+
+        partitions = before | _partitions_of_affected_artists(conn)
+        version += 1
+        record_version(conn, version, "incremental", csv_path, inserted + updated, partitions)
+        conn.execute("COMMIT")
+
+        stats.update(data_version=version, partitions=len(partitions))
+        return stats
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="upsert new/changed tracks into the existing database instead of rebuilding it",
+    )
+    args = parser.parse_args(argv)
+
+    if args.incremental:
+        stats = run_incremental(args.csv, args.db, args.chunk_size)
+        print(
+            f"staged {stats['staged_rows']:,} rows: {stats['inserted']:,} new, "
+            f"{stats['updated']:,} changed (data version {stats['data_version']}, "
+            f"{stats.get('partitions', 0):,} partitions touched)"
+        )
+        return
+
+    stats = run_etl(args.csv, args.db, args.chunk_size)
+    print(
+        f"staged {stats['staged_rows']:,} rows -> {stats['tracks']:,} tracks, "
+        f"{stats['artists']:,} artists (data version {stats['data_version']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Streaming export of the filtered tracks/artists join.
+
+    python -m src.export --out tracks.csv [--format csv|parquet] [--genre Pop --genre Rap]
+                         [--genre-match primary|any|all]
+                         [--album-type single] [--year-min 2010] [--year-max 2020]
+                         [--pop-min 0] [--pop-max 100] [--explicit all|explicit|non-explicit]
+
+Rows are pulled from the cursor with fetchmany in bounded chunks and
+encoded chunk by chunk: CSV text, or one Parquet row group per chunk
+(Parquet needs the optional pyarrow). The iter_* generators yield bytes as
+soon as the first chunk is encoded, so memory stays flat and the first byte
+goes out quickly however many rows match. /v1/export in src.api streams the
+same generators over chunked HTTP.
+"""
+
+import argparse
+import csv
+import io
+import sqlite3
+import tempfile
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.data_loader import DB_PATH, build_where_clause, get_connection
+from src.genres import GENRE_MATCHES
+from src.profiler import trace_query
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+EXPORT_CHUNK = 50_000
+# The first fetch is small so the first bytes go out early; later fetches double up to the chunk size
+FIRST_CHUNK = 1_000
+
+# (column, SQL expression, Arrow type name) in export order
+EXPORT_COLUMNS: List[Tuple[str, str, str]] = [
+    ("track_name", "t.track_name", "string"),
+    ("track_popularity", "t.track_popularity", "float64"),
+    ("track_duration_min", "t.track_duration_min", "float64"),
+    ("explicit", "t.explicit", "int64"),
+    ("release_year", "t.release_year", "int64"),
+    ("album_type", "t.album_type", "string"),
+    ("artist_name", "a.artist_name", "string"),
+    ("primary_genre", "a.primary_genre", "string"),
+    ("artist_popularity", "a.artist_popularity", "float64"),
+    ("artist_followers", "a.artist_followers", "float64"),
+]
+
+EXPLICIT_CHOICES = {"all": "All", "explicit": "Explicit only", "non-explicit": "Non-explicit only"}
+
+
+def export_query(where_sql: str) -> str:
+    columns = ",\n        ".join(f"{expr} AS {name}" for name, expr, _ in EXPORT_COLUMNS)
+    return f"""
+    SELECT
+        {columns}
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.artist_id
+    {where_sql}
+    """
+
+
+def iter_row_chunks(
+    conn: sqlite3.Connection,
+    where_sql: str,
+    params: Sequence[Any],
+    chunk_size: int = EXPORT_CHUNK,
+) -> Iterator[List[tuple]]:
+    # Plain row tuples, at most chunk_size at a time
+    size = min(FIRST_CHUNK, chunk_size)
+    cur = conn.cursor()
+    cur.row_factory = None
+    query = export_query(where_sql)
+    with trace_query(query, params) as span:
+        cur.execute(query, list(params))
+    rows = 0
+    try:
+        while True:
+            chunk = cur.fetchmany(size)
+            if not chunk:
+                break
+            rows += len(chunk)
+            yield chunk
+            size = min(size * 2, chunk_size)
+    finally:
+        span["rows"] = rows
+        cur.close()
+
+
+def iter_csv(
+    conn: sqlite3.Connection,
+    where_sql: str,
+    params: Sequence[Any],
+    chunk_size: int = EXPORT_CHUNK,
+) -> Iterator[bytes]:
+    # Header first, so a download starts before the first chunk has been read
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([name for name, _, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue().encode()
+    for chunk in iter_row_chunks(conn, where_sql, params, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only stream that hands written bytes back to the generator; tell() keeps counting
+    # across drains, so the offsets Parquet records in its footer stay absolute
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def export_schema():
+    return pa.schema([(name, getattr(pa, type_name)()) for name, _, type_name in EXPORT_COLUMNS])
+
+
+def iter_parquet(
+    conn: sqlite3.Connection,
+    where_sql: str,
+    params: Sequence[Any],
+    chunk_size: int = EXPORT_CHUNK,
+) -> Iterator[bytes]:
+    # One row group per fetched chunk; the file footer follows the last one
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = export_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="snappy")
+    try:
+        for chunk in iter_row_chunks(conn, where_sql, params, chunk_size):
+            columns = list(zip(*chunk))
+            batch = pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# format -> (generator, MIME type, file extension)
+FORMATS: Dict[str, Tuple[Callable[..., Iterator[bytes]], str, str]] = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available_formats() -> List[str]:
+    return [f for f in FORMATS if f != "parquet" or pq is not None]
+
+
+def iter_export(
+    conn: sqlite3.Connection,
+    fmt: str,
+    where_sql: str,
+    params: Sequence[Any],
+    chunk_size: int = EXPORT_CHUNK,
+) -> Iterator[bytes]:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return FORMATS[fmt][0](conn, where_sql, params, chunk_size)
+
+
+def write_export(
+    path: str,
+    fmt: str,
+    where_sql: str,
+    params: Sequence[Any],
+    db_path: str = DB_PATH,
+    chunk_size: int = EXPORT_CHUNK,
+) -> int:
+    # Streams the export to a file on its own connection; returns the bytes written
+    conn = get_connection(db_path)
+    written = 0
+    try:
+        with open(path, "wb") as f:
+            for part in iter_export(conn, fmt, where_sql, params, chunk_size):
+                f.write(part)
+                written += len(part)
+    finally:
+        conn.close()
+    return written
+
+
+def export_file(
+    fmt: str,
+    where_sql: str,
+    params: Sequence[Any],
+    db_path: str = DB_PATH,
+    spool_bytes: int = 8 * 1024 * 1024,
+) -> BinaryIO:
+    # The export as a rewound file object: small exports stay in memory, larger ones spill to disk
+    f = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    conn = get_connection(db_path)
+    try:
+        for part in iter_export(conn, fmt, where_sql, params):
+            f.write(part)
+    finally:
+        conn.close()
+    f.seek(0)
+    return f
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=list(FORMATS), default=None, help="defaults to the --out extension")
+    parser.add_argument("--genre", action="append", default=[])
+    parser.add_argument("--genre-match", choices=list(GENRE_MATCHES), default="primary")
+    parser.add_argument("--album-type", action="append", default=[])
+    parser.add_argument("--year-min", type=int, default=0)
+    parser.add_argument("--year-max", type=int, default=9999)
+    parser.add_argument("--pop-min", type=int, default=0)
+    parser.add_argument("--pop-max", type=int, default=100)
+    parser.add_argument("--explicit", choices=list(EXPLICIT_CHOICES), default="all")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("parquet" if args.out.endswith(".parquet") else "csv")
+    where_sql, params = build_where_clause(
+        args.genre,
+        args.album_type,
+        args.year_min,
+        args.year_max,
+        args.pop_min,
+        args.pop_max,
+        EXPLICIT_CHOICES[args.explicit],
+        args.genre_match,
+    )
+    written = write_export(args.out, fmt, where_sql, params, args.db, args.chunk_size)
+    print(f"{written:,} bytes -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
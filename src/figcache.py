@@ -0,0 +1,115 @@
+"""
+Content-addressed cache for the plots.fig_* builders.
+
+A builder's inputs (frames, arrays, row dicts and parameters) are reduced to
+a content hash; the serialized figure JSON is stored under (builder, hash)
+in a byte-bounded LRU, so an unchanged chart is served without re-running
+plotly.express and the layout code. Figures rebuilt from the cache skip
+Plotly's property validation, which the stored JSON already passed.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import weakref
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.cache import ResultCache
+from src.profiler import trace
+
+FIGURE_CACHE = ResultCache(
+    max_bytes=int(os.environ.get("DASHBOARD_FIGURE_CACHE_MB", "64")) * 1024 * 1024
+)
+
+# Frame digests by (id(frame), columns). Frames are hashed once per object: cached dashboard
+# frames are shared read-only, so a frame must not be mutated after it has been charted.
+_FRAME_DIGESTS: Dict[Tuple[int, Optional[Tuple[str, ...]]], bytes] = {}
+
+
+def _frame_digest(frame: pd.DataFrame, columns: Optional[Tuple[str, ...]]) -> bytes:
+    key = (id(frame), columns)
+    digest = _FRAME_DIGESTS.get(key)
+    if digest is None:
+        part = frame if columns is None else frame[[c for c in columns if c in frame.columns]]
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((list(part.columns), [str(t) for t in part.dtypes])).encode())
+        h.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        digest = h.digest()
+        _FRAME_DIGESTS[key] = digest
+        weakref.finalize(frame, _FRAME_DIGESTS.pop, key, None)
+    return digest
+
+
+def _feed(h, value: Any, columns: Optional[Tuple[str, ...]]) -> None:
+    if isinstance(value, pd.DataFrame):
+        h.update(b"F")
+        h.update(_frame_digest(value, columns))
+    elif isinstance(value, pd.Series):
+        h.update(b"S")
+        _feed(h, value.to_frame(), None)
+    elif isinstance(value, np.ndarray):
+        h.update(f"A{value.dtype}{value.shape}".encode())
+        if value.dtype == object:
+            h.update(pd.util.hash_array(value.ravel()).tobytes())
+        else:
+            h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(f"D{len(value)}".encode())
+        for k, v in value.items():
+            _feed(h, k, columns)
+            _feed(h, v, columns)
+    elif isinstance(value, (list, tuple)):
+        h.update(f"L{len(value)}".encode())
+        for v in value:
+            _feed(h, v, columns)
+    else:
+        # Scalars: the type keeps 1, 1.0 and "1" apart
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+def content_hash(value: Any, columns: Optional[Sequence[str]] = None) -> str:
+    # Hex digest of a builder's inputs; `columns` limits DataFrames to the columns the builder reads
+    h = hashlib.blake2b(digest_size=16)
+    _feed(h, value, tuple(columns) if columns is not None else None)
+    return h.hexdigest()
+
+
+def figure_from_json(payload: str) -> go.Figure:
+    return go.Figure(json.loads(payload), _validate=False)
+
+
+def cached_figure(
+    build: Optional[Callable[..., go.Figure]] = None,
+    *,
+    columns: Optional[Sequence[str]] = None,
+):
+    """
+    Decorator for figure builders: `@cached_figure`, or `@cached_figure(columns=[...])`
+    when the builder takes a large frame but only reads some of its columns.
+    """
+
+    def decorate(func: Callable[..., go.Figure]) -> Callable[..., go.Figure]:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, content_hash((args, sorted(kwargs.items())), columns))
+            with trace("figure_cache", "cache", builder=func.__name__) as span:
+                payload = FIGURE_CACHE.get(key)
+                span["hit"] = payload is not None
+            if payload is not None:
+                return figure_from_json(payload)
+            fig = func(*args, **kwargs)
+            FIGURE_CACHE.put(key, fig.to_json())
+            return fig
+
+        return wrapper
+
+    return decorate(build) if build is not None else decorate
+
+
+def figure_cache_stats() -> Dict[str, Any]:
+    return FIGURE_CACHE.stats()
@@ -0,0 +1,151 @@
+"""
+Compressed bitmap index over the artist-genre mapping.
+
+artist_genres (built by src/etl.py) lists every genre of every artist, not
+just the primary one. GenreIndex keeps one bitmap per genre over artist ids,
+stored roaring-style: ids are split into 65,536-wide chunks and each chunk of
+a genre is either a sorted uint16 array (sparse) or a 1,024-word bitset
+(dense), whichever is smaller. ANY/ALL genre filters OR/AND the selected
+genres' bitmaps word by word, so their cost depends on the genres selected
+rather than on how many genres exist, and the result maps onto tracks with a
+single gather by artist_id.
+"""
+
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.columnar import fetch_columns
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_WORDS = CHUNK_SIZE // 64
+# Past this many ids a chunk's uint16 array is larger than its 8 KB bitset
+ARRAY_MAX = 4096
+
+# Ways the genre filter can match an artist
+GENRE_MATCHES = {
+    "primary": "Primary genre",
+    "any": "Any listed genre",
+    "all": "All listed genres",
+}
+
+
+def has_artist_genres(conn: sqlite3.Connection) -> bool:
+    # Databases built by the notebook or before genre lists were kept only have primary_genre
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'artist_genres'"
+    ).fetchone()
+    return row is not None
+
+
+def _chunk_words(container: np.ndarray) -> np.ndarray:
+    # A chunk as CHUNK_WORDS uint64 words, whichever way it is stored
+    if container.dtype == np.uint64:
+        return container
+    bits = np.zeros(CHUNK_SIZE, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+class GenreBitmap:
+    """
+    The artist ids of one genre: chunk number -> sorted uint16 array of the
+    low 16 bits, or a uint64 bitset of CHUNK_WORDS words.
+    """
+
+    __slots__ = ("containers", "cardinality")
+
+    def __init__(self, containers: Dict[int, np.ndarray], cardinality: int):
+        self.containers = containers
+        self.cardinality = cardinality
+
+    @classmethod
+    def from_ids(cls, ids: np.ndarray) -> "GenreBitmap":
+        ids = np.unique(np.asarray(ids, dtype=np.uint32))
+        chunks = ids >> CHUNK_BITS
+        containers = {}
+        for part in np.split(ids, np.flatnonzero(np.diff(chunks)) + 1):
+            if not len(part):
+                continue
+            low = (part & (CHUNK_SIZE - 1)).astype(np.uint16)
+            containers[int(part[0] >> CHUNK_BITS)] = low if len(low) <= ARRAY_MAX else _chunk_words(low)
+        return cls(containers, len(ids))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.containers.values())
+
+
+class GenreIndex:
+    """
+    One GenreBitmap per genre. matching_artists() evaluates an ANY/ALL genre
+    filter as a boolean mask indexed by artist_id.
+    """
+
+    def __init__(self, bitmaps: Dict[str, GenreBitmap], id_limit: int):
+        self.bitmaps = bitmaps
+        # Exclusive upper bound of the artist ids covered
+        self.id_limit = id_limit
+
+    @classmethod
+    def from_pairs(cls, artist_ids: np.ndarray, genres: Sequence[str]) -> "GenreIndex":
+        artist_ids = np.asarray(artist_ids, dtype=np.int64)
+        vocab, codes = np.unique(np.asarray(genres, dtype=object).astype(str), return_inverse=True)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(vocab) + 1))
+        bitmaps = {
+            str(genre): GenreBitmap.from_ids(artist_ids[order[bounds[i]:bounds[i + 1]]])
+            for i, genre in enumerate(vocab)
+        }
+        id_limit = int(artist_ids.max()) + 1 if len(artist_ids) else 0
+        return cls(bitmaps, id_limit)
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> Optional["GenreIndex"]:
+        # None when the database has no artist_genres table
+        if not has_artist_genres(conn):
+            return None
+        pairs = fetch_columns(conn, "SELECT artist_id, genre FROM artist_genres WHERE genre IS NOT NULL")
+        return cls.from_pairs(pairs["artist_id"], pairs["genre"])
+
+    @property
+    def genres(self) -> List[str]:
+        return sorted(self.bitmaps)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self.bitmaps.values())
+
+    def matching_artists(self, selected: Sequence[str], match: str, size: Optional[int] = None) -> np.ndarray:
+        """
+        Boolean mask over artist ids 0..size-1 of the artists listing any
+        (match="any") or all (match="all") of the selected genres. Unknown
+        genres match no artist.
+        """
+        if match not in ("any", "all"):
+            raise ValueError(f"genre match must be 'any' or 'all', not {match!r}")
+        size = self.id_limit if size is None else size
+        n_chunks = max(1, -(-max(size, self.id_limit) // CHUNK_SIZE))
+        bitmaps = [self.bitmaps.get(g) for g in dict.fromkeys(selected)]
+        words = np.zeros(n_chunks * CHUNK_WORDS, dtype=np.uint64)
+
+        if match == "any":
+            for bitmap in bitmaps:
+                for chunk, container in (bitmap.containers.items() if bitmap else ()):
+                    words[chunk * CHUNK_WORDS:(chunk + 1) * CHUNK_WORDS] |= _chunk_words(container)
+        elif bitmaps and all(bitmaps):
+            # Smallest genre first: only its chunks can survive the intersection
+            bitmaps.sort(key=lambda b: b.cardinality)
+            for chunk, container in bitmaps[0].containers.items():
+                acc = _chunk_words(container).copy()
+                for other in bitmaps[1:]:
+                    if chunk not in other.containers:
+                        acc[:] = 0
+                        break
+                    acc &= _chunk_words(other.containers[chunk])
+                words[chunk * CHUNK_WORDS:(chunk + 1) * CHUNK_WORDS] = acc
+
+        bits = np.unpackbits(words.view(np.uint8), bitorder="little")
+        return bits[:size].astype(bool)
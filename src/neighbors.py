@@ -0,0 +1,421 @@
+"""
+Nearest-neighbour index for "tracks similar to X" queries.
+
+    python -m src.neighbors [--db data/spotify_database.db] [--out data/track_neighbors.npz]
+                            [--track ROWID] [--k 10]
+
+A KD-tree over the min-max normalized similarity features of every track
+(artist popularity, log followers and duration by default; see NN_FEATURES).
+Any track, identified by its tracks.rowid, can be the anchor. Queries visit
+nodes best-first and prune by bounding box, so top-k lookups touch a few
+leaves even for millions of tracks.
+
+After an incremental load only the changed (release_year, primary_genre)
+partitions are re-read: their old points are tombstoned and the new ones go
+to a brute-force delta buffer. The tree is rebuilt once the delta grows past
+REBUILD_FRACTION of the index.
+"""
+
+import argparse
+import heapq
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.columnar import fetch_frame
+from src.data_loader import (
+    DB_PATH,
+    _dictionary_encode,
+    changed_partitions_since,
+    get_connection,
+    get_data_version,
+    partition_key,
+    partition_where_clause,
+    source_version,
+)
+
+INDEX_PATH = "data/track_neighbors.npz"
+LEAF_SIZE = 64
+NEIGHBOR_K = 20
+REBUILD_FRACTION = 0.05
+
+# Feature name -> (SQL column over the tracks/artists join, optional transform)
+NN_FEATURES: Dict[str, Tuple[str, Optional[Callable[[np.ndarray], np.ndarray]]]] = {
+    "artist_popularity": ("a.artist_popularity", None),
+    "artist_followers_log": ("a.artist_followers", lambda v: np.log10(v + 1)),
+    "track_duration_min": ("t.track_duration_min", None),
+}
+DEFAULT_FEATURES = list(NN_FEATURES)
+
+_TREE_ARRAYS = ("node_start", "node_end", "node_left", "node_right", "node_lo", "node_hi")
+_POINT_ARRAYS = ("points", "ids", "release_year", "genre_code", "alive")
+_DELTA_ARRAYS = ("delta_points", "delta_ids", "delta_year", "delta_genre")
+
+
+def load_points(
+    conn: sqlite3.Connection,
+    features: Sequence[str] = DEFAULT_FEATURES,
+    partitions: Optional[Set[Tuple[Any, Any]]] = None,
+) -> pd.DataFrame:
+    # rowid, partition columns and raw feature values; tracks with a missing feature are not indexed
+    columns = ",\n        ".join(f"{NN_FEATURES[f][0]} AS {f}" for f in features)
+    where_sql, params = partition_where_clause(partitions) if partitions is not None else ("", [])
+    frame = fetch_frame(
+        conn,
+        f"""
+        SELECT
+            t.rowid AS id,
+            t.release_year,
+            a.primary_genre,
+            {columns}
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        {where_sql}
+        """,
+        params,
+    )
+    for f in features:
+        transform = NN_FEATURES[f][1]
+        if transform is not None:
+            frame[f] = transform(frame[f].to_numpy(dtype=float))
+    return frame.dropna(subset=list(features)).reset_index(drop=True)
+
+
+def build_tree(points: np.ndarray, leaf_size: int = LEAF_SIZE) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Median-split KD-tree on the widest dimension. Returns the permutation that
+    makes every node a contiguous slice of the points, and the node arrays.
+    """
+    order = np.arange(len(points))
+    start, end, left, right, lo, hi = [], [], [], [], [], []
+    # (slice start, slice end, parent node, which child of the parent)
+    stack = [(0, len(points), -1, None)]
+
+    while stack:
+        s, e, parent, side = stack.pop()
+        node = len(start)
+        if parent >= 0:
+            (left if side == "left" else right)[parent] = node
+        sub = points[order[s:e]]
+        start.append(s)
+        end.append(e)
+        left.append(-1)
+        right.append(-1)
+        lo.append(sub.min(axis=0) if e > s else np.zeros(points.shape[1]))
+        hi.append(sub.max(axis=0) if e > s else np.zeros(points.shape[1]))
+        if e - s > leaf_size:
+            dim = int(np.argmax(hi[-1] - lo[-1]))
+            mid = (e - s) // 2
+            order[s:e] = order[s:e][np.argpartition(sub[:, dim], mid)]
+            stack.append((s + mid, e, node, "right"))
+            stack.append((s, s + mid, node, "left"))
+
+    tree = {
+        "node_start": np.array(start, dtype=np.int64),
+        "node_end": np.array(end, dtype=np.int64),
+        "node_left": np.array(left, dtype=np.int64),
+        "node_right": np.array(right, dtype=np.int64),
+        "node_lo": np.array(lo, dtype=points.dtype).reshape(-1, points.shape[1]),
+        "node_hi": np.array(hi, dtype=points.dtype).reshape(-1, points.shape[1]),
+    }
+    return order, tree
+
+
+def _box_distance(q: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> float:
+    gap = np.maximum(np.maximum(lo - q, q - hi), 0)
+    return float(np.dot(gap, gap))
+
+
+def _merge(best_d, best_i, dist, idx, k):
+    # Keeps the k smallest (distance, id) pairs of the current best and a new batch
+    d = np.concatenate([best_d, dist])
+    i = np.concatenate([best_i, idx])
+    if len(d) > k:
+        keep = np.argpartition(d, k - 1)[:k]
+        d, i = d[keep], i[keep]
+    return d, i
+
+
+class NeighborIndex:
+    """
+    KD-tree over normalized track features plus a delta buffer of points
+    added since the last build. Distances are Euclidean in [0, 1]-scaled
+    feature space, with the scaling fixed when the tree is built.
+    """
+
+    def __init__(
+        self,
+        arrays: Dict[str, np.ndarray],
+        features: Sequence[str],
+        genres: List[str],
+        lo: np.ndarray,
+        span: np.ndarray,
+        version=None,
+    ):
+        for name in _TREE_ARRAYS + _POINT_ARRAYS + _DELTA_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.features = list(features)
+        self.genres = list(genres)
+        self.lo = lo
+        self.span = span
+        self.version = version
+        # rowid -> tree position, for picking anchors
+        self._id_order = np.argsort(self.ids, kind="stable")
+
+    def __len__(self) -> int:
+        return int(self.alive.sum()) + len(self.delta_ids)
+
+    @classmethod
+    def build(
+        cls,
+        conn: sqlite3.Connection,
+        db_path: str = DB_PATH,
+        features: Sequence[str] = DEFAULT_FEATURES,
+        leaf_size: int = LEAF_SIZE,
+    ) -> "NeighborIndex":
+        frame = load_points(conn, features)
+        raw = frame[list(features)].to_numpy(dtype=float)
+        lo = raw.min(axis=0) if len(raw) else np.zeros(len(features))
+        span = (raw.max(axis=0) - lo) if len(raw) else np.ones(len(features))
+        span[span == 0] = 1.0
+        points = ((raw - lo) / span).astype(np.float32)
+
+        order, tree = build_tree(points, leaf_size)
+        genre_code, genres = _dictionary_encode(
+            [None if pd.isna(g) else g for g in frame["primary_genre"]]
+        )
+        arrays = {
+            **tree,
+            "points": points[order],
+            "ids": frame["id"].to_numpy(dtype=np.int64)[order],
+            "release_year": frame["release_year"].fillna(-1).to_numpy(dtype=np.int16)[order],
+            "genre_code": genre_code[order],
+            "alive": np.ones(len(order), dtype=bool),
+            "delta_points": np.empty((0, len(features)), dtype=np.float32),
+            "delta_ids": np.empty(0, dtype=np.int64),
+            "delta_year": np.empty(0, dtype=np.int16),
+            "delta_genre": np.empty(0, dtype=object),
+        }
+        version = source_version(conn, db_path) if os.path.exists(db_path) else None
+        return cls(arrays, features, genres, lo, span, version=version)
+
+    def save(self, path: str = INDEX_PATH) -> None:
+        version = self.version or ("", 0.0, 0)
+        arrays = {name: getattr(self, name) for name in _TREE_ARRAYS + _POINT_ARRAYS + _DELTA_ARRAYS}
+        arrays["delta_genre"] = np.array(
+            ["" if g is None else g for g in self.delta_genre], dtype=str
+        ).reshape(-1)
+        np.savez(
+            path,
+            features=np.array(self.features, dtype=str),
+            genres=np.array(self.genres, dtype=str),
+            lo=self.lo,
+            span=self.span,
+            version_path=np.array(version[0]),
+            version_mtime=np.array(version[1], dtype=float),
+            version_data=np.array(version[2], dtype=np.int64),
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "NeighborIndex":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in _TREE_ARRAYS + _POINT_ARRAYS + _DELTA_ARRAYS}
+            arrays["delta_genre"] = np.array(
+                [g or None for g in data["delta_genre"].tolist()], dtype=object
+            )
+            version = (str(data["version_path"]), float(data["version_mtime"]), int(data["version_data"]))
+            return cls(
+                arrays,
+                data["features"].tolist(),
+                data["genres"].tolist(),
+                data["lo"],
+                data["span"],
+                version=version,
+            )
+
+    def is_current(self, conn: sqlite3.Connection, db_path: str = DB_PATH) -> bool:
+        return self.version == source_version(conn, db_path)
+
+    def vector(self, track_id: int) -> Optional[np.ndarray]:
+        # Normalized features of a track; the delta buffer holds the newer copy of changed tracks
+        in_delta = np.flatnonzero(self.delta_ids == track_id)
+        if len(in_delta):
+            return self.delta_points[in_delta[0]]
+        pos = np.searchsorted(self.ids, track_id, sorter=self._id_order)
+        if pos < len(self.ids):
+            tree_pos = self._id_order[pos]
+            if self.ids[tree_pos] == track_id and self.alive[tree_pos]:
+                return self.points[tree_pos]
+        return None
+
+    def query_vector(self, q: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        # Best-first search over the tree, then a brute-force pass over the delta buffer.
+        # Returns (ids, distances), nearest first with ties broken by id.
+        q = np.asarray(q, dtype=np.float32)
+        best_d = np.empty(0, dtype=np.float32)
+        best_i = np.empty(0, dtype=np.int64)
+        kth = np.inf
+
+        heap = [(0.0, 0)] if len(self.node_start) else []
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if bound > kth:
+                break
+            left = self.node_left[node]
+            if left < 0:
+                s, e = self.node_start[node], self.node_end[node]
+                diff = self.points[s:e] - q
+                dist = np.einsum("ij,ij->i", diff, diff)
+                live = self.alive[s:e]
+                best_d, best_i = _merge(best_d, best_i, dist[live], self.ids[s:e][live], k)
+                if len(best_d) == k:
+                    kth = float(best_d.max())
+            else:
+                for child in (left, self.node_right[node]):
+                    bound = _box_distance(q, self.node_lo[child], self.node_hi[child])
+                    if bound <= kth:
+                        heapq.heappush(heap, (bound, int(child)))
+
+        if len(self.delta_ids):
+            diff = self.delta_points - q
+            best_d, best_i = _merge(best_d, best_i, np.einsum("ij,ij->i", diff, diff), self.delta_ids, k)
+
+        order = np.lexsort((best_i, best_d))
+        return best_i[order], np.sqrt(best_d[order].astype(float))
+
+    def query(self, track_id: int, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        # The k nearest other tracks to an anchor track, by tracks.rowid
+        q = self.vector(track_id)
+        if q is None:
+            raise KeyError(f"track {track_id} is not in the neighbour index")
+        ids, dist = self.query_vector(q, k + 1)
+        keep = ids != track_id
+        return ids[keep][:k], dist[keep][:k]
+
+    def _partition_mask(self, years: np.ndarray, genres: np.ndarray, partitions: Set[Tuple[Any, Any]]) -> np.ndarray:
+        # Codes are shifted by one so NULL genres (-1) get their own key
+        codes = {g: i for i, g in enumerate(self.genres)}
+        width = len(self.genres) + 1
+        keys = []
+        for year, genre in (partition_key(y, g) for y, g in partitions):
+            if genre == "":
+                keys.append(year * width)
+            elif genre in codes:
+                keys.append(year * width + codes[genre] + 1)
+        point_keys = years.astype(np.int64) * width + (genres.astype(np.int64) + 1)
+        return np.isin(point_keys, np.array(keys, dtype=np.int64))
+
+    def refresh(
+        self,
+        conn: sqlite3.Connection,
+        partitions: Set[Tuple[Any, Any]],
+        db_path: str = DB_PATH,
+    ) -> "NeighborIndex":
+        # New index with the partitions' old points tombstoned and their current rows in the delta
+        alive = self.alive & ~self._partition_mask(self.release_year, self.genre_code, partitions)
+        affected = {partition_key(y, g) for y, g in partitions}
+        keep_delta = np.array(
+            [partition_key(y, g) not in affected for y, g in zip(self.delta_year, self.delta_genre)],
+            dtype=bool,
+        ).reshape(-1)
+
+        fresh = load_points(conn, self.features, partitions)
+        fresh_points = ((fresh[self.features].to_numpy(dtype=float) - self.lo) / self.span).astype(np.float32)
+
+        arrays = {name: getattr(self, name) for name in _TREE_ARRAYS + _POINT_ARRAYS}
+        arrays.update(
+            alive=alive,
+            delta_points=np.concatenate([self.delta_points[keep_delta], fresh_points]),
+            delta_ids=np.concatenate([self.delta_ids[keep_delta], fresh["id"].to_numpy(dtype=np.int64)]),
+            delta_year=np.concatenate(
+                [self.delta_year[keep_delta], fresh["release_year"].fillna(-1).to_numpy(dtype=np.int16)]
+            ),
+            delta_genre=np.concatenate(
+                [self.delta_genre[keep_delta], fresh["primary_genre"].to_numpy(dtype=object)]
+            ),
+        )
+        return NeighborIndex(
+            arrays, self.features, self.genres, self.lo, self.span, version=source_version(conn, db_path)
+        )
+
+    def needs_rebuild(self) -> bool:
+        stale = len(self.alive) - int(self.alive.sum()) + len(self.delta_ids)
+        return stale > REBUILD_FRACTION * max(len(self.alive), 1)
+
+
+def load_or_build_index(
+    conn: sqlite3.Connection,
+    db_path: str = DB_PATH,
+    index_path: str = INDEX_PATH,
+) -> NeighborIndex:
+    # A saved index from an older version is caught up from the partition history when possible
+    if os.path.exists(index_path):
+        index = NeighborIndex.load(index_path)
+        if index.is_current(conn, db_path):
+            return index
+        return _catch_up(conn, index, db_path)
+    return NeighborIndex.build(conn, db_path)
+
+
+def _catch_up(conn: sqlite3.Connection, index: NeighborIndex, db_path: str) -> NeighborIndex:
+    partitions = None
+    if index.version is not None and get_data_version(conn) > index.version[2]:
+        partitions = changed_partitions_since(conn, index.version[2])
+    if partitions is None:
+        return NeighborIndex.build(conn, db_path, index.features)
+    index = index.refresh(conn, partitions, db_path)
+    if index.needs_rebuild():
+        return NeighborIndex.build(conn, db_path, index.features)
+    return index
+
+
+_INDEXES: Dict[str, NeighborIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def current_index(
+    conn: sqlite3.Connection,
+    db_path: str = DB_PATH,
+    index_path: str = INDEX_PATH,
+) -> NeighborIndex:
+    # Process-wide index per database, kept in step with incremental loads
+    key = os.path.abspath(db_path)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = load_or_build_index(conn, db_path, index_path)
+        elif not index.is_current(conn, db_path):
+            index = _catch_up(conn, index, db_path)
+        _INDEXES[key] = index
+        return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", default=INDEX_PATH)
+    parser.add_argument("--track", type=int, default=None, help="print the neighbours of this tracks.rowid")
+    parser.add_argument("--k", type=int, default=NEIGHBOR_K)
+    args = parser.parse_args()
+
+    conn = get_connection(args.db)
+    try:
+        index = NeighborIndex.build(conn, args.db)
+        index.save(args.out)
+        print(f"{len(index):,} tracks, {len(index.node_start):,} nodes -> {args.out}")
+        if args.track is not None:
+            ids, dist = index.query(args.track, args.k)
+            for track_id, d in zip(ids, dist):
+                name = conn.execute("SELECT track_name FROM tracks WHERE rowid = ?", (int(track_id),)).fetchone()[0]
+                print(f"{d:.4f}  {track_id:>8}  {name}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
-import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from src.columnar import as_frame
+from src.downsample import SCATTER_POINT_BUDGET, density_grid, scatter_plan, stratified_sample
+from src.figcache import cached_figure
+from src.profiler import traced_figure
 
 SPOTIFY_GREEN = "#1DB954"
 BG_COLOR = "#121212"
@@ -33,22 +39,61 @@ def _base_layout(fig):
     return fig
 
 
-def fig_hist_popularity(rows):
-    df = pd.DataFrame(rows)
-
-    fig = px.histogram(
-        df,
-        x="track_popularity",
-        nbins=20,
-        marginal="box",
-        color_discrete_sequence=[SPOTIFY_GREEN],
+def _box_traces(stats, key, orientation="v"):
+    # Box traces drawn from precomputed summaries, plus a marker trace for the sampled outliers
+    labels = [row[key] for row in stats]
+    box = dict(
+        q1=[row["q1"] for row in stats],
+        median=[row["median"] for row in stats],
+        q3=[row["q3"] for row in stats],
+        lowerfence=[row["lowerfence"] for row in stats],
+        upperfence=[row["upperfence"] for row in stats],
+        mean=[row["mean"] for row in stats],
+        marker_color=SPOTIFY_GREEN,
+        orientation=orientation,
+        showlegend=False,
+        name="",
     )
-    fig.update_traces(
-        marker_line_color="#000000",
-        marker_line_width=2
+    box["x" if orientation == "v" else "y"] = labels
+
+    outlier_labels = [row[key] for row in stats for _ in row["outliers"]]
+    outlier_values = [v for row in stats for v in row["outliers"]]
+    points = dict(mode="markers", marker=dict(color=SPOTIFY_GREEN, size=5), showlegend=False, name="")
+    if orientation == "v":
+        points.update(x=outlier_labels, y=outlier_values)
+    else:
+        points.update(x=outlier_values, y=outlier_labels)
+    return [go.Box(**box), go.Scatter(**points)]
+
+
+@traced_figure
+@cached_figure
+def fig_hist_popularity(histogram, box=None):
+    # Pre-binned counts from data_loader, with the overall box summary as the marginal plot
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.02)
+    if box is not None:
+        for trace in _box_traces([{"track_popularity": "", **box}], "track_popularity", orientation="h"):
+            fig.add_trace(trace, row=1, col=1)
+    fig.add_trace(
+        go.Bar(
+            x=[(b["bin_start"] + b["bin_end"]) / 2 for b in histogram],
+            y=[b["num_tracks"] for b in histogram],
+            width=[b["bin_end"] - b["bin_start"] for b in histogram],
+            marker_color=SPOTIFY_GREEN,
+            marker_line_color="#000000",
+            marker_line_width=2,
+            showlegend=False,
+        ),
+        row=2,
+        col=1,
     )
+    fig.update_yaxes(showticklabels=False, row=1, col=1)
+    fig.update_xaxes(title_text="track_popularity", row=2, col=1)
+    fig.update_yaxes(title_text="count", row=2, col=1)
     return _base_layout(fig)
 
+@traced_figure
+@cached_figure
 def fig_corr_heatmap(corr_df):
     # Displays correlation matrix with custom Spotify color gradient
     spotify_colorscale = [
@@ -91,8 +136,10 @@ def fig_corr_heatmap(corr_df):
 
     return fig
 
+@traced_figure
+@cached_figure
 def fig_line_popularity_over_time(rows):
-    df = pd.DataFrame(rows)
+    df = as_frame(rows)
     fig = px.line(
         df,
         x="release_year",
@@ -103,8 +150,10 @@ def fig_line_popularity_over_time(rows):
     return _base_layout(fig)
 
 
+@traced_figure
+@cached_figure(columns=["release_year", "track_popularity"])
 def fig_box_popularity_over_time(rows):
-    df = pd.DataFrame(rows)
+    df = as_frame(rows)
     fig = px.box(
         df,
         x="release_year",
@@ -113,20 +162,19 @@ def fig_box_popularity_over_time(rows):
     return _base_layout(fig)
 
 
-def fig_box_explicit(rows):
-    df = pd.DataFrame(rows)
-    fig = px.box(
-        df,
-        x="explicit",
-        y="track_popularity",
-        color_discrete_sequence=[SPOTIFY_GREEN],
-    )
+@traced_figure
+@cached_figure
+def fig_box_explicit(stats):
+    fig = go.Figure(_box_traces(stats, "explicit"))
+    fig.update_layout(xaxis_title="explicit", yaxis_title="track_popularity")
     return _base_layout(fig)
 
 
+@traced_figure
+@cached_figure
 def fig_bar_top_avg_genres(rows):
     # Ranks genres by average track popularity using color intensity
-    df = pd.DataFrame(rows)
+    df = as_frame(rows)
     df = df.sort_values("avg_popularity", ascending=True)
 
     fig = px.bar(
@@ -142,9 +190,11 @@ def fig_bar_top_avg_genres(rows):
 
     return _base_layout(fig)
 
+@traced_figure
+@cached_figure
 def fig_bar_genre_frequency(rows):
     # Identifies most common genres in filtered dataset
-    df = pd.DataFrame(rows)
+    df = as_frame(rows)
     df = df.sort_values("num_tracks", ascending=True)
 
     fig = px.bar(
@@ -161,54 +211,73 @@ def fig_bar_genre_frequency(rows):
 
     return _base_layout(fig)
 
-def fig_scatter_artist_vs_track(rows):
-    df = pd.DataFrame(rows)
-    fig = px.scatter(
-        df,
-        x="artist_popularity",
-        y="track_popularity",
-        opacity=0.6,
-        color_discrete_sequence=[SPOTIFY_GREEN],
-    )
+def _scatter(rows, x, y, log_x=False, point_budget=SCATTER_POINT_BUDGET):
+    # Thins large scatters server-side: a stratified sample above the point budget,
+    # a 2D density heatmap for very large selections
+    df = as_frame(rows)
+    plan = scatter_plan(len(df), point_budget)
+
+    if plan == "density":
+        x_centers, y_centers, counts = density_grid(df, x, y, log_x=log_x)
+        fig = go.Figure(
+            data=go.Heatmap(
+                x=x_centers,
+                y=y_centers,
+                z=np.where(counts > 0, counts, np.nan),
+                colorscale=SPOTIFY_COLORSCALE,
+                colorbar=dict(title="tracks"),
+            )
+        )
+        fig.update_layout(xaxis_title=x, yaxis_title=y)
+        note = f"Density of {len(df):,} tracks"
+    else:
+        shown = stratified_sample(df, x, y, point_budget, log_x=log_x) if plan == "sample" else df
+        fig = px.scatter(
+            shown,
+            x=x,
+            y=y,
+            opacity=0.6,
+            color_discrete_sequence=[SPOTIFY_GREEN],
+        )
+        note = f"Stratified sample of {len(shown):,} / {len(df):,} tracks" if plan == "sample" else None
+
+    if log_x:
+        fig.update_xaxes(type="log")
+    if note:
+        fig.add_annotation(
+            text=note, xref="paper", yref="paper", x=1, y=1.08, showarrow=False, font=dict(size=13)
+        )
     return _base_layout(fig)
 
 
-def fig_scatter_followers_vs_track(rows):
-    df = pd.DataFrame(rows)
-    fig = px.scatter(
-        df,
-        x="artist_followers",
-        y="track_popularity",
-        opacity=0.6,
-        color_discrete_sequence=[SPOTIFY_GREEN],
-    )
-    fig.update_xaxes(type="log")
-    return _base_layout(fig)
+@traced_figure
+@cached_figure(columns=["artist_popularity", "track_popularity"])
+def fig_scatter_artist_vs_track(rows, point_budget=SCATTER_POINT_BUDGET):
+    return _scatter(rows, "artist_popularity", "track_popularity", point_budget=point_budget)
 
 
-def fig_scatter_duration_vs_pop(rows):
-    df = pd.DataFrame(rows)
-    fig = px.scatter(
-        df,
-        x="track_duration_min",
-        y="track_popularity",
-        opacity=0.6,
-        color_discrete_sequence=[SPOTIFY_GREEN],
-    )
-    return _base_layout(fig)
+@traced_figure
+@cached_figure(columns=["artist_followers", "track_popularity"])
+def fig_scatter_followers_vs_track(rows, point_budget=SCATTER_POINT_BUDGET):
+    return _scatter(rows, "artist_followers", "track_popularity", log_x=True, point_budget=point_budget)
 
 
-def fig_box_album_type(rows):
-    df = pd.DataFrame(rows)
-    fig = px.box(
-        df,
-        x="album_type",
-        y="track_popularity",
-        color_discrete_sequence=[SPOTIFY_GREEN],
-    )
+@traced_figure
+@cached_figure(columns=["track_duration_min", "track_popularity"])
+def fig_scatter_duration_vs_pop(rows, point_budget=SCATTER_POINT_BUDGET):
+    return _scatter(rows, "track_duration_min", "track_popularity", point_budget=point_budget)
+
+
+@traced_figure
+@cached_figure
+def fig_box_album_type(stats):
+    fig = go.Figure(_box_traces(stats, "album_type"))
+    fig.update_layout(xaxis_title="album_type", yaxis_title="track_popularity")
     return _base_layout(fig)
 
 
+@traced_figure
+@cached_figure
 def fig_top_artists_index(df):
     # Visualizes normalized artist popularity index using rank-based coloring
     df = df.sort_values("artist_popularity_index", ascending=True)
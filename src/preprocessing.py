@@ -1,4 +1,4 @@
-import pandas as pd
+from src.columnar import as_frame
 
 def safe_float(x, default=0.0) -> float:
     try:
@@ -11,10 +11,10 @@ def safe_float(x, default=0.0) -> float:
 def compute_correlation_matrix(rows):
     # Computes correlation matrix for key popularity and track features
     """
-    rows: List[dict] from SQL
+    rows: DataFrame (or List[dict]) from SQL
     returns: Pandas DataFrame correlation matrix
     """
-    df = pd.DataFrame(rows)
+    df = as_frame(rows)
 
     cols = [
         "track_popularity",
@@ -26,3 +26,25 @@ def compute_correlation_matrix(rows):
     df = df[cols].dropna()
 
     return df.corr()
+
+def hit_confusion_counts(hit_rows):
+    # Shallow copy: the flag columns are added without duplicating the shared frame
+    df_eval = hit_rows.copy(deep=False)
+
+    # Define a hit as top 30% by popularity; predict hits based on artist metrics
+    HIT_PERCENTILE = 0.70
+    hit_cutoff = df_eval["track_popularity"].quantile(HIT_PERCENTILE)
+
+    df_eval["true_hit"] = (df_eval["track_popularity"] >= hit_cutoff).astype(int)
+
+    # Rule: artists with popularity >= 75 and followers >= 1M are likely to produce hits
+    df_eval["predicted_hit"] = (
+        (df_eval["artist_popularity"] >= 75) &
+        (df_eval["artist_followers"] >= 1_000_000)
+    ).astype(int)
+
+    tp = ((df_eval["predicted_hit"] == 1) & (df_eval["true_hit"] == 1)).sum()
+    fp = ((df_eval["predicted_hit"] == 1) & (df_eval["true_hit"] == 0)).sum()
+    tn = ((df_eval["predicted_hit"] == 0) & (df_eval["true_hit"] == 0)).sum()
+    fn = ((df_eval["predicted_hit"] == 0) & (df_eval["true_hit"] == 1)).sum()
+    return tp, fp, tn, fn
@@ -0,0 +1,200 @@
+"""
+Per-rerun profiler for the dashboard's queries and figures.
+
+While a Profiler is active (see `profiling`), every fetch_all / fetch_one /
+fetch_frame call records its SQL text, parameters, rows returned and wall
+time, and every plots.fig_* builder records its build time and the size of
+the figure JSON Streamlit ships to the browser. Other steps can be timed
+with `trace`. Events export as a Chrome trace-event file, which opens in
+chrome://tracing or https://ui.perfetto.dev.
+
+Nothing is recorded when no profiler is active; the hooks then cost one
+ContextVar lookup per call.
+"""
+
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+# Longest parameter list kept per query event; IN (...) lists can be long
+MAX_TRACED_PARAMS = 50
+
+_ACTIVE: ContextVar[Optional["Profiler"]] = ContextVar("active_profiler", default=None)
+
+
+def _compact_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _json_safe(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class Profiler:
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        # Times the block; the caller may add fields (rows, bytes, ...) to the yielded args dict
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.events.append(
+                    {
+                        "name": name,
+                        "category": category,
+                        "start_ms": (start - self._origin) * 1000,
+                        "duration_ms": (end - start) * 1000,
+                        "thread": threading.get_ident(),
+                        "args": args,
+                    }
+                )
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._origin) * 1000
+
+    def summary(self) -> pd.DataFrame:
+        # One row per event, slowest first
+        rows = [
+            {
+                "category": e["category"],
+                "name": e["name"],
+                "ms": e["duration_ms"],
+                "rows": e["args"].get("rows"),
+                "bytes": e["args"].get("bytes"),
+                "sql": e["args"].get("sql"),
+            }
+            for e in self.events
+        ]
+        columns = ["category", "name", "ms", "rows", "bytes", "sql"]
+        return pd.DataFrame(rows, columns=columns).sort_values("ms", ascending=False, ignore_index=True)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        # Complete ("X") events in microseconds; nested spans stack by start time and duration
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": e["name"],
+                    "cat": e["category"],
+                    "ph": "X",
+                    "ts": e["start_ms"] * 1000,
+                    "dur": e["duration_ms"] * 1000,
+                    "pid": pid,
+                    "tid": e["thread"],
+                    "args": e["args"],
+                }
+                for e in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def chrome_trace_json(self) -> str:
+        return json.dumps(self.to_chrome_trace(), default=str)
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.chrome_trace_json())
+
+
+def active_profiler() -> Optional[Profiler]:
+    return _ACTIVE.get()
+
+
+def start_profiling() -> Profiler:
+    # Activates a fresh profiler for the rest of this context, e.g. one Streamlit rerun
+    profiler = Profiler()
+    _ACTIVE.set(profiler)
+    return profiler
+
+
+@contextmanager
+def profiling(profiler: Optional[Profiler] = None) -> Iterator[Profiler]:
+    # Makes `profiler` (or a new one) the active profiler for this thread/context
+    profiler = profiler or Profiler()
+    token = _ACTIVE.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _ACTIVE.reset(token)
+
+
+@contextmanager
+def trace(name: str, category: str = "app", **args: Any) -> Iterator[Dict[str, Any]]:
+    # A span on the active profiler, or a no-op when profiling is off
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        yield args
+        return
+    with profiler.span(name, category, **args) as span_args:
+        yield span_args
+
+
+@contextmanager
+def trace_query(sql: str, params: Sequence[Any] = ()) -> Iterator[Dict[str, Any]]:
+    # Query span named after the calling data_loader function; set "rows" on the yielded dict
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        yield {}
+        return
+    caller = _query_caller()
+    params = list(params)
+    with profiler.span(
+        caller,
+        "sql",
+        sql=_compact_sql(sql),
+        params=[_json_safe(p) for p in params[:MAX_TRACED_PARAMS]],
+        n_params=len(params),
+    ) as span_args:
+        yield span_args
+
+
+def _query_caller() -> str:
+    # First frame outside the fetch helpers and contextlib, e.g. "sql_yearly_agg"
+    frame = sys._getframe(2)
+    while frame is not None and (
+        frame.f_code.co_name in {"fetch_all", "fetch_one", "fetch_frame", "fetch_columns", "_fetch_arrays"}
+        or frame.f_code.co_filename.endswith("contextlib.py")
+    ):
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "query"
+
+
+def traced_figure(build: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorator for plots.fig_* builders. When profiling, records build time and
+    the byte size of fig.to_json() (the payload st.plotly_chart sends).
+    Serialization is timed separately so it does not inflate the build time.
+    """
+
+    @functools.wraps(build)
+    def wrapper(*args, **kwargs):
+        profiler = _ACTIVE.get()
+        if profiler is None:
+            return build(*args, **kwargs)
+        with profiler.span(build.__name__, "figure") as span_args:
+            fig = build(*args, **kwargs)
+        start = time.perf_counter()
+        span_args["bytes"] = len(fig.to_json())
+        span_args["serialize_ms"] = (time.perf_counter() - start) * 1000
+        return fig
+
+    return wrapper
@@ -0,0 +1,152 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Popularity is an integer score from 0 to 100, so integral columns fit a fixed count array
+POPULARITY_BINS = 101
+
+# Histogram bins of 5 popularity points; box plots keep at most this many distinct outliers
+HISTOGRAM_BIN_WIDTH = 5
+MAX_BOX_OUTLIERS = 50
+
+
+def _native(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def counts_from_values(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Distinct sorted values and their counts, in one pass over the column
+    if len(values) and values.dtype.kind in "iu" and values.min() >= 0 and values.max() < POPULARITY_BINS:
+        counts = np.bincount(values, minlength=POPULARITY_BINS)
+        present = np.flatnonzero(counts)
+        return present.astype(values.dtype), counts[present]
+    return np.unique(values, return_counts=True)
+
+
+def values_at_offsets(
+    values: Sequence[Any],
+    counts: Sequence[int],
+    offsets: Sequence[int],
+) -> List[Any]:
+    # The value at each 0-based offset of the sorted column, as `ORDER BY ... LIMIT 1 OFFSET n` returns it
+    cumulative = np.cumsum(np.asarray(counts, dtype=np.int64))
+    positions = np.searchsorted(cumulative, np.asarray(offsets, dtype=np.int64), side="right")
+    return [_native(values[p]) for p in positions]
+
+
+def quantiles_from_counts(
+    values: Sequence[Any],
+    counts: Sequence[int],
+    quantiles: Sequence[float],
+) -> List[Any]:
+    # Exact nearest-rank quantiles at offset int((n - 1) * q)
+    n = int(np.sum(counts))
+    if n == 0:
+        return []
+    return values_at_offsets(values, counts, [int((n - 1) * q) for q in quantiles])
+
+
+def median_from_counts(values: Sequence[Any], counts: Sequence[int]) -> Optional[Any]:
+    # Lower median at offset (n - 1) // 2, matching the manual SQL offset
+    n = int(np.sum(counts))
+    if n == 0:
+        return None
+    return values_at_offsets(values, counts, [(n - 1) // 2])[0]
+
+
+def interpolated_quantiles_from_counts(
+    values: Sequence[Any],
+    counts: Sequence[int],
+    quantiles: Sequence[float],
+) -> List[float]:
+    # Linear interpolation between order statistics, as Plotly box plots compute quartiles
+    n = int(np.sum(counts))
+    if n == 0:
+        return []
+    positions = [(n - 1) * q for q in quantiles]
+    lower = values_at_offsets(values, counts, [int(np.floor(p)) for p in positions])
+    upper = values_at_offsets(values, counts, [int(np.ceil(p)) for p in positions])
+    return [float(lo + (hi - lo) * (p - np.floor(p))) for lo, hi, p in zip(lower, upper, positions)]
+
+
+def box_stats_from_counts(
+    values: np.ndarray,
+    counts: np.ndarray,
+    max_outliers: int = MAX_BOX_OUTLIERS,
+) -> Optional[Dict[str, Any]]:
+    """
+    Five-number summary with Tukey fences (1.5 x IQR, clamped to the data) and
+    the distinct values outside them. Past `max_outliers` distinct outliers an
+    evenly spaced subset is kept, always including the extremes.
+    """
+    values = np.asarray(values, dtype=float)
+    counts = np.asarray(counts, dtype=np.int64)
+    n = int(counts.sum())
+    if n == 0:
+        return None
+    q1, median, q3 = interpolated_quantiles_from_counts(values, counts, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    outliers = values[~inside]
+    if len(outliers) > max_outliers:
+        outliers = outliers[np.unique(np.linspace(0, len(outliers) - 1, max_outliers).round().astype(int))]
+    return {
+        "n": n,
+        "mean": float(np.dot(values, counts) / n),
+        "min": float(values[0]),
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "lowerfence": float(values[inside].min()),
+        "upperfence": float(values[inside].max()),
+        "max": float(values[-1]),
+        "outliers": outliers.tolist(),
+    }
+
+
+def grouped_value_counts(
+    groups: np.ndarray,
+    values: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+) -> Dict[Any, Tuple[np.ndarray, np.ndarray]]:
+    # Sorted distinct values and their (weighted) counts within each group, in one pass
+    group_keys, group_idx = np.unique(groups, return_inverse=True)
+    value_keys, value_idx = np.unique(values, return_inverse=True)
+    flat = group_idx.ravel() * len(value_keys) + value_idx.ravel()
+    counts = np.bincount(flat, weights=weights, minlength=len(group_keys) * len(value_keys))
+    counts = counts.reshape(len(group_keys), len(value_keys)).astype(np.int64)
+    result = {}
+    for g, row in zip(group_keys, counts):
+        present = np.flatnonzero(row)
+        result[_native(g)] = (value_keys[present], row[present])
+    return result
+
+
+def grouped_box_stats(
+    groups: np.ndarray,
+    values: np.ndarray,
+    key: str,
+    weights: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
+    # One box summary per group, in group order
+    return [
+        {key: group, **box_stats_from_counts(v, c)}
+        for group, (v, c) in grouped_value_counts(groups, values, weights).items()
+    ]
+
+
+def histogram_from_counts(
+    values: np.ndarray,
+    counts: np.ndarray,
+    bin_width: float = HISTOGRAM_BIN_WIDTH,
+    lo: float = 0.0,
+    hi: float = 100.0,
+) -> List[Dict[str, Any]]:
+    # Fixed-width bins over [lo, hi]; the last bin is closed so `hi` itself is counted
+    edges = np.arange(lo, hi + bin_width, bin_width)
+    slots = np.clip(np.searchsorted(edges, np.asarray(values, dtype=float), side="right") - 1, 0, len(edges) - 2)
+    totals = np.bincount(slots, weights=counts, minlength=len(edges) - 1).astype(np.int64)
+    return [
+        {"bin_start": float(edges[i]), "bin_end": float(edges[i + 1]), "num_tracks": int(totals[i])}
+        for i in range(len(edges) - 1)
+    ]
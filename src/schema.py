@@ -0,0 +1,192 @@
+"""
+Schema optimization for the dashboard database.
+
+    python -m src.schema [--db data/spotify_database.db] [--explain-only]
+
+Creates covering indexes for the join and filter columns used by
+src/data_loader.py, runs ANALYZE, and prints an EXPLAIN QUERY PLAN plus a
+before/after timing table for every sql_* query.
+"""
+
+import argparse
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from src import data_loader as dl
+
+INDEXES = {
+    # Join target: artist lookups never touch the artists table itself
+    "idx_artists_cover": (
+        "artists(artist_id, primary_genre, artist_name, artist_popularity, artist_followers)"
+    ),
+    # Genre filter driving the join from the artists side
+    "idx_artists_genre": "artists(primary_genre, artist_id)",
+    # Year range first (always bounded by the sidebar), then the remaining filter columns
+    "idx_tracks_year_filter": (
+        "tracks(release_year, track_popularity, album_type, explicit, artist_id)"
+    ),
+    # Popularity order for quantile/median lookups without a temp B-tree sort
+    "idx_tracks_popularity_filter": (
+        "tracks(track_popularity, release_year, album_type, explicit, artist_id)"
+    ),
+    "idx_tracks_artist": "tracks(artist_id)",
+    # Album type filter and the DISTINCT lookup in get_filter_options
+    "idx_tracks_album_type": "tracks(album_type)",
+}
+
+# Query shapes the sidebar produces most often: no filters, and a narrowed selection
+REPRESENTATIVE_FILTERS = [
+    ("all tracks", lambda o: ([], [], o["min_year"], o["max_year"], 0, 100, "All")),
+    (
+        "narrowed",
+        lambda o: (o["genres"][:3], o["album_types"][:1], 2010, 2020, 20, 80, "Explicit only"),
+    ),
+]
+
+
+def query_set(conn: sqlite3.Connection) -> List[Tuple[str, Callable[[], Any]]]:
+    # Every data_loader query, bound to each representative filter combination
+    opts = dl.get_filter_options(conn)
+    queries: List[Tuple[str, Callable[[], Any]]] = [
+        ("get_filter_options", lambda: dl.get_filter_options(conn)),
+        ("sql_global_reference_track", lambda: dl.sql_global_reference_track(conn)),
+    ]
+
+    for label, make_filters in REPRESENTATIVE_FILTERS:
+        where_sql, params = dl.build_where_clause(*make_filters(opts))
+        for func in (
+            dl.get_overview_metrics,
+            dl.sql_quantiles_track_popularity,
+            dl.sql_median_track_popularity,
+            dl.sql_yearly_agg,
+            dl.sql_top_avg_genres,
+            dl.sql_genre_frequency,
+            dl.sql_explicit_summary,
+            dl.sql_popularity_over_time,
+            dl.sql_popularity_buckets,
+            dl.sql_popularity_histogram,
+            dl.sql_box_explicit,
+            dl.sql_box_album_type,
+            dl.sql_rule_based_hit_evaluation,
+            dl.sql_similarity_reference,
+            dl.load_snapshot,
+        ):
+            queries.append(
+                (f"{func.__name__} [{label}]", lambda f=func, w=where_sql, p=params: f(conn, w, p))
+            )
+        queries.append(
+            (f"fetch_track_page [{label}]", lambda w=where_sql, p=params: dl.fetch_track_page(conn, w, p))
+        )
+
+    return queries
+
+
+def capture_statements(conn: sqlite3.Connection, run: Callable[[], Any]) -> List[str]:
+    # Records the expanded SQL of every statement a data_loader function executes
+    statements: List[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        run()
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def plan_warnings(sql: str, plan: List[str]) -> List[str]:
+    # A full table scan, or a row-level ORDER BY the indexes could not satisfy.
+    # Temp B-trees for GROUP BY/DISTINCT or for ordering already-aggregated groups are expected.
+    aggregated = "GROUP BY" in sql.upper()
+    warnings = []
+    for step in plan:
+        if step.startswith("SCAN") and "INDEX" not in step:
+            warnings.append(step)
+        if step == "USE TEMP B-TREE FOR ORDER BY" and not aggregated:
+            warnings.append(step)
+    return warnings
+
+
+def time_queries(
+    queries: List[Tuple[str, Callable[[], Any]]],
+    repeat: int = 5,
+) -> Dict[str, float]:
+    timings = {}
+    for name, run in queries:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - start)
+        timings[name] = sorted(samples)[len(samples) // 2] * 1000
+    return timings
+
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    with conn:
+        for name, target in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    conn.execute("ANALYZE")
+
+
+def report_plans(conn: sqlite3.Connection, queries: List[Tuple[str, Callable[[], Any]]]) -> int:
+    flagged = 0
+    for name, run in queries:
+        print(f"\n== {name}")
+        for sql in capture_statements(conn, run):
+            plan = explain(conn, sql)
+            for step in plan:
+                print(f"   {step}")
+            for warning in plan_warnings(sql, plan):
+                flagged += 1
+                print(f"   !! {warning}")
+    return flagged
+
+
+def print_timings(before: Dict[str, float], after: Dict[str, float]) -> None:
+    width = max(len(name) for name in after)
+    print(f"\n{'query':<{width}}  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}")
+    for name, after_ms in after.items():
+        before_ms = before.get(name)
+        if before_ms is None:
+            print(f"{name:<{width}}  {'-':>10}  {after_ms:>10.2f}  {'-':>8}")
+        else:
+            speedup = before_ms / after_ms if after_ms else float("inf")
+            print(f"{name:<{width}}  {before_ms:>10.2f}  {after_ms:>10.2f}  {speedup:>7.1f}x")
+
+
+def optimize(db_path: str = dl.DB_PATH, explain_only: bool = False) -> int:
+    conn = dl.get_connection(db_path)
+    try:
+        queries = query_set(conn)
+        before = time_queries(queries)
+
+        if not explain_only:
+            create_indexes(conn)
+
+        flagged = report_plans(conn, queries)
+        after = time_queries(queries) if not explain_only else before
+        print_timings(before, after)
+        print(f"\n{flagged} plan step(s) fall back to a full scan or temp B-tree sort")
+        return flagged
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=dl.DB_PATH)
+    parser.add_argument(
+        "--explain-only",
+        action="store_true",
+        help="report plans and timings without creating indexes",
+    )
+    args = parser.parse_args()
+    optimize(args.db, explain_only=args.explain_only)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Full-text search over track and artist names.
+
+    python -m src.search [--db data/spotify_database.db] [--rebuild] [--query "golden hour"]
+
+track_search is an FTS5 index of every track's name and its artist's name.
+Its rowids are SEARCH_KEY: popularity rank in the high bits, tracks.rowid in
+the low 32, so matches come out of the index most popular first and a query
+stops after `limit` hits instead of ranking every match. The last query word
+matches as a prefix (2- and 3-character prefix indexes keep short prefixes
+cheap). Typo tolerance comes from track_search_typos, a SymSpell-style table
+holding every single-character deletion of each indexed word: a query word is
+looked up by its own deletions, which finds the indexed words one edit away
+without scanning the vocabulary. src/etl.py builds both tables and keeps them
+current on incremental loads; this CLI adds them to a database built before
+they existed.
+"""
+
+import argparse
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from src.data_loader import DB_PATH, fetch_all, get_connection, search_tracks
+from src.profiler import trace
+
+SEARCH_LIMIT = 20
+# Words shorter than this only match exactly or as a prefix; one edit changes too much of them.
+# Numbers never match by typo either.
+MIN_TYPO_LENGTH = 4
+TYPO_CHUNK = 50_000
+
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS track_search USING fts5(
+    track_name,
+    artist_name,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS track_search_vocab USING fts5vocab(track_search, 'row');
+CREATE TABLE IF NOT EXISTS track_search_typos (
+    variant TEXT,
+    term TEXT,
+    PRIMARY KEY (variant, term)
+) WITHOUT ROWID;
+"""
+
+# FTS rowid of a track: higher popularity sorts first, ties in tracks.rowid order
+SEARCH_KEY = """
+(((10000 - CAST(ROUND(MIN(MAX(COALESCE(t.track_popularity, 0), 0), 100) * 100) AS INTEGER)) << 32)
+ + t.rowid)
+"""
+TRACK_ID_MASK = 0xFFFFFFFF
+
+# Tracks of the artists an incremental load re-aggregates (see src/etl.py)
+AFFECTED_TRACKS = """
+WHERE t.artist_id IN (
+    SELECT artist_id FROM artists
+    WHERE artist_name IN (SELECT artist_name FROM temp.affected_artists)
+)
+"""
+
+
+def has_search_index(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'track_search'"
+    ).fetchone()
+    return row is not None
+
+
+def create_search_index(conn: sqlite3.Connection) -> None:
+    # Creates and fills the index from scratch; runs inside the caller's transaction
+    for statement in SEARCH_SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    conn.execute("DELETE FROM track_search")
+    conn.execute("DELETE FROM track_search_typos")
+    index_tracks(conn)
+    refresh_typos(conn)
+    # Merge the segments written by the bulk insert so queries read one b-tree per word
+    conn.execute("INSERT INTO track_search(track_search) VALUES ('optimize')")
+
+
+def drop_search_index(conn: sqlite3.Connection) -> None:
+    conn.execute("DROP TABLE IF EXISTS track_search_vocab")
+    conn.execute("DROP TABLE IF EXISTS track_search")
+    conn.execute("DROP TABLE IF EXISTS track_search_typos")
+
+
+def index_tracks(conn: sqlite3.Connection, track_filter: str = "") -> None:
+    conn.execute(
+        f"""
+        INSERT INTO track_search (rowid, track_name, artist_name)
+        SELECT {SEARCH_KEY}, t.track_name, a.artist_name
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        {track_filter}
+        """
+    )
+
+
+def unindex_tracks(conn: sqlite3.Connection, track_filter: str) -> None:
+    # Must run before the matching tracks rows are deleted
+    conn.execute(f"DELETE FROM track_search WHERE rowid IN (SELECT {SEARCH_KEY} FROM tracks t {track_filter})")
+
+
+def deletions(term: str) -> Set[str]:
+    # The term itself plus every way of dropping one character from it
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def refresh_typos(conn: sqlite3.Connection) -> int:
+    # Adds deletion variants for indexed words that have none yet. Variants of words that have
+    # since left the index are kept: they expand to a word no track matches, which is harmless.
+    terms = [
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT v.term
+            FROM track_search_vocab v
+            WHERE length(v.term) >= ?
+              AND v.term GLOB '*[^0-9]*'
+              AND NOT EXISTS (
+                  SELECT 1 FROM track_search_typos s WHERE s.variant = v.term AND s.term = v.term
+              )
+            """,
+            (MIN_TYPO_LENGTH,),
+        )
+    ]
+    insert = "INSERT OR IGNORE INTO track_search_typos (variant, term) VALUES (?, ?)"
+    for start in range(0, len(terms), TYPO_CHUNK):
+        conn.executemany(
+            insert,
+            [(variant, term) for term in terms[start:start + TYPO_CHUNK] for variant in deletions(term)],
+        )
+    return len(terms)
+
+
+def normalize_terms(text: str) -> List[str]:
+    # Lower-cased words with accents stripped, split the way the unicode61 tokenizer splits them
+    folded = unicodedata.normalize("NFKD", text)
+    folded = "".join(c for c in folded if not unicodedata.combining(c)).lower()
+    return re.findall(r"[^\W_]+", folded)
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    # One insertion, deletion, substitution or swap of adjacent characters
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def typo_candidates(conn: sqlite3.Connection, term: str) -> List[str]:
+    # Indexed words one edit away from term, found through the shared deletion variants
+    if len(term) < MIN_TYPO_LENGTH or term.isdigit():
+        return []
+    variants = sorted(deletions(term))
+    rows = conn.execute(
+        f"SELECT DISTINCT term FROM track_search_typos WHERE variant IN ({','.join('?' * len(variants))})",
+        variants,
+    ).fetchall()
+    return sorted(r[0] for r in rows if r[0] != term and within_one_edit(term, r[0]))
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _prefix(term: str) -> str:
+    # One-character words would expand to a large slice of the vocabulary, so they match exactly
+    return _quote(term) + ("*" if len(term) >= 2 else "")
+
+
+def match_query(terms: Sequence[str], alternatives: Optional[Dict[str, List[str]]] = None) -> str:
+    # Every word must match: the last one (still being typed) as a prefix, the others whole.
+    # Typo alternatives always match as whole words.
+    parts = []
+    for i, term in enumerate(terms):
+        first = _prefix(term) if i == len(terms) - 1 else _quote(term)
+        options = [first] + [_quote(alt) for alt in (alternatives or {}).get(term, [])]
+        parts.append(options[0] if len(options) == 1 else "(" + " OR ".join(options) + ")")
+    return " AND ".join(parts)
+
+
+def _matches(conn: sqlite3.Connection, query: str, limit: int) -> List[Dict[str, Any]]:
+    # Rowid order is popularity order, so the index stops after `limit` hits
+    return fetch_all(
+        conn,
+        f"""
+        WITH hits AS (
+            SELECT rowid FROM track_search WHERE track_search MATCH ? ORDER BY rowid LIMIT ?
+        )
+        SELECT
+            t.rowid AS track_id,
+            t.track_name,
+            a.artist_name,
+            t.release_year,
+            t.track_popularity
+        FROM hits
+        JOIN tracks t ON t.rowid = (hits.rowid & {TRACK_ID_MASK})
+        JOIN artists a ON t.artist_id = a.artist_id
+        ORDER BY hits.rowid
+        """,
+        (query, limit),
+    )
+
+
+def find_tracks(conn: sqlite3.Connection, text: str, limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Tracks whose name or artist matches every word of `text`, the last word
+    as a prefix, most popular first. When that finds fewer than `limit`
+    tracks, matches with words one typo away follow. Falls back to the LIKE
+    scan in data_loader.search_tracks on databases without the search index.
+    """
+    if not has_search_index(conn):
+        return search_tracks(conn, text, limit)
+    terms = normalize_terms(text)
+    if not terms:
+        return []
+    with trace("find_tracks", "search", text=text) as span:
+        results = _matches(conn, match_query(terms), limit)
+        span["typo"] = False
+        if len(results) < limit:
+            alternatives = {term: typo_candidates(conn, term) for term in terms}
+            if any(alternatives.values()):
+                span["typo"] = True
+                seen = {r["track_id"] for r in results}
+                for row in _matches(conn, match_query(terms, alternatives), limit):
+                    if row["track_id"] not in seen and len(results) < limit:
+                        results.append(row)
+        span["rows"] = len(results)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index even if it exists")
+    parser.add_argument("--query", help="run a search and print the matches")
+    args = parser.parse_args(argv)
+
+    conn = get_connection(args.db)
+    try:
+        if args.rebuild or not has_search_index(conn):
+            start = time.perf_counter()
+            with conn:
+                drop_search_index(conn)
+                create_search_index(conn)
+            terms = conn.execute("SELECT COUNT(*) FROM track_search_vocab").fetchone()[0]
+            print(f"indexed {terms:,} words in {time.perf_counter() - start:.1f}s")
+        if args.query:
+            start = time.perf_counter()
+            matches = find_tracks(conn, args.query)
+            elapsed = (time.perf_counter() - start) * 1000
+            for m in matches:
+                print(f"{m['track_id']:>9}  {m['track_name']} - {m['artist_name']} ({m['release_year']})")
+            print(f"{len(matches)} matches in {elapsed:.1f} ms")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Normalized features the Rule-Based tab compares tracks on
+SIMILARITY_FEATURES = [
+    "artist_popularity",
+    "artist_followers_log",
+    "track_duration_min",
+]
+
+SIMILARITY_TOP_K = 100
+
+
+def add_log_followers(df: pd.DataFrame) -> pd.DataFrame:
+    # Followers span several orders of magnitude, so they are compared on a log10 scale
+    df = df.reset_index(drop=True)
+    df["artist_followers_log"] = np.log10(df["artist_followers"] + 1)
+    return df
+
+
+def feature_matrix(df: pd.DataFrame, features: Sequence[str] = SIMILARITY_FEATURES) -> np.ndarray:
+    return df[list(features)].to_numpy(dtype=float)
+
+
+def minmax_normalize(values: np.ndarray) -> np.ndarray:
+    # Scales each column to [0, 1]; a constant column becomes 0 and adds no distance
+    lo = np.nanmin(values, axis=0)
+    span = np.nanmax(values, axis=0) - lo
+    span[span == 0] = 1.0
+    return (values - lo) / span
+
+
+def distances_to(normalized: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    # Euclidean distance of every row to the reference vector in one broadcast pass
+    diff = normalized - reference
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+
+def top_k_indices(distances: np.ndarray, k: int = SIMILARITY_TOP_K) -> np.ndarray:
+    # argpartition selects the k smallest in O(n); only those k are sorted (ties by position)
+    k = min(k, len(distances))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(distances):
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(len(distances))
+    return candidates[np.lexsort((candidates, distances[candidates]))]
+
+
+def pick_reference(df: pd.DataFrame) -> Optional[int]:
+    # Select reference track from top 1% most popular tracks with artist popularity >= 80
+    threshold = df["track_popularity"].quantile(0.99)
+    candidates = df[
+        (df["track_popularity"] >= threshold) & (df["artist_popularity"] >= 80)
+    ].sort_values("track_popularity", ascending=False)
+    if candidates.empty:
+        return None
+    return int(df.index.get_loc(candidates.index[0]))
+
+
+def nearest_tracks(
+    df: pd.DataFrame,
+    reference_pos: int,
+    k: int = SIMILARITY_TOP_K,
+    features: Sequence[str] = SIMILARITY_FEATURES,
+    score_column: str = "similarity_to_popular_song",
+) -> pd.DataFrame:
+    """
+    The k rows of `df` closest to the row at position `reference_pos` in
+    min-max normalized feature space, nearest first, with the distance in
+    `score_column`. `df` must already hold every feature column.
+    """
+    normalized = minmax_normalize(feature_matrix(df, features))
+    distances = distances_to(normalized, normalized[reference_pos])
+    top = top_k_indices(distances, k)
+    result = df.iloc[top].copy()
+    result[score_column] = distances[top]
+    return result
+
+
+def similarity_ranking(
+    rows: pd.DataFrame,
+    k: int = SIMILARITY_TOP_K,
+) -> Tuple[Optional[pd.Series], pd.DataFrame]:
+    # Reference track plus its k nearest tracks; (None, empty) when no reference qualifies
+    df = add_log_followers(rows)
+    reference_pos = pick_reference(df)
+    if reference_pos is None:
+        return None, df.iloc[0:0]
+    return df.iloc[reference_pos], nearest_tracks(df, reference_pos, k)
@@ -0,0 +1,235 @@
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.columnar import fetch_frame
+from src.quantiles import (
+    box_stats_from_counts,
+    counts_from_values,
+    grouped_box_stats,
+    histogram_from_counts,
+    median_from_counts,
+    quantiles_from_counts,
+)
+
+QUANTILES = [0.10, 0.25, 0.50, 0.75, 0.90]
+
+SNAPSHOT_COLUMNS = [
+    "track_name",
+    "track_popularity",
+    "track_duration_min",
+    "explicit",
+    "release_year",
+    "album_type",
+    "artist_name",
+    "primary_genre",
+    "artist_popularity",
+    "artist_followers",
+]
+
+HIT_COLUMNS = [
+    "track_name",
+    "track_popularity",
+    "artist_popularity",
+    "artist_followers",
+]
+
+SIMILARITY_COLUMNS = [
+    "track_name",
+    "track_popularity",
+    "track_duration_min",
+    "artist_name",
+    "artist_popularity",
+    "artist_followers",
+]
+
+
+def load_snapshot(
+    conn: sqlite3.Connection,
+    where_sql: str,
+    params: Sequence[Any],
+    with_artist_id: bool = False,
+) -> pd.DataFrame:
+    # Runs the filtered tracks/artists join once; every dashboard aggregate is derived from this frame
+    artist_id = ",\n        t.artist_id" if with_artist_id else ""
+    query = f"""
+    SELECT
+        t.track_name,
+        t.track_popularity,
+        t.track_duration_min,
+        t.explicit,
+        t.release_year,
+        t.album_type,
+        a.artist_name,
+        a.primary_genre,
+        a.artist_popularity,
+        a.artist_followers{artist_id}
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.artist_id
+    {where_sql}
+    """
+    return fetch_frame(conn, query, params)
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return df.to_dict(orient="records")
+
+
+def _popularity_counts(df: pd.DataFrame):
+    return counts_from_values(df["track_popularity"].to_numpy())
+
+
+def snapshot_overview_metrics(df: pd.DataFrame) -> Dict[str, Any]:
+    popularity = df["track_popularity"]
+    return {
+        "tracks": int(len(df)),
+        "unique_artists": int(df["artist_name"].nunique()),
+        "avg_popularity": float(popularity.mean()) if len(df) else 0.0,
+        "zero_popularity_count": int((popularity == 0).sum()),
+    }
+
+
+def snapshot_quantiles(
+    df: pd.DataFrame,
+    quantiles: Sequence[float] = QUANTILES,
+) -> List[Dict[str, Any]]:
+    # Same semantics as the SQL version: the value at offset int((n - 1) * q) of the sorted column
+    values, counts = _popularity_counts(df)
+    results = quantiles_from_counts(values, counts, quantiles)
+    return [{"quantile": q, "value": v} for q, v in zip(quantiles, results)]
+
+
+def snapshot_median(df: pd.DataFrame) -> Optional[float]:
+    median = median_from_counts(*_popularity_counts(df))
+    return float(median) if median is not None else None
+
+
+def _yearly(df: pd.DataFrame, mean_col: str, count_col: str) -> List[Dict[str, Any]]:
+    grouped = (
+        df[df["release_year"].notna()]
+        .groupby("release_year")["track_popularity"]
+        .agg(["mean", "count"])
+        .reset_index()
+        .rename(columns={"mean": mean_col, "count": count_col})
+    )
+    return _records(grouped)
+
+
+def snapshot_yearly_agg(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return _yearly(df, "mean", "count")
+
+
+def snapshot_popularity_over_time(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return _yearly(df, "avg_popularity", "num_tracks")
+
+
+def _genre_frame(df: pd.DataFrame, exclude_unknown: bool) -> pd.DataFrame:
+    # Mirrors `a.primary_genre != 'Unknown'`, which also drops NULL genres
+    if exclude_unknown:
+        genre = df["primary_genre"]
+        return df[genre.notna() & (genre != "Unknown")]
+    return df
+
+
+def snapshot_top_avg_genres(df: pd.DataFrame, exclude_unknown: bool = True) -> List[Dict[str, Any]]:
+    grouped = (
+        _genre_frame(df, exclude_unknown)
+        .groupby("primary_genre", dropna=False)["track_popularity"]
+        .agg(avg_popularity="mean", num_tracks="count")
+        .reset_index()
+        .sort_values("avg_popularity", ascending=False, kind="mergesort")
+        .head(10)
+    )
+    return _records(grouped)
+
+
+def snapshot_genre_frequency(df: pd.DataFrame, exclude_unknown: bool = True) -> List[Dict[str, Any]]:
+    grouped = (
+        _genre_frame(df, exclude_unknown)
+        .groupby("primary_genre", dropna=False)
+        .size()
+        .reset_index(name="num_tracks")
+        .sort_values("num_tracks", ascending=False, kind="mergesort")
+        .head(10)
+    )
+    return _records(grouped)
+
+
+def snapshot_explicit_summary(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    grouped = (
+        df.groupby("explicit", dropna=False)["track_popularity"]
+        .agg(avg_popularity="mean", num_tracks="count")
+        .reset_index()
+    )
+    return _records(grouped)
+
+
+def snapshot_popularity_buckets(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # Categorizes tracks by popularity levels: Low ≤30, Medium ≤60, High >60
+    popularity = df["track_popularity"].to_numpy()
+    buckets = np.where(popularity <= 30, "Low", np.where(popularity <= 60, "Medium", "High"))
+    grouped = (
+        pd.Series(buckets, name="popularity_bucket")
+        .value_counts(sort=False)
+        .reset_index(name="num_tracks")
+        .sort_values("num_tracks", ascending=False, kind="mergesort")
+    )
+    return _records(grouped)
+
+
+def snapshot_popularity_histogram(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return histogram_from_counts(*_popularity_counts(df))
+
+
+def snapshot_popularity_box(df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    return box_stats_from_counts(*_popularity_counts(df))
+
+
+def snapshot_box_explicit(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return grouped_box_stats(
+        df["explicit"].to_numpy(dtype=np.int64), df["track_popularity"].to_numpy(dtype=float), "explicit"
+    )
+
+
+def snapshot_box_album_type(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    df = df[df["album_type"].notna()]
+    return grouped_box_stats(
+        df["album_type"].to_numpy(dtype=object), df["track_popularity"].to_numpy(dtype=float), "album_type"
+    )
+
+
+def snapshot_aggregates(df: pd.DataFrame, exclude_unknown_genre: bool) -> Dict[str, Any]:
+    return {
+        "metrics": snapshot_overview_metrics(df),
+        "median_popularity": snapshot_median(df),
+        "quantiles": snapshot_quantiles(df),
+        "yearly_agg": snapshot_yearly_agg(df),
+        "top_avg_genres": snapshot_top_avg_genres(df, exclude_unknown=exclude_unknown_genre),
+        "genre_freq": snapshot_genre_frequency(df, exclude_unknown=exclude_unknown_genre),
+        "explicit_summary": snapshot_explicit_summary(df),
+        "popularity_over_time": snapshot_popularity_over_time(df),
+        "popularity_buckets": snapshot_popularity_buckets(df),
+        "popularity_histogram": snapshot_popularity_histogram(df),
+        "popularity_box": snapshot_popularity_box(df),
+        "box_explicit": snapshot_box_explicit(df),
+        "box_album_type": snapshot_box_album_type(df),
+    }
+
+
+def snapshot_dashboard_data(
+    df: pd.DataFrame,
+    exclude_unknown_genre: bool,
+    aggregates: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    # Derives every dashboard aggregate from the one filtered frame, unless they were rolled up elsewhere
+    if aggregates is None:
+        aggregates = snapshot_aggregates(df, exclude_unknown_genre)
+    return {
+        "rows_full": df,
+        "rows_sample": df,
+        "hit_rows": df[HIT_COLUMNS],
+        "sim_rows": df[SIMILARITY_COLUMNS],
+        **aggregates,
+    }
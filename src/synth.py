@@ -0,0 +1,267 @@
+"""
+Seeded synthetic catalog generator for scale testing.
+
+    python -m src.synth --tracks 1M [--artists 300k] [--seed 42] [--out data/synthetic.db]
+
+Writes a SQLite database with the same tracks/artists schema the notebook and
+src/etl.py produce, so every dashboard query runs against it unchanged. The
+skew follows the real catalog: Zipfian genre and tracks-per-artist
+distributions (with a large "Unknown" genre), heavy-tailed follower counts
+tied to artist popularity, and a clustered track popularity distribution with
+a spike at zero. Artists with a named primary genre list up to three more
+genres in artist_genres, drawn from the same Zipf tail; --genres up to a few
+thousand exercises the genre bitmap index in src/genres.py. Rows are generated and inserted in chunks, so memory stays
+flat up to tens of millions of tracks.
+"""
+
+import argparse
+import os
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.etl import SCHEMA, record_version
+
+SYNTH_PATH = "data/synthetic.db"
+CHUNK_SIZE = 1_000_000
+MIN_YEAR = 1952
+MAX_YEAR = 2025
+
+# Ratio of artists to tracks in the bundled catalog (2,467 / 7,732)
+ARTISTS_PER_TRACK = 0.32
+
+ALBUM_TYPES = ["album", "single", "compilation"]
+ALBUM_TYPE_SHARES = [0.67, 0.27, 0.06]
+
+# Most frequent named genres in the bundled catalog; the tail is filled with generated names
+BASE_GENRES = [
+    "Country", "Soundtrack", "Dark R&B", "Anime", "Medieval", "K-Pop", "Hypertechno",
+    "Slap House", "R&B", "East Coast Hip Hop", "Reggaeton", "Art Pop", "Indie",
+    "Bedroom Pop", "Rap", "Edm", "Classic Rock", "Soft Pop", "Melodic Rap",
+    "Tropical House", "Post-Grunge", "Emo Rap", "Witch House", "Southern Gothic",
+    "Nu Metal", "Classic Country", "Celtic", "House", "Classical", "Pop",
+]
+GENRE_PREFIXES = ["Alt", "Neo", "Dream", "Lo-Fi", "Latin", "Nordic", "Acid", "Deep", "Future", "Dark"]
+
+# Track and artist names are word pairs, which keeps text search realistic
+WORDS = [
+    "midnight", "velvet", "echo", "golden", "river", "neon", "silver", "paper", "summer", "ghost",
+    "fire", "ocean", "wild", "electric", "crystal", "shadow", "honey", "broken", "city", "heart",
+    "dream", "storm", "lonely", "sweet", "northern", "rain", "highway", "satellite", "wonder", "blue",
+    "starlight", "diamond", "thunder", "little", "secret", "lost", "paradise", "cherry", "desert", "moon",
+    "sunset", "glass", "forever", "dancing", "stranger", "magic", "after", "hollow", "bright", "falling",
+]
+
+
+def parse_size(text: str) -> int:
+    # "10k" / "1M" / "2500" -> row count
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def genre_names(n_genres: int) -> List[str]:
+    # "Unknown" first, so it takes the head of the Zipf distribution like in the real data
+    names = ["Unknown"] + BASE_GENRES[: n_genres - 1]
+    prefixes = GENRE_PREFIXES + [f"{a} {b}" for a in GENRE_PREFIXES for b in GENRE_PREFIXES if a != b]
+    for prefix in prefixes:
+        for base in BASE_GENRES:
+            if len(names) >= n_genres:
+                return names
+            names.append(f"{prefix} {base}")
+    return names
+
+
+def zipf_sampler(rng: np.random.Generator, n: int, skew: float):
+    # Draws ranks 0..n-1 with P(rank) proportional to 1 / (rank + 1) ** skew
+    cdf = np.cumsum(1.0 / np.arange(1, n + 1) ** skew)
+    cdf /= cdf[-1]
+
+    def sample(size: int) -> np.ndarray:
+        return np.minimum(np.searchsorted(cdf, rng.random(size), side="right"), n - 1)
+
+    return sample
+
+
+def _names(rng: np.random.Generator, size: int, words: int) -> List[str]:
+    picks = rng.integers(0, len(WORDS), (size, words))
+    return [" ".join(WORDS[w] for w in row).title() for row in picks]
+
+
+def generate_artists(
+    rng: np.random.Generator,
+    n_artists: int,
+    genres: List[str],
+    genre_skew: float,
+    unknown_share: float,
+) -> Dict[str, np.ndarray]:
+    # "Unknown" is drawn with its own share; named genres follow the Zipf tail
+    named = zipf_sampler(rng, len(genres) - 1, genre_skew)(n_artists) + 1
+    genre = np.where(rng.random(n_artists) < unknown_share, 0, named)
+
+    popularity = np.clip(np.round(rng.normal(55, 20, n_artists)), 0, 100)
+    # Followers grow exponentially with popularity, with log-normal spread (heavy right tail)
+    followers = np.round(10 ** (0.5 + 0.085 * popularity + rng.normal(0, 0.7, n_artists)))
+    followers[rng.random(n_artists) < 0.01] = 0
+
+    # Each artist has an active era; most catalogs are recent
+    era = np.maximum(MAX_YEAR - np.floor(rng.exponential(7.0, n_artists)), MIN_YEAR)
+    return {
+        "genre": genre,
+        "popularity": popularity,
+        "followers": np.minimum(followers, 2e8),
+        "era": era.astype(np.int64),
+    }
+
+
+def listed_genre_pairs(
+    rng: np.random.Generator,
+    primary: np.ndarray,
+    n_genres: int,
+    genre_skew: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # (artist_id, genre index) pairs: each artist's primary genre, plus 0-3 Zipf-drawn extras
+    # for artists whose primary genre is named
+    n_artists = len(primary)
+    extras = np.where(primary > 0, rng.integers(0, 4, n_artists), 0)
+    owners = np.repeat(np.arange(n_artists), extras)
+    drawn = zipf_sampler(rng, n_genres - 1, genre_skew)(len(owners)) + 1
+    artist_ids = np.concatenate([np.arange(n_artists), owners]) + 1
+    genre = np.concatenate([primary, drawn])
+    return artist_ids, genre
+
+
+def generate_tracks(
+    rng: np.random.Generator,
+    artist_ids: np.ndarray,
+    artists: Dict[str, np.ndarray],
+    explicit_rate: np.ndarray,
+    zero_share: float,
+) -> List[tuple]:
+    n = len(artist_ids)
+    idx = artist_ids - 1
+    artist_pop = artists["popularity"][idx]
+
+    # Two clusters: hits near the artist's own popularity, and a lower deep-cut cluster,
+    # plus a spike of zero-popularity tracks (delisted or never played)
+    hit = rng.random(n) < 0.8
+    popularity = np.where(hit, rng.normal(artist_pop, 10), rng.normal(25, 8, n))
+    popularity = np.clip(np.round(popularity), 0, 100)
+    popularity[rng.random(n) < zero_share] = 0
+
+    duration = np.round(np.clip(rng.lognormal(np.log(3.35), 0.3, n), 0.5, 20.0), 2)
+    explicit = (rng.random(n) < explicit_rate[artists["genre"][idx]]).astype(np.int64)
+    year = np.clip(artists["era"][idx] + np.round(rng.normal(0, 2, n)), MIN_YEAR, MAX_YEAR).astype(np.int64)
+    album_type = rng.choice(len(ALBUM_TYPES), n, p=ALBUM_TYPE_SHARES)
+
+    return list(
+        zip(
+            _names(rng, n, 2),
+            popularity.tolist(),
+            duration.tolist(),
+            explicit.tolist(),
+            year.tolist(),
+            [ALBUM_TYPES[a] for a in album_type],
+            artist_ids.tolist(),
+        )
+    )
+
+
+def generate_catalog(
+    path: str = SYNTH_PATH,
+    n_tracks: int = 1_000_000,
+    n_artists: Optional[int] = None,
+    seed: int = 42,
+    n_genres: int = 274,
+    genre_skew: float = 1.1,
+    artist_skew: float = 0.8,
+    unknown_share: float = 0.5,
+    zero_share: float = 0.05,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, int]:
+    # The same seed and sizes always produce the same database
+    rng = np.random.default_rng(seed)
+    n_artists = n_artists or max(1, round(n_tracks * ARTISTS_PER_TRACK))
+    genres = genre_names(n_genres)
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+
+        artists = generate_artists(rng, n_artists, genres, genre_skew, unknown_share)
+        for start in range(0, n_artists, chunk_size):
+            stop = min(start + chunk_size, n_artists)
+            names = _names(rng, stop - start, 2)
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO artists VALUES (?, ?, ?, ?, ?)",
+                zip(
+                    range(start + 1, stop + 1),
+                    (f"{name} {i}" for i, name in zip(range(start + 1, stop + 1), names)),
+                    artists["popularity"][start:stop].tolist(),
+                    artists["followers"][start:stop].tolist(),
+                    [genres[g] for g in artists["genre"][start:stop]],
+                ),
+            )
+            conn.execute("COMMIT")
+
+        # A separate stream, so the artists and tracks match catalogs generated before genre lists
+        genre_rng = np.random.default_rng([seed, 1])
+        owners, listed = listed_genre_pairs(genre_rng, artists["genre"], len(genres), genre_skew)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO artist_genres VALUES (?, ?)",
+            zip(owners.tolist(), (genres[g] for g in listed)),
+        )
+        conn.execute("CREATE INDEX idx_artist_genres_genre ON artist_genres(genre, artist_id)")
+        conn.execute("COMMIT")
+
+        # Every artist gets one track; the rest are Zipfian over a shuffled ranking,
+        # so prolific artists have random ids
+        rank_to_id = rng.permutation(n_artists) + 1
+        pick_rank = zipf_sampler(rng, n_artists, artist_skew)
+        explicit_rate = 0.1 + 0.4 * rng.random(len(genres))
+        for start in range(0, n_tracks, chunk_size):
+            positions = np.arange(start, min(start + chunk_size, n_tracks))
+            artist_ids = np.where(positions < n_artists, positions + 1, rank_to_id[pick_rank(len(positions))])
+            rows = generate_tracks(rng, artist_ids, artists, explicit_rate, zero_share)
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+
+        conn.execute("BEGIN")
+        record_version(conn, 1, "synthetic", f"seed={seed}", n_tracks)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return {"tracks": n_tracks, "artists": n_artists, "genres": len(genres)}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tracks", default="1M")
+    parser.add_argument("--artists", default=None, help="defaults to the real catalog's artist/track ratio")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--genres", type=int, default=274)
+    parser.add_argument("--out", default=SYNTH_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    stats = generate_catalog(
+        args.out,
+        n_tracks=parse_size(args.tracks),
+        n_artists=parse_size(args.artists) if args.artists else None,
+        seed=args.seed,
+        n_genres=args.genres,
+        chunk_size=args.chunk_size,
+    )
+    print(f"{stats['tracks']:,} tracks, {stats['artists']:,} artists, {stats['genres']} genres -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -213,6 +213,24 @@ TABLE_YEARLY_DESC = """
     Aggregates popularity metrics by release year to identify temporal trends and assess the stability of popularity over time.
 """
 
+TABLE_BROWSE_DESC = """
+    Every track that matches the current filters, one page at a time. Sorting and search run in the database, so only the visible page is loaded.
+"""
+
+TABLE_EXPORT_DESC = """
+    Downloads every track that matches the current filters, with its artist and genre. For very large exports use `python -m src.export` or the `/v1/export` API endpoint, which stream the rows without building the file in memory.
+"""
+
+APPROX_ARTISTS_HELP = """
+Estimate the Unique Artists metric from precomputed HyperLogLog sketches (typically within 2%) instead of counting exactly. Applies while the popularity slider spans the full range and the explicit filter is "All"; otherwise the exact count is shown. Estimates are marked with ≈.
+"""
+
+LOOKUP_INTRO = """
+Find any song in the catalog by its name or its artist's name. Words can be
+partial or contain a typo. Pick a match to see its details and the tracks
+most similar to it.
+"""
+
 RULES_INTRO = """
 This section demonstrates how simple, interpretable rules can be applied
 to categorize tracks and identify potential hit songs. The goal is not